@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Admission Control
+Per-class concurrency limits with bounded wait queues for endpoints that block a
+request thread on Telegram (run_async_in_thread). When a class is saturated and its
+queue is full the request is rejected with 503 + Retry-After instead of piling up
+threads, so cheap endpoints keep responding
+"""
+
+import threading
+import time
+from functools import wraps
+from typing import Dict, Any
+
+from flask import jsonify
+
+import config
+
+
+class TrafficClass:
+    """Concurrency slots + bounded FIFO-ish wait queue for one class of requests"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int):
+        self.name = name
+        self.concurrency = max(int(concurrency), 1)
+        self.queue_size = max(int(queue_size), 0)
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self.stats = {'admitted': 0, 'rejected': 0, 'timed_out': 0}
+
+    def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting in the queue up to `timeout`; False if shed"""
+        with self._cond:
+            if self.active < self.concurrency and not self.waiting:
+                self.active += 1
+                self.stats['admitted'] += 1
+                return True
+            if self.waiting >= self.queue_size:
+                self.stats['rejected'] += 1
+                return False
+
+            self.waiting += 1
+            deadline = time.monotonic() + timeout
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['timed_out'] += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.active += 1
+                self.stats['admitted'] += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self.stats, active=self.active, waiting=self.waiting,
+                        concurrency=self.concurrency, queue_size=self.queue_size)
+
+
+class AdmissionController:
+    """Registry of traffic classes"""
+
+    def __init__(self, limits: Dict[str, Dict[str, int]], queue_timeout: float, retry_after: int, enabled: bool = True):
+        self.enabled = enabled
+        self.queue_timeout = float(queue_timeout)
+        self.retry_after = int(retry_after)
+        self.classes = {name: TrafficClass(name, spec['concurrency'], spec['queue']) for name, spec in limits.items()}
+
+    def status(self) -> Dict[str, Any]:
+        """Queue depths per class for the API"""
+        return {
+            'enabled': self.enabled,
+            'queue_timeout': self.queue_timeout,
+            'classes': {name: cls.status() for name, cls in self.classes.items()}
+        }
+
+
+def admission_controlled(traffic_class: str):
+    """View decorator: run the view inside a slot of `traffic_class` or fail fast with 503"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cls = admission_controller.classes.get(traffic_class)
+            if not admission_controller.enabled or cls is None:
+                return view(*args, **kwargs)
+
+            if not cls.acquire(admission_controller.queue_timeout):
+                response = jsonify({
+                    'success': False,
+                    'error': f'Server busy ({traffic_class} queue full), please retry later',
+                    'retry_after': admission_controller.retry_after
+                })
+                response.status_code = 503
+                response.headers['Retry-After'] = str(admission_controller.retry_after)
+                return response
+            try:
+                return view(*args, **kwargs)
+            finally:
+                cls.release()
+        return wrapper
+    return decorator
+
+
+# Global instance
+admission_controller = AdmissionController(
+    config.ADMISSION_LIMITS,
+    config.ADMISSION_QUEUE_TIMEOUT,
+    config.ADMISSION_RETRY_AFTER,
+    enabled=config.ADMISSION_CONTROL_ENABLED
+)
@@ -24,6 +24,7 @@ import asyncio
 import threading
 import re
 import secrets
+import shutil
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from werkzeug.utils import secure_filename
@@ -37,10 +38,32 @@ from flask_cors import CORS
 # Import existing modules
 from scanner import TelegramFileScanner
 from telegram_storage import telegram_storage
+from metadata_enricher import metadata_worker
+from remote_archive import open_remote_zip, get_cached_index, RemoteArchiveError
+from scan_importer import scan_import_manager
+from rate_limiter import telegram_rate_limiter
+from pack_storage import pack_storage, pack_worker, is_pack_filename
+from replication import replication_worker
+from circuit_breaker import telegram_breaker
+from deferred_sync import deferred_sync_worker
+from admission import admission_controller, admission_controlled
+from transfer_scheduler import transfer_scheduler, set_transfer_priority, BULK
+from session_manager import session_manager
+from telegram_metrics import telegram_metrics
+from availability_verifier import availability_verifier
+from remote_search import RemoteSearch, unknown_hits, hit_to_dict, upsert_hits_async
+from file_copy import copy_name, copy_file_records, copy_folder_tree
+from saved_messages_sync import saved_messages_rows, reconcile_saved_messages, scan_window_floor, sync_lock
+from scan_orchestrator import scan_orchestrator, incremental_start, advance_watermark, save_checkpoint, mark_interrupted_scans, walk_exhausted
+from scan_output import StreamingScanWriter
+from scan_catalog import scan_file_writer
+from media_filters import server_filters, iter_media_messages
+from resumable_upload import resumable_uploads, ResumableUploadError
+from signed_urls import media_url_signer, SignedUrlError
 import config
 
 # Import database modules
-from db import db, User, File, Folder, ScanSession, ShareLink, FileComment, FileVersion, ActivityLog, SmartFolder, get_or_create_user
+from db import db, User, File, Folder, ScanSession, ChannelWatermark, ShareLink, FileComment, FileVersion, ActivityLog, SmartFolder, get_or_create_user, add_missing_columns, add_missing_indexes
 
 # Import forms
 from forms import TelegramLoginForm, TelegramVerifyForm
@@ -258,6 +281,71 @@ async def delete_from_telegram_async(file_record):
         logger.error(f"Telegram delete error: {e}")
         return False
 
+async def list_remote_archive_async(file_record):
+    """Async helper to load the index of a Telegram-stored ZIP archive"""
+    if not await telegram_storage.initialize():
+        raise RemoteArchiveError('Telegram client not available')
+    try:
+        reader = await open_remote_zip(telegram_storage, file_record)
+        return reader.index
+    finally:
+        await telegram_storage.close()
+
+async def extract_remote_members_async(file_record, targets):
+    """Async helper to extract (member_name, dest_path) pairs from a Telegram-stored ZIP"""
+    if not await telegram_storage.initialize():
+        raise RemoteArchiveError('Telegram client not available')
+    try:
+        reader = await open_remote_zip(telegram_storage, file_record)
+        for member_name, dest_path in targets:
+            await reader.extract_member(member_name, dest_path)
+        return reader.bytes_read
+    finally:
+        await telegram_storage.close()
+
+async def forward_files_to_saved_messages_async(file_records):
+    """Async helper to copy Telegram files by forwarding (no file data transfer).
+    Returns {file_id: media info of the new Saved Messages message}"""
+    if not await telegram_storage.initialize():
+        raise Exception('Telegram client not available')
+    try:
+        # One forward RPC per 100 messages of the same source chat
+        by_peer = {}
+        for file_record in file_records:
+            peer = telegram_storage.resolve_peer(file_record)
+            by_peer.setdefault(peer, []).append(file_record)
+
+        copied = {}
+        for peer, records in by_peer.items():
+            forwarded = await telegram_storage.forward_to_saved_messages(
+                peer, [f.telegram_message_id for f in records]
+            )
+            for file_record in records:
+                info = forwarded.get(file_record.telegram_message_id)
+                if info:
+                    copied[file_record.id] = info
+        return copied
+    finally:
+        await telegram_storage.close()
+
+async def read_packed_file_async(file_record):
+    """Async helper to read a packed file (ranged read of its pack once sealed)"""
+    if not await telegram_storage.initialize():
+        raise Exception('Telegram client not available')
+    try:
+        return await pack_storage.read_entry(telegram_storage, file_record)
+    finally:
+        await telegram_storage.close()
+
+async def read_pack_range_async(pack_id, message_id, offset, length):
+    """Async helper to read a pack range straight from signed claims (no File/PackBlob query)"""
+    if not await telegram_storage.initialize():
+        raise Exception('Telegram client not available')
+    try:
+        return await pack_storage.read_range(telegram_storage, pack_id, message_id, offset, length)
+    finally:
+        await telegram_storage.close()
+
 # Production mode - minimal logging baseline
 logging.basicConfig(level=logging.WARNING)  # Only warnings and errors
 
@@ -303,6 +391,7 @@ app = Flask(__name__,
 # Load configuration from config.json
 flask_app_config = web_config.flask_config.get_flask_config()
 app.config.update(flask_app_config)
+media_url_signer.init_app(app)
 
 # Create necessary directories
 web_config.flask_config.create_directories()
@@ -430,6 +519,10 @@ def check_session_timeout():
     """Check if session has expired"""
     from flask import session, request
 
+    # Signed media URLs authorize themselves; don't load the user or touch the session
+    if request.endpoint == 'signed_media':
+        return
+
     # Skip session check for static files and auth routes
     if request.endpoint and (request.endpoint.startswith('static') or
                            request.endpoint in ['login', 'register', 'forgot_password', 'reset_password']):
@@ -542,9 +635,9 @@ ERROR_CONFIGS = {
 }
 
 # Register error handlers using the factory function
-for status_code, config in ERROR_CONFIGS.items():
-    error_type, message, log_level = config[:3]
-    special_action = config[3] if len(config) > 3 else None
+for status_code, error_config in ERROR_CONFIGS.items():
+    error_type, message, log_level = error_config[:3]
+    special_action = error_config[3] if len(error_config) > 3 else None
     app.errorhandler(status_code)(create_error_handler(status_code, error_type, message, log_level, special_action))
 
 # Database Error Handlers
@@ -829,6 +922,9 @@ def validate_file_content(file_path):
 try:
     with app.app_context():
         db.create_all()
+        add_missing_columns()
+        add_missing_indexes()
+        mark_interrupted_scans()
 
         # Create default admin user with password from config
         admin_config = web_config.flask_config.get_admin_config()
@@ -880,6 +976,28 @@ def start_cleanup_task():
 # Start cleanup task
 start_cleanup_task()
 
+# Start metadata enrichment worker (ranged head/tail reads only)
+if config.METADATA_ENRICHMENT_ENABLED:
+    metadata_worker.start(app)
+
+# Start pack storage maintenance (seal full packs, compact sparse ones)
+if config.PACK_STORAGE_ENABLED:
+    pack_worker.start(app)
+
+# Start replication worker (second copy of each file for hedged downloads)
+if config.REPLICATION_ENABLED:
+    replication_worker.start(app)
+
+# Start deferred sync worker (local fallback uploads -> Telegram)
+deferred_sync_worker.start(app)
+
+# Sessions are shared in memory now; drop per-operation copies left by older versions
+session_manager.cleanup_legacy_temp_sessions()
+
+# Start availability verifier (batched existence checks of Telegram-stored files)
+if config.VERIFY_ENABLED:
+    availability_verifier.start(app)
+
 class WebTelegramScanner(TelegramFileScanner):
     """Extended scanner with web interface support"""
 
@@ -889,8 +1007,10 @@ class WebTelegramScanner(TelegramFileScanner):
         self.user_id = user_id or get_or_create_user().id
         self.scan_session = None
 
-    async def scan_channel_with_progress(self, channel_input):
-        """Scan channel with real-time progress updates"""
+    async def scan_channel_with_progress(self, channel_input, full_rescan=False, resume_session_id=None):
+        """Scan channel with real-time progress updates.
+        Rescans only fetch messages above the channel watermark unless full_rescan;
+        resume_session_id continues a stopped session from its last checkpoint"""
         global scan_progress, scanning_active
 
         try:
@@ -898,13 +1018,22 @@ class WebTelegramScanner(TelegramFileScanner):
             scan_progress = {'current': 0, 'total': 0, 'status': 'connecting'}
             self.socketio.emit('scan_progress', scan_progress)
 
-            # Create scan session in database
-            self.scan_session = ScanSession(
-                channel_name=channel_input,
-                user_id=self.user_id,
-                status='running'
-            )
-            db.session.add(self.scan_session)
+            checkpoint = None
+            if resume_session_id:
+                # Same session, folder and output files, continuing below the saved offset
+                self.scan_session = db.session.get(ScanSession, resume_session_id)
+                checkpoint = self.scan_session.get_checkpoint() or {}
+                self.scan_session.status = 'running'
+                self.scan_session.error_message = None
+                self.scan_session.completed_at = None
+            else:
+                # Create scan session in database
+                self.scan_session = ScanSession(
+                    channel_name=channel_input,
+                    user_id=self.user_id,
+                    status='running'
+                )
+                db.session.add(self.scan_session)
             db.session.commit()
 
             # Initialize scanner with timeout
@@ -975,24 +1104,32 @@ class WebTelegramScanner(TelegramFileScanner):
             # Get total messages (commented emit)
             # ... (commented emit code) ...
 
+            if checkpoint:
+                # Resume keeps the bounds and folder of the interrupted run
+                watermark = ChannelWatermark.query.filter_by(user_id=self.user_id, channel_id=self.scan_session.channel_id).first()
+                prior_folder = Folder.query.filter_by(id=self.scan_session.folder_id, is_deleted=False).first() \
+                    if self.scan_session.folder_id else None
+                min_id = self.scan_session.min_message_id or 0
+                print(f"📌 Resuming scan #{self.scan_session.id} below message id={checkpoint.get('offset_id')}")
+            else:
+                # Incremental rescan: only messages above the watermark, merged into the prior folder
+                watermark, prior_folder, min_id = incremental_start(self.user_id, self.scan_session.channel_id, full_rescan)
+                self.scan_session.scan_mode = 'incremental' if prior_folder else 'full'
+                self.scan_session.min_message_id = min_id or None
+                if prior_folder:
+                    print(f"📌 Incremental scan: messages after id={min_id}")
+
+            max_messages = 5000  # Hardcode để tránh lỗi config
+            message_filters = server_filters()  # Only media of the enabled types is fetched
             try:
-                print("DEBUG: Setting total_messages")
-                # Hardcode 200 for now as config.MAX_MESSAGES is missing/erroring
-                total_messages = 200 
-                # Nếu muốn dùng config, phải đảm bảo config.py có biến này. Hiện tại config.py không có.
-                
-                print(f"DEBUG: Using total_messages: {total_messages}")
-                
+                # Total from one limit=0 history call; the scan below is the only traversal
+                total_messages = await self.get_message_count(entity, max_messages, min_id, message_filters)
                 scan_progress['total'] = total_messages
                 self.scan_session.total_messages = total_messages
-                
-                print(f"📊 Total messages limit: {total_messages}")
+                print(f"📊 Total messages: {total_messages}")
                 sys.stdout.flush()
-                
             except Exception as e:
-                print(f"ERROR: Setting total_messages failed: {e}")
-                import traceback
-                traceback.print_exc()
+                print(f"ERROR: Getting total_messages failed: {e}")
 
             try:
                 # Uncomment socketio emit but wrap safely
@@ -1011,41 +1148,50 @@ class WebTelegramScanner(TelegramFileScanner):
                 print(f"ERROR: Commit 2 failed: {e}")
 
             # Get or create folder for this scan
-            try:
-                print("DEBUG: Creating Folder")
-                # Format folder name safely
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                channel_name_safe = getattr(self.scan_session, 'channel_name', 'Unknown')
-                if not channel_name_safe:
-                    channel_name_safe = 'Unknown'
-                # Sanitize channel name
-                channel_name_safe = "".join([c for c in channel_name_safe if c.isalnum() or c in (' ', '_', '-')]).strip()
+            if prior_folder:
+                scan_folder = prior_folder
+                self.scan_session.folder_id = scan_folder.id
+                db.session.commit()
+            else:
+                try:
+                    print("DEBUG: Creating Folder")
+                    # Format folder name safely
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    channel_name_safe = getattr(self.scan_session, 'channel_name', 'Unknown')
+                    if not channel_name_safe:
+                        channel_name_safe = 'Unknown'
+                    # Sanitize channel name
+                    channel_name_safe = "".join([c for c in channel_name_safe if c.isalnum() or c in (' ', '_', '-')]).strip()
                 
-                folder_name = f"Scan_{channel_name_safe}_{timestamp}"
-                print(f"DEBUG: Folder name: {folder_name}")
+                    folder_name = f"Scan_{channel_name_safe}_{timestamp}"
+                    print(f"DEBUG: Folder name: {folder_name}")
                 
-                scan_folder = Folder(
-                    name=folder_name,
-                    user_id=self.user_id,
-                    path=folder_name
-                )
-                db.session.add(scan_folder)
-                db.session.commit()
-                print("DEBUG: Folder created and committed")
-                sys.stdout.flush()
-            except Exception as e:
-                print(f"ERROR: Creating folder failed: {e}")
-                # Create a fake object to allow scan to continue (logs only)
-                class FakeFolder:
-                    id = None
-                scan_folder = FakeFolder()
-                # return False
+                    scan_folder = Folder(
+                        name=folder_name,
+                        user_id=self.user_id,
+                        path=folder_name
+                    )
+                    db.session.add(scan_folder)
+                    db.session.commit()
+                    self.scan_session.folder_id = scan_folder.id
+                    db.session.commit()
+                    print("DEBUG: Folder created and committed")
+                    sys.stdout.flush()
+                except Exception as e:
+                    print(f"ERROR: Creating folder failed: {e}")
+                    # Create a fake object to allow scan to continue (logs only)
+                    class FakeFolder:
+                        id = None
+                    scan_folder = FakeFolder()
+                    # return False
+
+            catalog = scan_file_writer(self.user_id, scan_folder.id, self.scan_session.channel_id,
+                                       self.scan_session.channel_name)
 
             # Scan messages with retry logic for network errors
             processed = 0
             files_saved = 0
             print(f"🔍 Bắt đầu scan messages từ: {getattr(entity, 'first_name', None) or getattr(entity, 'title', 'Unknown')}")
-            max_messages = 5000  # Hardcode để tránh lỗi config
             print(f"📊 Giới hạn: {max_messages} messages")
             print(f"DEBUG: About to start iter_messages loop...")
             sys.stdout.flush()
@@ -1054,6 +1200,16 @@ class WebTelegramScanner(TelegramFileScanner):
             max_retries = 3
             retry_delay = 2
             last_processed_id = None  # Track last processed message for resume
+            max_seen_id = min_id
+            if checkpoint:
+                last_processed_id = checkpoint.get('offset_id')
+                processed = checkpoint.get('messages_scanned') or 0
+                files_saved = checkpoint.get('files_found') or 0
+                max_seen_id = max(max_seen_id, checkpoint.get('max_message_id') or 0)
+                if checkpoint.get('output'):
+                    # Reuse the partial report files, cut back to the checkpoint
+                    self.results = StreamingScanWriter(self.output_dir, checkpoint['output']['timestamp'])
+                    self.results.resume(checkpoint['output'])
             
             for retry_attempt in range(max_retries):
                 try:
@@ -1061,11 +1217,13 @@ class WebTelegramScanner(TelegramFileScanner):
                     offset_id = last_processed_id if last_processed_id else 0
                     remaining_limit = max_messages - processed
                     
-                    async for message in self.client.iter_messages(entity, limit=remaining_limit, offset_id=offset_id):
+                    async for message in iter_media_messages(self.client, entity, message_filters, limit=remaining_limit,
+                                                             offset_id=offset_id, min_id=min_id):
                         if not scanning_active:  # Check if scan was cancelled
                             break
 
                         last_processed_id = message.id  # Track for resume
+                        max_seen_id = max(max_seen_id, message.id)
 
                         # Log message đầu tiên và mỗi 10 messages
                         if processed == 0 or processed % 10 == 0:
@@ -1073,39 +1231,12 @@ class WebTelegramScanner(TelegramFileScanner):
 
                         file_info = self.extract_file_info(message)
                         if file_info and self.should_include_file_type(file_info['file_type']):
-                            # Save to database instead of just appending to list
+                            # Batched upsert into the catalog + streamed report files
                             try:
-                                file_record = File(
-                                    filename=file_info.get('file_name', ''),
-                                    original_filename=file_info.get('file_name', ''),
-                                    file_size=file_info.get('file_size', 0),
-                                    mime_type=file_info.get('mime_type', ''),
-                                    folder_id=scan_folder.id,
-                                    user_id=self.user_id,
-                                    storage_type='telegram',  # Mark as Telegram file
-                                    telegram_message_id=file_info.get('message_id'),
-                                    telegram_channel=self.scan_session.channel_name or 'Saved Messages',
-                                    telegram_channel_id=self.scan_session.channel_id,
-                                    telegram_date=datetime.fromisoformat(
-                                        file_info['date'].replace('Z', '+00:00')
-                                    ) if file_info.get('date') else None
-                                )
-
-                                # Set metadata
-                                metadata = {
-                                    'download_url': file_info.get('download_url', ''),
-                                    'file_type': file_info.get('file_type', ''),
-                                    'sender': file_info.get('sender', '')
-                                }
-                                file_record.set_metadata(metadata)
-
-                                db.session.add(file_record)
+                                catalog.add(file_info)
+                                self.record_file(file_info)
                                 files_saved += 1
 
-                                # Commit every 50 files to avoid memory issues
-                                if files_saved % 50 == 0:
-                                    db.session.commit()
-
                             except Exception as e:
                                 print(f"Error saving file to database: {e}")
                                 continue
@@ -1118,6 +1249,10 @@ class WebTelegramScanner(TelegramFileScanner):
                         self.scan_session.messages_scanned = processed
                         self.scan_session.files_found = files_saved
 
+                        if processed % config.SCAN_CHECKPOINT_EVERY == 0:
+                            save_checkpoint(self.scan_session, channel_input, last_processed_id, max_seen_id,
+                                            processed, files_saved, catalog, self.results)
+
                         # Update progress every 10 messages
                         if processed % 10 == 0:
                             self.socketio.emit('scan_progress', scan_progress)
@@ -1162,7 +1297,8 @@ class WebTelegramScanner(TelegramFileScanner):
             scan_progress['status'] = 'saving'
             self.socketio.emit('scan_progress', scan_progress)
 
-            # Commit any remaining files
+            # Upsert the last partial batch
+            catalog.flush()
             db.session.commit()
 
             # Also save to traditional files for backward compatibility
@@ -1170,10 +1306,17 @@ class WebTelegramScanner(TelegramFileScanner):
 
             # Update scan session as completed
             self.scan_session.status = 'completed'
+            if scanning_active:
+                self.scan_session.checkpoint = None
             self.scan_session.completed_at = datetime.now()
             self.scan_session.files_found = files_saved
             self.scan_session.messages_scanned = processed
             db.session.commit()
+
+            # A cancelled or capped scan may have left gaps below its newest message: keep the old mark
+            if scanning_active and walk_exhausted(processed, max_messages) and self.scan_session.channel_id \
+                    and scan_folder.id:
+                advance_watermark(watermark, self.scan_session, scan_folder.id, max_seen_id)
             
             print(f"✅ SCAN COMPLETE! Messages: {processed}, Files Found: {files_saved}")
 
@@ -1186,6 +1329,7 @@ class WebTelegramScanner(TelegramFileScanner):
                 'messages_scanned': processed,
                 'scan_session_id': self.scan_session.id,
                 'folder_id': scan_folder.id,
+                'scan_mode': self.scan_session.scan_mode,
                 'message': f'Scan completed! Found {files_saved} files'
             })
 
@@ -1413,6 +1557,7 @@ def save_settings():
 
 @app.route('/api/start_scan', methods=['POST'])
 @login_required
+@admission_controlled('scan')
 def start_scan():
     """Start channel scanning"""
     global scanner, scanning_active
@@ -1420,6 +1565,7 @@ def start_scan():
     try:
         data = request.get_json()
         channel_input = data.get('channel', '').strip()
+        full_rescan = bool(data.get('full_rescan'))
 
         if not channel_input:
             return jsonify({'success': False, 'error': 'Channel input is required'})
@@ -1435,7 +1581,7 @@ def start_scan():
             with app.app_context():  # Ensure Flask application context
                 async def scan_with_context():
                     async with scanner:  # Use context manager for proper cleanup
-                        await scanner.scan_channel_with_progress(channel_input)
+                        await scanner.scan_channel_with_progress(channel_input, full_rescan=full_rescan)
 
                 try:
                     # Use asyncio.run() for proper event loop management
@@ -1468,6 +1614,7 @@ def stop_scan():
 
 @app.route('/api/rescan_saved_messages', methods=['POST'])
 @csrf.exempt  # CSRF exempt for Tauri frontend
+@admission_controlled('scan')
 def rescan_saved_messages():
     """Rescan Saved Messages from Telegram and sync with database - allows default user for local desktop app"""
     try:
@@ -1491,6 +1638,8 @@ def rescan_saved_messages():
         
         # Async function to scan and add IDs to captions
         async def scan_telegram_saved_messages():
+            # User-started bulk work: yields transfer slots to interactive downloads
+            set_transfer_priority(BULK)
             await telegram_storage.initialize()
             files = await telegram_storage.scan_saved_messages(limit=500)
             
@@ -1557,6 +1706,8 @@ def rescan_saved_messages():
         
         # Create lookup by message_id from Telegram Saved Messages
         telegram_message_ids = {f['message_id'] for f in telegram_files}
+        # Only the newest messages were scanned: older rows are left alone
+        window_floor = scan_window_floor(telegram_files)
         
         # Track stats
         added_count = 0
@@ -1564,43 +1715,10 @@ def rescan_saved_messages():
         synced_files = []
         removed_files = []  # Track removed files for notification
         
-        # Group files by message_id to detect duplicates
-        message_id_to_files = {}
-        for db_file in existing_db_files:
-            if db_file.telegram_message_id:
-                if db_file.telegram_message_id not in message_id_to_files:
-                    message_id_to_files[db_file.telegram_message_id] = []
-                message_id_to_files[db_file.telegram_message_id].append(db_file)
-        
-        # Remove ALL files from database that are not in Telegram Saved Messages
+        # Remove Saved Messages rows whose message is gone from Telegram Saved Messages
         # AND remove duplicates (keep only 1 file per message_id)
-        kept_message_ids = set()  # Track which message_ids we've already kept
         files_to_delete = []  # Collect files to delete
-        
-        for db_file in existing_db_files:
-            should_delete = False
-            delete_reason = ""
-            
-            # Check if file has no message_id (local file without telegram link)
-            if not db_file.telegram_message_id:
-                should_delete = True
-                delete_reason = "no message_id (local file)"
-            # Check if file is not in Saved Messages
-            elif db_file.telegram_message_id not in telegram_message_ids:
-                should_delete = True
-                delete_reason = "not in Saved Messages"
-            # Check if this is a duplicate (another file with same message_id already kept)
-            elif db_file.telegram_message_id in kept_message_ids:
-                should_delete = True
-                delete_reason = "duplicate"
-            else:
-                # Keep this file
-                kept_message_ids.add(db_file.telegram_message_id)
-                # Update channel to 'Saved Messages' for consistency
-                if db_file.telegram_channel != 'Saved Messages':
-                    db_file.telegram_channel = 'Saved Messages'
-                continue
-            
+        for db_file, delete_reason in reconcile_saved_messages(existing_db_files, telegram_message_ids, window_floor):
             # Mark file for deletion
             app.logger.info(f"Will delete file: {db_file.filename} (reason: {delete_reason})")
             removed_files.append({
@@ -1629,6 +1747,10 @@ def rescan_saved_messages():
         # Filter out test files and duplicates from telegram_files
         # Keep only the file with the highest message_id for each filename
         filename_to_best_file = {}
+        # Messages already tracked in DB (e.g. server-side copies) are never treated as duplicates
+        tracked_message_ids = {f.telegram_message_id for f in saved_messages_rows(File.query.filter(
+            File.telegram_message_id.isnot(None), File.is_deleted == False))}
+        tracked_files = []
         for tg_file in telegram_files:
             filename = tg_file['filename']
             
@@ -1637,6 +1759,14 @@ def rescan_saved_messages():
                 app.logger.info(f"Skipping test file from Telegram: {filename}")
                 continue
             
+            # Pack containers are internal storage, not user files
+            if is_pack_filename(filename):
+                continue
+            
+            if tg_file['message_id'] in tracked_message_ids:
+                tracked_files.append(tg_file)
+                continue
+            
             # Keep only the latest (highest message_id) for each filename
             if filename not in filename_to_best_file:
                 filename_to_best_file[filename] = tg_file
@@ -1645,78 +1775,85 @@ def rescan_saved_messages():
                 filename_to_best_file[filename] = tg_file
         
         # Use only the filtered files
-        filtered_telegram_files = list(filename_to_best_file.values())
+        filtered_telegram_files = tracked_files + list(filename_to_best_file.values())
         app.logger.info(f"After filtering: {len(filtered_telegram_files)} unique files (from {len(telegram_files)} total)")
         
         # Update telegram_message_ids with filtered files
         filtered_message_ids = {f['message_id'] for f in filtered_telegram_files}
         
         # Delete files from DB that are not in filtered list
-        existing_db_files = File.query.all()
+        existing_db_files = saved_messages_rows(File.query.all())
         for db_file in existing_db_files:
-            if db_file.telegram_message_id and db_file.telegram_message_id not in filtered_message_ids:
+            if db_file.telegram_message_id and db_file.telegram_message_id not in filtered_message_ids \
+                    and db_file.telegram_message_id >= window_floor:
                 app.logger.info(f"Deleting file not in filtered list: {db_file.filename} (msg_id: {db_file.telegram_message_id})")
                 db.session.delete(db_file)
                 removed_count += 1
         db.session.commit()
         
-        # Re-query to get fresh data after deletions
-        existing_db_files = File.query.all()
-        existing_message_ids = {f.telegram_message_id: f for f in existing_db_files if f.telegram_message_id}
+        # Serialised with the search upsert so neither inserts a message the other just added
+        with sync_lock:
+            # Re-query to get fresh data after deletions
+            existing_db_files = saved_messages_rows(File.query.all())
+            existing_message_ids = {f.telegram_message_id: f for f in existing_db_files if f.telegram_message_id}
         
-        for tg_file in filtered_telegram_files:
-            existing_file = existing_message_ids.get(tg_file['message_id'])
+            for tg_file in filtered_telegram_files:
+                existing_file = existing_message_ids.get(tg_file['message_id'])
             
-            if existing_file:
-                # File exists - update channel to 'Saved Messages' for consistency
-                if existing_file.telegram_channel != 'Saved Messages':
-                    existing_file.telegram_channel = 'Saved Messages'
-                    app.logger.info(f"Updated channel for: {existing_file.filename}")
-            else:
-                # Create new file record
-                new_file = File(
-                    filename=tg_file['filename'],
-                    original_filename=tg_file['filename'],
-                    file_path='',
-                    file_size=tg_file.get('file_size', 0),
-                    mime_type=tg_file.get('mime_type', 'application/octet-stream'),
-                    user_id=user.id,
-                    storage_type='telegram',
-                    telegram_channel='Saved Messages',
-                    telegram_message_id=tg_file['message_id'],
-                    description=f"Synced from Saved Messages: {tg_file['filename']}"
-                )
-                
-                # Set Telegram storage info if available
-                if tg_file.get('file_id'):
-                    new_file.set_telegram_storage(
-                        message_id=tg_file['message_id'],
-                        channel='Saved Messages',
-                        channel_id='me',
-                        file_id=tg_file.get('file_id'),
-                        unique_id=tg_file.get('file_reference'),
-                        access_hash=tg_file.get('access_hash')
+                if existing_file:
+                    # File exists - update channel to 'Saved Messages' for consistency
+                    if existing_file.telegram_channel != 'Saved Messages':
+                        existing_file.telegram_channel = 'Saved Messages'
+                        app.logger.info(f"Updated channel for: {existing_file.filename}")
+                else:
+                    # Create new file record
+                    new_file = File(
+                        filename=tg_file['filename'],
+                        original_filename=tg_file['filename'],
+                        file_path='',
+                        file_size=tg_file.get('file_size', 0),
+                        mime_type=tg_file.get('mime_type', 'application/octet-stream'),
+                        user_id=user.id,
+                        storage_type='telegram',
+                        telegram_channel='Saved Messages',
+                        telegram_message_id=tg_file['message_id'],
+                        description=f"Synced from Saved Messages: {tg_file['filename']}"
                     )
                 
-                db.session.add(new_file)
-                added_count += 1
-                app.logger.info(f"Added new file from Telegram: {tg_file['filename']}")
+                    # Set Telegram storage info if available
+                    if tg_file.get('file_id'):
+                        new_file.set_telegram_storage(
+                            message_id=tg_file['message_id'],
+                            channel='Saved Messages',
+                            channel_id='me',
+                            file_id=tg_file.get('file_id'),
+                            unique_id=tg_file.get('file_reference'),
+                            access_hash=tg_file.get('access_hash')
+                        )
+                
+                    db.session.add(new_file)
+                    added_count += 1
+                    app.logger.info(f"Added new file from Telegram: {tg_file['filename']}")
             
             
-            # Add to synced files list
-            synced_files.append({
-                'message_id': tg_file['message_id'],
-                'filename': tg_file['filename'],
-                'file_size': tg_file.get('file_size', 0),
-                'mime_type': tg_file.get('mime_type'),
-                'type': tg_file.get('type', 'document')
-            })
+                # Add to synced files list
+                synced_files.append({
+                    'message_id': tg_file['message_id'],
+                    'filename': tg_file['filename'],
+                    'file_size': tg_file.get('file_size', 0),
+                    'mime_type': tg_file.get('mime_type'),
+                    'type': tg_file.get('type', 'document')
+                })
         
-        db.session.commit()
+            db.session.commit()
         
         # Cache cleared via commit
         
         app.logger.info(f"Rescan complete: {added_count} added, {removed_count} removed")
+
+        # Newly synced files only have name/size/MIME - enrich them in background
+        if added_count and config.METADATA_ENRICHMENT_ENABLED:
+            metadata_worker.wake()
         
         return jsonify({
             'success': True,
@@ -1818,9 +1955,9 @@ def get_files():
             'type': file_type.upper()
         })
 
-    # Also include output files for backward compatibility
+    # Scan report files as pseudo-files (off when scans write to the catalog)
     output_dir = web_config.flask_config.get('directories.output', 'output')
-    if os.path.exists(output_dir):
+    if config.LIST_OUTPUT_REPORTS and os.path.exists(output_dir):
         for file in os.listdir(output_dir):
             if file.endswith(('.json', '.csv', '.xlsx')):
                 file_path = os.path.join(output_dir, file)
@@ -1908,9 +2045,9 @@ def get_files_public():
             'owner': 'tôi'
         })
 
-    # Also include output files for backward compatibility
+    # Scan report files as pseudo-files (off when scans write to the catalog)
     output_dir = web_config.flask_config.get('directories.output', 'output')
-    if os.path.exists(output_dir):
+    if config.LIST_OUTPUT_REPORTS and os.path.exists(output_dir):
         for file in os.listdir(output_dir):
             if file.endswith(('.json', '.csv', '.xlsx')):
                 file_path = os.path.join(output_dir, file)
@@ -1994,6 +2131,7 @@ def get_auth_status_public():
 # Public API endpoint to scan Saved Messages
 @app.route('/api/v2/scan/saved-messages', methods=['POST'])
 @csrf.exempt  # CSRF exempt for Tauri frontend
+@admission_controlled('scan')
 def scan_saved_messages_public():
     """Scan Saved Messages from Telegram for Tauri frontend - allows default user for local desktop app"""
     global scanner, scanning_active
@@ -2003,6 +2141,8 @@ def scan_saved_messages_public():
         if scanning_active:
             return jsonify({'success': False, 'error': 'Scan đang chạy'})
         
+        full_rescan = bool((request.get_json(silent=True) or {}).get('full_rescan'))
+
         # Create new scanner instance
         scanner = WebTelegramScanner(socketio)
         scanning_active = True
@@ -2014,7 +2154,7 @@ def scan_saved_messages_public():
                 async def scan_with_context():
                     async with scanner:
                         # Scan 'me' = Saved Messages
-                        await scanner.scan_channel_with_progress('me')
+                        await scanner.scan_channel_with_progress('me', full_rescan=full_rescan)
                 
                 try:
                     asyncio.run(run_async_safely(scan_with_context()))
@@ -2050,6 +2190,192 @@ def get_scan_status_public():
     })
 
 
+# Scan sessions API
+@app.route('/api/v2/scan/sessions')
+@csrf.exempt
+def get_scan_sessions():
+    """List recent scan sessions"""
+    try:
+        user = get_or_create_user()
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        sessions = ScanSession.query.filter_by(user_id=user.id).order_by(ScanSession.started_at.desc()).limit(limit).all()
+        return jsonify({'success': True, 'sessions': [s.to_dict() for s in sessions]})
+    except Exception as e:
+        app.logger.error(f"Scan sessions error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/scan/sessions/<int:session_id>')
+@csrf.exempt
+def get_scan_session(session_id):
+    """Get one scan session (including import progress)"""
+    user = get_or_create_user()
+    scan_session = ScanSession.query.filter_by(id=session_id, user_id=user.id).first()
+    if not scan_session:
+        return jsonify({'success': False, 'error': 'Scan session not found'}), 404
+    return jsonify({
+        'success': True,
+        'session': scan_session.to_dict(),
+        'import_running': scan_import_manager.is_running(session_id)
+    })
+
+
+@app.route('/api/v2/scan/sessions/<int:session_id>/resume', methods=['POST'])
+@csrf.exempt
+@admission_controlled('scan')
+def resume_scan_session(session_id):
+    """Resume a failed or interrupted scan from its last checkpoint"""
+    global scanner, scanning_active
+
+    try:
+        user = get_or_create_user()
+        scan_session = ScanSession.query.filter_by(id=session_id, user_id=user.id).first()
+        if not scan_session:
+            return jsonify({'success': False, 'error': 'Scan session not found'}), 404
+        if not scan_session.is_resumable():
+            return jsonify({'success': False, 'error': f'Scan session is {scan_session.status} and has no checkpoint'}), 409
+        if scanning_active:
+            return jsonify({'success': False, 'error': 'Scan already in progress'}), 409
+
+        channel_input = scan_session.get_checkpoint().get('channel_input') or scan_session.channel_id
+        scanner = WebTelegramScanner(socketio, user_id=user.id)
+        scanning_active = True
+
+        def run_scan():
+            global scanning_active
+            with app.app_context():
+                async def scan_with_context():
+                    async with scanner:
+                        await scanner.scan_channel_with_progress(channel_input, resume_session_id=session_id)
+
+                try:
+                    asyncio.run(run_async_safely(scan_with_context()))
+                except Exception as e:
+                    logger.error(f"Scanner error: {e}")
+                    try:
+                        asyncio.run(scanner.close())
+                    except:
+                        pass
+                finally:
+                    scanning_active = False
+
+        thread = threading.Thread(target=run_scan)
+        thread.daemon = True
+        thread.start()
+
+        return jsonify({'success': True, 'message': 'Scan resumed', 'session': scan_session.to_dict()})
+
+    except Exception as e:
+        scanning_active = False
+        app.logger.error(f"Resume scan error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/scan/batch', methods=['POST'])
+@csrf.exempt
+@admission_controlled('scan')
+def start_scan_batch():
+    """Scan several channels concurrently (body: channels, full_rescan, concurrency)"""
+    try:
+        user = get_or_create_user()
+        data = request.get_json(silent=True) or {}
+        channels = data.get('channels') or []
+        if isinstance(channels, str):
+            channels = [c for c in re.split(r'[\s,]+', channels) if c]
+        batch = scan_orchestrator.start(app, user.id, channels, bool(data.get('full_rescan')), data.get('concurrency'))
+        return jsonify({'success': True, 'batch_id': batch.id, 'channels': len(batch.channels),
+                        'concurrency': batch.concurrency})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error starting scan batch: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/scan/batch', methods=['GET'])
+@csrf.exempt
+def list_scan_batches():
+    """Scan batches started since the server came up"""
+    return jsonify({'success': True, 'batches': scan_orchestrator.batches()})
+
+
+@app.route('/api/v2/scan/batch/<batch_id>', methods=['GET'])
+@csrf.exempt
+def get_scan_batch(batch_id):
+    """Batch status with per-channel progress"""
+    batch = scan_orchestrator.get(batch_id)
+    if not batch:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    return jsonify(dict(batch.to_dict(), success=True))
+
+
+@app.route('/api/v2/scan/batch/<batch_id>/cancel', methods=['POST'])
+@csrf.exempt
+def cancel_scan_batch(batch_id):
+    """Cancel a running batch (channels stop after their current page)"""
+    if not scan_orchestrator.cancel(batch_id):
+        return jsonify({'success': False, 'error': 'Batch not found or not running'}), 404
+    return jsonify({'success': True, 'message': 'Cancelling'})
+
+
+@app.route('/api/v2/scan/watermarks', methods=['GET'])
+@csrf.exempt
+def get_scan_watermarks():
+    """Per-channel high-water marks used by incremental rescans"""
+    try:
+        user = get_or_create_user()
+        watermarks = ChannelWatermark.query.filter_by(user_id=user.id).order_by(ChannelWatermark.updated_at.desc()).all()
+        return jsonify({'success': True, 'watermarks': [w.to_dict() for w in watermarks]})
+    except Exception as e:
+        app.logger.error(f"Error getting scan watermarks: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/scan/watermarks/<channel_id>', methods=['DELETE'])
+@csrf.exempt
+def reset_scan_watermark(channel_id):
+    """Forget a channel's watermark so its next scan is a full one"""
+    try:
+        user = get_or_create_user()
+        deleted = ChannelWatermark.query.filter_by(user_id=user.id, channel_id=channel_id).delete()
+        db.session.commit()
+        return jsonify({'success': True, 'deleted': deleted})
+    except Exception as e:
+        app.logger.error(f"Error resetting scan watermark {channel_id}: {e}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/scan/sessions/<int:session_id>/import', methods=['POST'])
+@csrf.exempt
+def import_scan_session_files(session_id):
+    """Import the files of a completed scan into the drive by bulk forwarding (no re-upload)"""
+    try:
+        user = get_or_create_user()
+        scan_session = ScanSession.query.filter_by(id=session_id, user_id=user.id).first()
+        if not scan_session:
+            return jsonify({'success': False, 'error': 'Scan session not found'}), 404
+        if scan_session.status != 'completed':
+            return jsonify({'success': False, 'error': 'Only completed scans can be imported'}), 400
+        if not scan_session.folder_id:
+            return jsonify({'success': False, 'error': 'Scan session has no stored results'}), 400
+
+        def emit_progress(progress):
+            socketio.emit('import_progress', progress)
+
+        if not scan_import_manager.start(app, session_id, emit_progress):
+            return jsonify({'success': False, 'error': 'Import already running'}), 409
+
+        return jsonify({
+            'success': True,
+            'message': f'Đang import {scan_session.files_found} file từ {scan_session.channel_name}...',
+            'session': scan_session.to_dict()
+        })
+    except Exception as e:
+        app.logger.error(f"Scan import error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # Public API endpoint to get storage info
 @app.route('/api/v2/storage')
 @csrf.exempt
@@ -2075,12 +2401,18 @@ def get_storage_info():
             File.storage_type == 'local'
         ).scalar() or 0
         
+        packed_size = db.session.query(db.func.sum(File.file_size)).filter(
+            File.is_deleted == False,
+            File.storage_type == 'pack'
+        ).scalar() or 0
+        
         return jsonify({
             'success': True,
             'total_size': int(total_size),
             'file_count': file_count,
             'telegram_size': int(telegram_size),
             'local_size': int(local_size),
+            'packed_size': int(packed_size),
             # Telegram has unlimited storage, but we can show a visual indicator
             'unlimited': True
         })
@@ -2094,6 +2426,186 @@ def get_storage_info():
         })
 
 
+# Pack storage API
+@app.route('/api/v2/storage/packs', methods=['GET'])
+@csrf.exempt
+def get_pack_storage_status():
+    """Pack storage status (pack counts per state, worker stats)"""
+    try:
+        return jsonify({'success': True, 'packs': pack_worker.status()})
+    except Exception as e:
+        app.logger.error(f"Pack status error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/storage/packs/maintenance', methods=['POST'])
+@csrf.exempt
+def run_pack_maintenance():
+    """Seal due packs and compact sparse ones now"""
+    pack_worker.start(app)
+    pack_worker.wake()
+    return jsonify({'success': True, 'message': 'Pack maintenance started'})
+
+
+# Admission control API
+@app.route('/api/v2/admission')
+@csrf.exempt
+def get_admission_status():
+    """Active requests and queue depth per traffic class"""
+    return jsonify({'success': True, 'admission': admission_controller.status()})
+
+
+# Availability verification API
+@app.route('/api/v2/storage/verify', methods=['GET'])
+@csrf.exempt
+def get_verification_status():
+    """Verification job status, last report and missing file count"""
+    try:
+        missing = File.query.filter(File.telegram_missing == True, File.is_deleted == False).count()
+        never_verified = File.query.filter(
+            File.storage_type == 'telegram',
+            File.is_deleted == False,
+            File.verified_at.is_(None)
+        ).count()
+        return jsonify({
+            'success': True,
+            'verification': availability_verifier.status(),
+            'missing_files': missing,
+            'never_verified': never_verified
+        })
+    except Exception as e:
+        app.logger.error(f"Verification status error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/storage/verify', methods=['POST'])
+@csrf.exempt
+def run_verification():
+    """Run a verification pass now"""
+    availability_verifier.start(app)
+    availability_verifier.wake()
+    return jsonify({'success': True, 'message': 'Verification started'})
+
+
+@app.route('/api/v2/storage/verify/missing', methods=['GET'])
+@csrf.exempt
+def get_missing_files():
+    """Files whose Telegram message no longer exists"""
+    try:
+        user = get_or_create_user()
+        files = File.query.filter_by(user_id=user.id, is_deleted=False, telegram_missing=True).order_by(File.id).all()
+        return jsonify({'success': True, 'files': [f.to_dict() for f in files], 'count': len(files)})
+    except Exception as e:
+        app.logger.error(f"Missing files error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# Telegram RPC metrics API
+@app.route('/api/v2/metrics/telegram')
+@csrf.exempt
+def get_telegram_metrics():
+    """Per-method/DC RPC metrics as JSON, or Prometheus text with ?format=prometheus"""
+    if request.args.get('format') == 'prometheus' or 'text/plain' in request.headers.get('Accept', ''):
+        return app.response_class(telegram_metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify({'success': True, 'metrics': telegram_metrics.to_dict()})
+
+
+# Transfer scheduler API
+@app.route('/api/v2/storage/scheduler')
+@csrf.exempt
+def get_transfer_scheduler_status():
+    """Transfer slots, queues and bytes per priority class"""
+    return jsonify({'success': True, 'scheduler': transfer_scheduler.status()})
+
+
+# Circuit breaker / deferred sync API
+@app.route('/api/v2/storage/circuit', methods=['GET'])
+@csrf.exempt
+def get_circuit_status():
+    """Telegram circuit breaker state and deferred sync backlog"""
+    try:
+        pending = File.query.filter(File.sync_pending == True, File.is_deleted == False).count()
+        return jsonify({
+            'success': True,
+            'circuit': telegram_breaker.status(),
+            'deferred_sync': dict(deferred_sync_worker.status(), pending=pending)
+        })
+    except Exception as e:
+        app.logger.error(f"Circuit status error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/storage/sync', methods=['POST'])
+@csrf.exempt
+def run_deferred_sync():
+    """Try to move pending local files to Telegram now"""
+    deferred_sync_worker.start(app)
+    deferred_sync_worker.wake()
+    return jsonify({'success': True, 'message': 'Deferred sync started', 'circuit': telegram_breaker.state})
+
+
+# Replication API
+@app.route('/api/v2/storage/replication', methods=['GET'])
+@csrf.exempt
+def get_replication_status():
+    """Replication/hedged read status"""
+    try:
+        pending = File.query.filter(
+            File.storage_type == 'telegram',
+            File.is_deleted == False,
+            File.replica_message_id.is_(None)
+        ).count()
+        return jsonify({'success': True, 'replication': dict(replication_worker.status(), pending=pending)})
+    except Exception as e:
+        app.logger.error(f"Replication status error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/storage/replication', methods=['POST'])
+@csrf.exempt
+def run_replication():
+    """Replicate pending files now"""
+    if not config.REPLICATION_ENABLED:
+        return jsonify({'success': False, 'error': 'Replication is disabled (storage.replication.factor/chat)'}), 400
+    replication_worker.start(app)
+    replication_worker.wake()
+    return jsonify({'success': True, 'message': 'Replication started'})
+
+
+# Metadata enrichment API
+@app.route('/api/v2/metadata/enrichment', methods=['GET'])
+@csrf.exempt
+def get_metadata_enrichment_status():
+    """Get background metadata enrichment status"""
+    return jsonify({'success': True, 'enrichment': metadata_worker.status()})
+
+
+@app.route('/api/v2/metadata/enrichment', methods=['POST'])
+@csrf.exempt
+def trigger_metadata_enrichment():
+    """Enrich pending files now (optionally only the given file_ids)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        file_ids = data.get('file_ids')
+
+        if file_ids:
+            # Force re-enrichment of the selected files
+            from metadata_enricher import ENRICHED_KEY, get_file_metadata, set_file_metadata
+            for file_record in File.query.filter(File.id.in_(file_ids)).all():
+                metadata = get_file_metadata(file_record)
+                metadata.pop(ENRICHED_KEY, None)
+                set_file_metadata(file_record, metadata)
+            db.session.commit()
+
+        metadata_worker.start(app)
+        metadata_worker.wake()
+        return jsonify({'success': True, 'message': 'Đã bắt đầu bổ sung metadata', 'enrichment': metadata_worker.status()})
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Metadata enrichment trigger error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # Rate limits status API
 @app.route('/api/v2/rate-limits')
 @csrf.exempt
@@ -2123,7 +2635,12 @@ def get_rate_limits_info():
                 'reset_in': reset_in,
             })
 
-        return jsonify({'success': True, 'limits': result})
+        return jsonify({
+            'success': True,
+            'limits': result,
+            'telegram': telegram_rate_limiter.status(),
+            'admission': admission_controller.status()
+        })
     except Exception as e:
         app.logger.error(f"Rate limits info error: {e}")
         return jsonify({'success': False, 'limits': []})
@@ -2173,9 +2690,117 @@ def auto_login_public():
         })
 
 
+def store_uploaded_file(user, file_path, unique_filename, original_filename, mime_type, folder_id):
+    """Store a file saved in the upload directory: pack, Telegram Saved Messages or local fallback.
+    Returns the (unflushed) File record"""
+    file_size = file_path.stat().st_size
+
+    # Create database record (default to local, will update if Telegram succeeds)
+    file_record = File(
+        filename=unique_filename,
+        original_filename=original_filename,
+        file_path=str(file_path),
+        file_size=file_size,
+        mime_type=mime_type,
+        folder_id=folder_id,
+        user_id=user.id,
+        description=f'Uploaded file: {original_filename}',
+        storage_type='local'
+    )
+
+    # Small files go into a pack instead of costing a message each
+    if pack_storage.should_pack(file_size):
+        try:
+            pack, pack_offset, pack_length = pack_storage.append_file(user.id, str(file_path))
+            file_record.storage_type = 'pack'
+            file_record.pack_id = pack.id
+            file_record.pack_offset = pack_offset
+            file_record.pack_length = pack_length
+            file_record.file_path = None
+            os.remove(file_path)
+            if pack.size >= config.PACK_TARGET_SIZE:
+                pack_worker.wake()
+            return file_record
+        except Exception as e:
+            app.logger.error(f"Pack append error for {unique_filename}: {e}")
+
+    # Default: Always try to upload to Telegram Saved Messages
+    # Fallback to local storage if Telegram upload fails
+    telegram_upload_success = False
+    try:
+        app.logger.info(f"Uploading {unique_filename} to Telegram Saved Messages...")
+        telegram_result = run_async_in_thread(
+            upload_to_telegram_async(str(file_path), unique_filename, user.id)
+        )
+
+        if telegram_result:
+            telegram_upload_success = True
+            file_record.storage_type = 'telegram'
+            file_record.telegram_channel = 'Saved Messages'
+            file_record.set_telegram_storage(
+                message_id=telegram_result['message_id'],
+                channel=telegram_result['channel'],
+                channel_id=telegram_result['channel_id'],
+                file_id=telegram_result.get('file_id'),
+                unique_id=telegram_result.get('unique_id'),
+                access_hash=telegram_result.get('access_hash'),
+                file_reference=telegram_result.get('file_reference')
+            )
+            app.logger.info(f"✅ Successfully uploaded {unique_filename} to Telegram Saved Messages")
+            if config.REPLICATION_ENABLED:
+                replication_worker.wake()
+
+            # Remove local file since it's now on Telegram
+            try:
+                os.remove(file_path)
+                app.logger.info(f"Removed local temp file: {file_path}")
+            except Exception as rm_err:
+                app.logger.warning(f"Could not remove local file: {rm_err}")
+        else:
+            app.logger.warning(f"Telegram upload returned no result for {unique_filename}, keeping local")
+    except Exception as e:
+        app.logger.error(f"Telegram upload error for {unique_filename}: {e}")
+        # Keep local storage as fallback
+
+    if not telegram_upload_success:
+        # Local fallback: the deferred syncer moves it up once Telegram is back
+        file_record.sync_pending = True
+        deferred_sync_worker.wake()
+
+    return file_record
+
+
+def resolve_upload_filename(original_filename):
+    """Sanitized, allowed and (optionally) timestamped filename plus its path in the upload directory.
+    Returns (None, None) if the name is rejected"""
+    upload_config = web_config.flask_config.get_upload_config()
+    upload_dir = Path(upload_config['upload_directory'])
+    upload_dir.mkdir(parents=True, exist_ok=True)
+
+    sanitized_fname = sanitize_filename(original_filename)
+    if not sanitized_fname or not is_allowed_file(sanitized_fname):
+        return None, None
+
+    if upload_config['timestamp_filenames']:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        unique_filename = f"{timestamp}_{sanitized_fname}"
+    else:
+        unique_filename = sanitized_fname
+
+    # Ensure path is within upload directory
+    try:
+        file_path = (upload_dir / unique_filename).resolve()
+        if not str(file_path).startswith(str(upload_dir.resolve())):
+            return None, None
+    except Exception:
+        return None, None
+    return unique_filename, file_path
+
+
 # Public API endpoint to upload files for Tauri frontend
 @app.route('/api/v2/upload', methods=['POST'])
 @csrf.exempt  # CSRF exempt for Tauri frontend
+@admission_controlled('upload')
 def upload_file_public():
     """Upload files to the system for Tauri frontend - allows default user for local desktop app"""
     try:
@@ -2221,107 +2846,28 @@ def upload_file_public():
             if not folder:
                 return jsonify({'success': False, 'error': 'Invalid folder'}), 400
 
-        # Create uploads directory if it doesn't exist
-        upload_config = web_config.flask_config.get_upload_config()
-        upload_dir = Path(upload_config['upload_directory'])
-        upload_dir.mkdir(parents=True, exist_ok=True)
-
         for file in files:
             if file.filename:
                 # Sanitize and validate filename
                 original_filename = file.filename
-                sanitized_fname = sanitize_filename(original_filename)
-
-                if not sanitized_fname:
+                unique_filename, file_path = resolve_upload_filename(original_filename)
+                if not unique_filename:
                     continue
 
-                # Check if file type is allowed
-                if not is_allowed_file(sanitized_fname):
-                    continue
-
-                # Generate unique filename
-                if upload_config['timestamp_filenames']:
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    unique_filename = f"{timestamp}_{sanitized_fname}"
-                else:
-                    unique_filename = sanitized_fname
-
-                file_path = upload_dir / unique_filename
-
-                # Ensure path is within upload directory
-                try:
-                    file_path = file_path.resolve()
-                    upload_dir_resolved = upload_dir.resolve()
-                    if not str(file_path).startswith(str(upload_dir_resolved)):
-                        continue
-                except Exception:
-                    continue
-
-                # Save file
-                try:
-                    file.save(str(file_path))
-                    if not file_path.exists():
-                        continue
-                except Exception as e:
-                    app.logger.error(f"Error saving file {unique_filename}: {e}")
-                    continue
-
-                # Get file info
-                file_size = file_path.stat().st_size
-                mime_type = file.content_type or 'application/octet-stream'
-
-                # Default: Always try to upload to Telegram Saved Messages
-                # Fallback to local storage if Telegram upload fails
-                telegram_upload_success = False
-                telegram_result = None
-
-                # Create database record (default to local, will update if Telegram succeeds)
-                file_record = File(
-                    filename=unique_filename,
-                    original_filename=original_filename,
-                    file_path=str(file_path),
-                    file_size=file_size,
-                    mime_type=mime_type,
-                    folder_id=folder_id,
-                    user_id=user.id,
-                    description=f'Uploaded file: {original_filename}',
-                    storage_type='local'
-                )
-
-                # Try to upload to Telegram Saved Messages
-                try:
-                    app.logger.info(f"Uploading {unique_filename} to Telegram Saved Messages...")
-                    telegram_result = run_async_in_thread(
-                        upload_to_telegram_async(str(file_path), unique_filename, user.id)
-                    )
-
-                    if telegram_result:
-                        telegram_upload_success = True
-                        file_record.storage_type = 'telegram'
-                        file_record.telegram_channel = 'Saved Messages'
-                        file_record.set_telegram_storage(
-                            message_id=telegram_result['message_id'],
-                            channel=telegram_result['channel'],
-                            channel_id=telegram_result['channel_id'],
-                            file_id=telegram_result.get('file_id'),
-                            unique_id=telegram_result.get('unique_id'),
-                            access_hash=telegram_result.get('access_hash'),
-                            file_reference=telegram_result.get('file_reference')
-                        )
-                        app.logger.info(f"✅ Successfully uploaded {unique_filename} to Telegram Saved Messages")
-
-                        # Remove local file since it's now on Telegram
-                        try:
-                            os.remove(file_path)
-                            app.logger.info(f"Removed local temp file: {file_path}")
-                        except Exception as rm_err:
-                            app.logger.warning(f"Could not remove local file: {rm_err}")
-                    else:
-                        app.logger.warning(f"Telegram upload returned no result for {unique_filename}, keeping local")
+                # Save file
+                try:
+                    file.save(str(file_path))
+                    if not file_path.exists():
+                        continue
                 except Exception as e:
-                    app.logger.error(f"Telegram upload error for {unique_filename}: {e}")
-                    # Keep local storage as fallback
+                    app.logger.error(f"Error saving file {unique_filename}: {e}")
+                    continue
+
+                # Get file info
+                file_size = file_path.stat().st_size
+                mime_type = file.content_type or 'application/octet-stream'
 
+                file_record = store_uploaded_file(user, file_path, unique_filename, original_filename, mime_type, folder_id)
                 db.session.add(file_record)
                 # Store record reference to get ID after flush
                 file_records.append((file_record, unique_filename, file_size, mime_type))
@@ -2347,7 +2893,8 @@ def upload_file_public():
 
         # Commit to database
         try:
-            db.session.commit()
+            with telegram_metrics.track('db.commit'):
+                db.session.commit()
             app.logger.info(f"✅ Successfully committed {len(uploaded_files)} files to database")
 
             # Small delay to ensure database write completes
@@ -2370,6 +2917,144 @@ def upload_file_public():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# ============== RESUMABLE UPLOAD API ==============
+
+def _upload_offset_headers(upload_session, response):
+    """tus-style headers so clients can resume from the received prefix"""
+    info = upload_session.to_dict()
+    response.headers['Upload-Offset'] = str(info['offset'])
+    response.headers['Upload-Length'] = str(upload_session.total_size)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.errorhandler(ResumableUploadError)
+def handle_resumable_upload_error(error):
+    return jsonify({'success': False, 'error': str(error)}), error.status_code
+
+
+@app.route('/api/v2/uploads', methods=['POST'])
+@csrf.exempt
+def create_resumable_upload():
+    """Create a resumable upload session (body: filename, size, mime_type, folder_id)"""
+    try:
+        user = get_or_create_user()
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename') or ''
+        size = data.get('size', request.headers.get('Upload-Length'))
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'size is required'}), 400
+
+        unique_filename, _ = resolve_upload_filename(filename)
+        if not unique_filename:
+            return jsonify({'success': False, 'error': 'Invalid or disallowed filename'}), 400
+
+        folder_id = data.get('folder_id')
+        if folder_id:
+            folder = Folder.query.filter_by(id=folder_id, user_id=user.id, is_deleted=False).first()
+            if not folder:
+                return jsonify({'success': False, 'error': 'Invalid folder'}), 400
+
+        upload_session = resumable_uploads.create(user.id, filename, size, data.get('mime_type'), folder_id or None)
+        response = jsonify(dict(upload_session.to_dict(), success=True, max_chunk_size=config.RESUMABLE_MAX_CHUNK))
+        response.status_code = 201
+        response.headers['Location'] = url_for('resumable_upload_chunk', upload_id=upload_session.upload_id)
+        return _upload_offset_headers(upload_session, response)
+    except ResumableUploadError:
+        raise
+    except Exception as e:
+        app.logger.error(f"Error creating resumable upload: {e}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/uploads/<upload_id>', methods=['HEAD', 'GET', 'PATCH', 'DELETE'])
+@csrf.exempt
+def resumable_upload_chunk(upload_id):
+    """HEAD/GET: received offset and ranges, PATCH: write body at Upload-Offset, DELETE: cancel"""
+    try:
+        user = get_or_create_user()
+        upload_session = resumable_uploads.get(upload_id, user.id)
+
+        if request.method == 'HEAD':
+            return _upload_offset_headers(upload_session, app.response_class(status=200))
+
+        if request.method == 'GET':
+            return _upload_offset_headers(upload_session, jsonify(dict(upload_session.to_dict(), success=True)))
+
+        if request.method == 'DELETE':
+            resumable_uploads.delete(upload_session)
+            return jsonify({'success': True, 'message': 'Upload cancelled'})
+
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Upload-Offset header is required'}), 400
+
+        # Raw body straight from the WSGI stream: no multipart parsing or temp-file buffering
+        result = resumable_uploads.write_chunk(upload_session, offset, request.stream, request.content_length)
+        return _upload_offset_headers(upload_session, jsonify(dict(result, success=True)))
+    except ResumableUploadError:
+        raise
+    except Exception as e:
+        app.logger.error(f"Resumable upload error ({upload_id}): {e}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/v2/uploads/<upload_id>/finalize', methods=['POST'])
+@csrf.exempt
+@admission_controlled('upload')
+def finalize_resumable_upload(upload_id):
+    """Hand a fully received upload to the normal storage path (pack / Telegram / local)"""
+    try:
+        user = get_or_create_user()
+        upload_session = resumable_uploads.get(upload_id, user.id)
+        staging_path = resumable_uploads.begin_finalize(upload_session)
+
+        unique_filename, file_path = resolve_upload_filename(upload_session.filename)
+        try:
+            if not unique_filename:
+                raise ResumableUploadError('Invalid or disallowed filename')
+            shutil.move(staging_path, str(file_path))
+        except Exception:
+            resumable_uploads.abort_finalize(upload_session)
+            raise
+
+        try:
+            file_record = store_uploaded_file(user, file_path, unique_filename, upload_session.filename,
+                                              upload_session.mime_type, upload_session.folder_id)
+            db.session.add(file_record)
+            with telegram_metrics.track('db.commit'):
+                db.session.commit()
+        except Exception:
+            # Never leave the session stuck in 'finalizing'
+            db.session.rollback()
+            resumable_uploads.fail_finalize(upload_session, str(file_path))
+            raise
+        resumable_uploads.complete(upload_session, file_record.id)
+
+        return jsonify({
+            'success': True,
+            'message': 'Upload finalized',
+            'file': {
+                'id': file_record.id,
+                'filename': unique_filename,
+                'size': file_record.file_size,
+                'type': file_record.mime_type,
+                'storage_type': file_record.storage_type
+            }
+        })
+    except ResumableUploadError:
+        raise
+    except Exception as e:
+        app.logger.error(f"Error finalizing upload {upload_id}: {e}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ============== FOLDER MANAGEMENT API ==============
 
 # API endpoint to get all folders
@@ -2528,6 +3213,135 @@ def move_file_to_folder(file_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _copy_file_records(user, plan):
+    """Copy files given a list of (source File, target folder_id, new filename).
+    Telegram files are forwarded in batches, local files are copied on disk."""
+    telegram_sources = [src for src, _, _ in plan if src.is_stored_on_telegram()]
+    forwarded = run_async_in_thread(forward_files_to_saved_messages_async(telegram_sources)) if telegram_sources else {}
+    upload_dir = Path(web_config.flask_config.get_directories()['uploads'])
+    return copy_file_records(user.id, plan, forwarded, upload_dir)
+
+
+# API endpoint to copy files (server-side, via Telegram forwarding)
+@app.route('/api/v2/files/copy', methods=['POST'])
+@csrf.exempt
+def copy_files():
+    """Copy one or more files into a folder without downloading/re-uploading"""
+    return _copy_files_response(request.get_json(silent=True) or {})
+
+
+@app.route('/api/v2/files/<int:file_id>/copy', methods=['POST'])
+@csrf.exempt
+def copy_file(file_id):
+    """Copy a single file (optionally into another folder)"""
+    data = request.get_json(silent=True) or {}
+    return _copy_files_response(dict(data, file_ids=[file_id]))
+
+
+def _copy_files_response(data):
+    """Shared implementation of the file copy endpoints"""
+    try:
+        file_ids = data.get('file_ids') or []
+        if not file_ids:
+            return jsonify({'success': False, 'error': 'file_ids is required'}), 400
+
+        user = get_or_create_user()
+        files = File.query.filter(File.id.in_(file_ids), File.user_id == user.id, File.is_deleted == False).all()
+        if not files:
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+
+        # Default target: same folder as each source
+        has_target = 'folder_id' in data
+        target_folder_id = data.get('folder_id')
+        if has_target and target_folder_id is not None:
+            if not Folder.query.filter_by(id=target_folder_id, user_id=user.id, is_deleted=False).first():
+                return jsonify({'success': False, 'error': 'Target folder not found'}), 404
+
+        used_names = {}
+        plan = []
+        for src in files:
+            folder_id = target_folder_id if has_target else src.folder_id
+            if folder_id not in used_names:
+                used_names[folder_id] = {f.filename for f in File.query.filter_by(
+                    folder_id=folder_id, user_id=user.id, is_deleted=False).with_entities(File.filename)}
+            name = copy_name(src.filename, used_names[folder_id])
+            used_names[folder_id].add(name)
+            plan.append((src, folder_id, name))
+
+        copies, failed = _copy_file_records(user, plan)
+        db.session.commit()
+
+        return jsonify({
+            'success': bool(copies),
+            'message': f'Copied {len(copies)} file(s)',
+            'files': [{
+                'id': f.id,
+                'unique_id': f.unique_id,
+                'filename': f.filename,
+                'folder_id': f.folder_id,
+                'storage_type': f.storage_type,
+                'telegram_message_id': f.telegram_message_id
+            } for f in copies],
+            'failed': failed
+        })
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Copy files error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# API endpoint to copy a folder tree
+@app.route('/api/v2/folders/<int:folder_id>/copy', methods=['POST'])
+@csrf.exempt
+def copy_folder(folder_id):
+    """Copy a folder with all files and subfolders - Telegram files are forwarded, not re-uploaded"""
+    try:
+        data = request.get_json(silent=True) or {}
+        user = get_or_create_user()
+
+        folder = Folder.query.filter_by(id=folder_id, user_id=user.id, is_deleted=False).first()
+        if not folder:
+            return jsonify({'success': False, 'error': 'Folder not found'}), 404
+
+        parent_id = data['parent_id'] if 'parent_id' in data else folder.parent_id
+        if parent_id is not None:
+            parent = Folder.query.filter_by(id=parent_id, user_id=user.id, is_deleted=False).first()
+            if not parent:
+                return jsonify({'success': False, 'error': 'Target folder not found'}), 404
+            # Copying a folder into its own subtree would never terminate
+            node = parent
+            while node is not None:
+                if node.id == folder.id:
+                    return jsonify({'success': False, 'error': 'Cannot copy a folder into itself'}), 400
+                node = node.parent
+
+        sibling_names = {f.name for f in Folder.query.filter_by(parent_id=parent_id, user_id=user.id, is_deleted=False)}
+        new_name = data.get('name') or copy_name(folder.name, sibling_names)
+
+        new_folders, plan = copy_folder_tree(folder, parent_id, new_name, user.id)
+        new_root = new_folders[0]
+        copies, failed = _copy_file_records(user, plan)
+        db.session.flush()
+
+        # Paths need parents resolved
+        for new_folder in new_folders:
+            new_folder.path = new_folder.get_full_path()
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': f'Folder "{folder.name}" copied as "{new_root.name}"',
+            'folder': new_root.to_dict(),
+            'copied_files': len(copies),
+            'copied_folders': len(new_folders),
+            'failed': failed
+        })
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Copy folder error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # API endpoint to toggle star/favorite for a file
 @app.route('/api/v2/files/<int:file_id>/star', methods=['POST'])
 @csrf.exempt
@@ -2641,6 +3455,7 @@ def get_starred_items():
 # API endpoint to delete a folder
 @app.route('/api/v2/folders/<int:folder_id>', methods=['DELETE'])
 @csrf.exempt
+@admission_controlled('delete')
 def delete_folder_public(folder_id):
     """Delete a folder and all its contents (files + subfolders) recursively"""
     try:
@@ -2865,8 +3680,72 @@ def receive_frontend_logs():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def fetch_telegram_to_cache(file_record, filename):
+    """Telegram file in the persistent download cache (data/cache), downloading it on a miss.
+    Returns the cached path or None"""
+    # Use a persistent cache directory
+    cache_dir = os.path.join(app.root_path, '..', 'data', 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Create a safe filename for the cache
+    safe_filename = "".join([c for c in filename if c.isalpha() or c.isdigit() or c in (' ', '.', '_', '-')]).strip()
+    cache_file_path = os.path.join(cache_dir, f"{file_record.id}_{safe_filename}")
+
+    if os.path.exists(cache_file_path) and os.path.getsize(cache_file_path) > 0:
+        app.logger.info(f"Serving from cache: {cache_file_path}")
+        downloaded_path = cache_file_path
+    else:
+        app.logger.info(f"Downloading from Telegram to cache: {cache_file_path}")
+        # Use a unique temp file for download to avoid race conditions
+        import uuid
+        temp_cache_path = f"{cache_file_path}.{uuid.uuid4().hex[:8]}.tmp"
+
+        try:
+            # Download from Telegram to temp cache file
+            result_path = run_async_in_thread(
+                download_from_telegram_async(file_record, temp_cache_path)
+            )
+
+            if result_path and os.path.exists(result_path) and os.path.getsize(result_path) > 0:
+                # Atomic rename (or close enough) to final cache path
+                # This ensures we don't serve partial files to other requests
+                try:
+                    if os.path.exists(cache_file_path):
+                        # Use standard replace or remove+rename
+                        # On Windows os.rename might fail if dest exists
+                        try:
+                            os.replace(result_path, cache_file_path)
+                        except OSError:
+                            # Fallback if replace fails (e.g. file locked)
+                            if os.path.exists(cache_file_path):
+                                os.remove(result_path) # Cache file already exists/wins
+                    else:
+                        os.rename(result_path, cache_file_path)
+
+                    downloaded_path = cache_file_path
+                except Exception as e:
+                    app.logger.error(f"Failed to rename cache file: {e}")
+                    # Serve the temp file if rename failed but download succeeded
+                    downloaded_path = result_path
+            else:
+                app.logger.error("Download returned path but file missing or empty")
+                downloaded_path = None
+                # Cleanup temp
+                if os.path.exists(temp_cache_path):
+                    try: os.remove(temp_cache_path)
+                    except: pass
+        except Exception as e:
+            app.logger.error(f"Error during cache download: {e}")
+            if os.path.exists(temp_cache_path):
+                try: os.remove(temp_cache_path)
+                except: pass
+            downloaded_path = None
+    return downloaded_path
+
+
 @app.route('/download/<filename>')
 @login_required
+@admission_controlled('download')
 def download_file(filename):
     """Download uploaded files"""
     try:
@@ -2892,63 +3771,7 @@ def download_file(filename):
             if file_record.is_stored_on_telegram():
                 app.logger.info(f"Downloading from Telegram: {filename}")
                 try:
-                    # Use a persistent cache directory
-                    cache_dir = os.path.join(app.root_path, '..', 'data', 'cache')
-                    os.makedirs(cache_dir, exist_ok=True)
-                    
-                    # Create a safe filename for the cache
-                    safe_filename = "".join([c for c in filename if c.isalpha() or c.isdigit() or c in (' ', '.', '_', '-')]).strip()
-                    cache_file_path = os.path.join(cache_dir, f"{file_record.id}_{safe_filename}")
-
-                    if os.path.exists(cache_file_path) and os.path.getsize(cache_file_path) > 0:
-                        app.logger.info(f"Serving from cache: {cache_file_path}")
-                        downloaded_path = cache_file_path
-                    else:
-                        app.logger.info(f"Downloading from Telegram to cache: {cache_file_path}")
-                        # Use a unique temp file for download to avoid race conditions
-                        import uuid
-                        temp_cache_path = f"{cache_file_path}.{uuid.uuid4().hex[:8]}.tmp"
-                        
-                        try:
-                            # Download from Telegram to temp cache file
-                            result_path = run_async_in_thread(
-                                download_from_telegram_async(file_record, temp_cache_path)
-                            )
-                            
-                            if result_path and os.path.exists(result_path) and os.path.getsize(result_path) > 0:
-                                # Atomic rename (or close enough) to final cache path
-                                # This ensures we don't serve partial files to other requests
-                                try:
-                                    if os.path.exists(cache_file_path):
-                                        # Use standard replace or remove+rename
-                                        # On Windows os.rename might fail if dest exists
-                                        try:
-                                            os.replace(result_path, cache_file_path)
-                                        except OSError:
-                                            # Fallback if replace fails (e.g. file locked)
-                                            if os.path.exists(cache_file_path):
-                                                os.remove(result_path) # Cache file already exists/wins
-                                    else:
-                                        os.rename(result_path, cache_file_path)
-                                    
-                                    downloaded_path = cache_file_path
-                                except Exception as e:
-                                    app.logger.error(f"Failed to rename cache file: {e}")
-                                    # Serve the temp file if rename failed but download succeeded
-                                    downloaded_path = result_path
-                            else:
-                                app.logger.error("Download returned path but file missing or empty")
-                                downloaded_path = None
-                                # Cleanup temp
-                                if os.path.exists(temp_cache_path):
-                                    try: os.remove(temp_cache_path)
-                                    except: pass
-                        except Exception as e:
-                            app.logger.error(f"Error during cache download: {e}")
-                            if os.path.exists(temp_cache_path):
-                                try: os.remove(temp_cache_path)
-                                except: pass
-                            downloaded_path = None
+                    downloaded_path = fetch_telegram_to_cache(file_record, filename)
 
                     if downloaded_path and os.path.exists(downloaded_path):
                         app.logger.info(f"Ready to serve: {downloaded_path}")
@@ -2969,6 +3792,21 @@ def download_file(filename):
                     app.logger.error(f"Telegram download error: {e}")
                     return jsonify({'error': f'Telegram download failed: {str(e)}'}), 500
 
+            # Packed small file: served from its pack byte range
+            elif file_record.is_packed():
+                try:
+                    import io
+                    data = run_async_in_thread(read_packed_file_async(file_record))
+                    return send_file(
+                        io.BytesIO(data),
+                        as_attachment=as_attachment,
+                        download_name=filename,
+                        mimetype=file_record.mime_type
+                    )
+                except Exception as e:
+                    app.logger.error(f"Packed file read error: {e}")
+                    return jsonify({'error': f'Packed file read failed: {str(e)}'}), 500
+
             # Check if file is stored locally
             elif file_record.is_stored_locally():
                 app.logger.info(f"Downloading from local storage: {filename}")
@@ -3012,8 +3850,77 @@ def download_file(filename):
         app.logger.error(f"Download error: {e}")
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/api/v2/files/<int:file_id>/media-url', methods=['GET'])
+@csrf.exempt
+def get_signed_media_url(file_id):
+    """Mint a short-lived signed URL for a file (?ttl= seconds)"""
+    try:
+        user = get_or_create_user()
+        file_record = File.query.filter_by(id=file_id, user_id=user.id, is_deleted=False).first()
+        if not file_record:
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+
+        ttl = request.args.get('ttl', type=int)
+        token = media_url_signer.sign(media_url_signer.claims_for(file_record), ttl)
+        claims = media_url_signer.verify(token)
+        return jsonify({
+            'success': True,
+            'url': url_for('signed_media', token=token, name=file_record.filename),
+            'expires_at': datetime.fromtimestamp(claims['e'], timezone.utc).isoformat()
+        })
+    except Exception as e:
+        app.logger.error(f"Error signing media URL for file {file_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/media/<token>')
+@app.route('/media/<token>/<path:name>')
+@csrf.exempt
+@admission_controlled('download')
+def signed_media(token, name=None):
+    """Serve a file from a signed media URL: no login session, no File query (?download=true for attachment)"""
+    try:
+        claims = media_url_signer.verify(token)
+    except SignedUrlError as e:
+        return jsonify({'error': str(e)}), 403
+
+    file_record = media_url_signer.record_from_claims(claims)
+    filename = file_record.filename
+    as_attachment = request.args.get('download', 'false').lower() == 'true'
+    try:
+        if file_record.is_stored_on_telegram():
+            file_path = fetch_telegram_to_cache(file_record, filename)
+            if not file_path:
+                return jsonify({'error': 'Failed to download from Telegram'}), 502
+        elif file_record.is_packed():
+            import io
+            data = run_async_in_thread(read_pack_range_async(
+                claims['pk'], claims.get('pm'), file_record.pack_offset, file_record.pack_length))
+            file_path = io.BytesIO(data)
+        elif file_record.storage_type == 'local':
+            upload_dir = Path(web_config.flask_config.get_upload_config()['upload_directory'])
+            if not upload_dir.is_absolute():
+                upload_dir = (Path(app.root_path).parent / upload_dir).resolve()
+            file_path = (upload_dir / filename).resolve()
+            if not str(file_path).startswith(str(upload_dir)) or not file_path.exists():
+                return jsonify({'error': 'File not found on disk'}), 404
+            file_path = str(file_path)
+        else:
+            return jsonify({'error': 'File storage type unknown'}), 500
+
+        response = send_file(file_path, as_attachment=as_attachment, download_name=filename,
+                             mimetype=file_record.mime_type, conditional=True)
+        # The URL itself is the credential: cacheable by this client until it expires
+        response.headers['Cache-Control'] = f"private, max-age={max(0, int(claims['e'] - time.time()))}"
+        return response
+    except Exception as e:
+        app.logger.error(f"Signed media error for file {claims.get('i')}: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/delete_file', methods=['POST'])
 @csrf.exempt
+@admission_controlled('delete')
 def delete_file():
     """Delete a file from database (soft delete) and optionally remove local disk file safely.
     Also supports deleting legacy output files by filename (json/csv/xlsx).
@@ -3291,6 +4198,7 @@ def bulk_file_operations():
 @app.route('/api/upload', methods=['POST'])
 @csrf.exempt  # CSRF exempt for API clients
 @handle_api_error
+@admission_controlled('upload')
 def upload_file():
     """Upload files to the system with comprehensive validation - allows default user for local desktop app"""
     upload_step_id = None
@@ -3692,6 +4600,14 @@ def search_files():
 
     user = get_or_create_user()
 
+    # Telegram-side search on Saved Messages runs in parallel with the local query
+    # (folder-scoped searches stay local: remote hits have no folder yet)
+    remote_param = request.args.get('remote')
+    use_remote = config.SEARCH_TELEGRAM_FALLBACK if remote_param is None else remote_param.lower() in ('1', 'true', 'yes')
+    remote_search = None
+    if use_remote and page == 1 and not folder_id:
+        remote_search = RemoteSearch(app, query, config.SEARCH_REMOTE_LIMIT)
+
     # Build search query
     search_query = File.query.options(
         db.joinedload(File.owner),
@@ -3801,64 +4717,77 @@ def search_files():
         else:
             search_query = search_query.order_by(File.created_at.desc())
 
-        # Execute search with pagination
-        pagination = search_query.paginate(page=page, per_page=per_page, error_out=False)
-        files = pagination.items
-
-        # Convert to dict format with search relevance
-        results = []
-        for file_record in files:
-            file_dict = file_record.to_dict()
+    # Execute search with pagination
+    pagination = search_query.paginate(page=page, per_page=per_page, error_out=False)
+    files = pagination.items
 
-            # Calculate search relevance score
-            relevance_score = 0
-            filename_lower = file_record.filename.lower()
+    # Convert to dict format with search relevance
+    results = []
+    for file_record in files:
+        file_dict = file_record.to_dict()
 
-            for term in search_terms:
-                if term in filename_lower:
-                    relevance_score += 10
-                if file_record.description and term in file_record.description.lower():
-                    relevance_score += 5
-                if file_record.telegram_channel and term in file_record.telegram_channel.lower():
-                    relevance_score += 3
-                if file_record.tags and term in file_record.tags.lower():
-                    relevance_score += 7
-
-            file_dict['relevance_score'] = relevance_score
-            results.append(file_dict)
+        # Calculate search relevance score
+        relevance_score = 0
+        filename_lower = file_record.filename.lower()
 
-        # Sort by relevance if no specific sort order
-        if sort_by == 'relevance':
-            results.sort(key=lambda x: x['relevance_score'], reverse=(sort_order == 'desc'))
+        for term in search_terms:
+            if term in filename_lower:
+                relevance_score += 10
+            if file_record.description and term in file_record.description.lower():
+                relevance_score += 5
+            if file_record.telegram_channel and term in file_record.telegram_channel.lower():
+                relevance_score += 3
+            if file_record.tags and term in file_record.tags.lower():
+                relevance_score += 7
+
+        file_dict['relevance_score'] = relevance_score
+        results.append(file_dict)
+
+    # Sort by relevance if no specific sort order
+    if sort_by == 'relevance':
+        results.sort(key=lambda x: x['relevance_score'], reverse=(sort_order == 'desc'))
+
+    # Merge Telegram hits the DB does not know yet (de-duplicated by message ID)
+    remote_status = None
+    if remote_search:
+        hits = remote_search.wait(config.SEARCH_REMOTE_TIMEOUT)
+        if hits is None:
+            remote_status = {'included': 0, 'error': remote_search.result['error']}
+        else:
+            new_hits = unknown_hits(user.id, hits)
+            results.extend(hit_to_dict(h) for h in new_hits)
+            upsert_hits_async(app, user.id, new_hits)
+            remote_status = {'included': len(new_hits), 'matched': len(hits)}
 
-        return jsonify({
-            'success': True,
-            'results': results,
+    return jsonify({
+        'success': True,
+        'results': results,
+        'total': pagination.total,
+        'query': query,
+        'remote': remote_status,
+        'pagination': {
+            'page': pagination.page,
+            'per_page': pagination.per_page,
             'total': pagination.total,
-            'query': query,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_prev': pagination.has_prev,
-                'has_next': pagination.has_next,
-                'prev_num': pagination.prev_num,
-                'next_num': pagination.next_num
-            },
-            'filters': {
-                'file_type': file_type,
-                'folder_id': folder_id,
-                'date_from': date_from,
-                'date_to': date_to,
-                'size_min': size_min,
-                'size_max': size_max,
-                'channel': channel,
-                'tags': tags,
-                'sort_by': sort_by,
-                'sort_order': sort_order
-            }
-        })
+            'pages': pagination.pages,
+            'has_prev': pagination.has_prev,
+            'has_next': pagination.has_next,
+            'prev_num': pagination.prev_num,
+            'next_num': pagination.next_num
+        },
+        'filters': {
+            'file_type': file_type,
+            'folder_id': folder_id,
+            'date_from': date_from,
+            'date_to': date_to,
+            'size_min': size_min,
+            'size_max': size_max,
+            'channel': channel,
+            'tags': tags,
+            'sort_by': sort_by,
+            'sort_order': sort_order
+        }
+    })
 
 @app.route('/api/search/suggestions', methods=['GET'])
 @login_required
@@ -4083,6 +5012,7 @@ def create_folder():
 
 @app.route('/api/folders/<int:folder_id>', methods=['DELETE'])
 @login_required
+@admission_controlled('delete')
 def delete_folder(folder_id):
     """Delete a folder (mark as deleted)"""
     try:
@@ -4891,6 +5821,7 @@ def verify_share_password(token):
         return render_template('share/error.html', error=str(e)), 500
 
 @app.route('/share/<token>/download')
+@admission_controlled('download')
 def download_shared_file(token):
     """Download a shared file (public access)"""
     try:
@@ -5058,6 +5989,7 @@ def bulk_operations():
 
 @app.route('/api/bulk_download', methods=['POST'])
 @login_required
+@admission_controlled('download')
 def bulk_download():
     """Create a ZIP archive for bulk download of multiple files"""
     try:
@@ -5322,13 +6254,130 @@ def compress_files():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _is_zip_file(file_record):
+    """Check whether a file record looks like a ZIP archive"""
+    mime_type = (file_record.mime_type or '').lower()
+    return 'zip' in mime_type or (file_record.filename or '').lower().endswith('.zip')
+
+def _list_local_archive(file_path):
+    """Build an archive index (same shape as the remote one) for a local ZIP"""
+    import zipfile
+
+    entries = []
+    with zipfile.ZipFile(file_path, 'r') as zipf:
+        for info in zipf.infolist():
+            entries.append({
+                'name': info.filename,
+                'size': info.file_size,
+                'compressed_size': info.compress_size,
+                'compress_type': info.compress_type,
+                'crc': info.CRC,
+                'encrypted': bool(info.flag_bits & 0x1),
+                'is_dir': info.is_dir(),
+                'modified': datetime(*info.date_time).isoformat(),
+                'header_offset': info.header_offset,
+            })
+    return {'archive_size': os.path.getsize(file_path), 'total_entries': len(entries), 'entries': entries}
+
+@app.route('/api/v2/files/<int:file_id>/archive', methods=['GET'])
+@csrf.exempt
+@admission_controlled('download')
+def list_archive_contents(file_id):
+    """List ZIP contents - Telegram archives only fetch EOCD + central directory (cached per file)"""
+    try:
+        user = get_or_create_user()
+        archive_file = File.query.filter_by(id=file_id, user_id=user.id, is_deleted=False).first()
+        if not archive_file:
+            return jsonify({'success': False, 'error': 'Archive file not found'}), 404
+        if not _is_zip_file(archive_file):
+            return jsonify({'success': False, 'error': 'File is not a ZIP archive'}), 400
+
+        cached = False
+        if archive_file.is_stored_on_telegram():
+            index = get_cached_index(archive_file)
+            cached = index is not None
+            if index is None:
+                index = run_async_in_thread(list_remote_archive_async(archive_file))
+        elif archive_file.file_path and os.path.exists(archive_file.file_path):
+            index = _list_local_archive(archive_file.file_path)
+        else:
+            return jsonify({'success': False, 'error': 'Archive data not available'}), 404
+
+        return jsonify({
+            'success': True,
+            'file_id': archive_file.id,
+            'filename': archive_file.filename,
+            'cached': cached,
+            'total_entries': index['total_entries'],
+            'entries': index['entries']
+        })
+    except RemoteArchiveError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Archive listing error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/v2/files/<int:file_id>/archive/member', methods=['GET'])
+@csrf.exempt
+@admission_controlled('download')
+def download_archive_member(file_id):
+    """Download a single archive member - Telegram archives fetch only that member's byte range"""
+    try:
+        member_name = request.args.get('name', '')
+        as_attachment = request.args.get('download', '1') != '0'
+        if not member_name:
+            return jsonify({'success': False, 'error': 'Member name is required'}), 400
+
+        user = get_or_create_user()
+        archive_file = File.query.filter_by(id=file_id, user_id=user.id, is_deleted=False).first()
+        if not archive_file:
+            return jsonify({'success': False, 'error': 'Archive file not found'}), 404
+        if not _is_zip_file(archive_file):
+            return jsonify({'success': False, 'error': 'File is not a ZIP archive'}), 400
+
+        download_name = os.path.basename(member_name.rstrip('/')) or 'file'
+
+        if not archive_file.is_stored_on_telegram():
+            import zipfile
+            import io
+            with zipfile.ZipFile(archive_file.file_path, 'r') as zipf:
+                data = zipf.read(member_name)
+            return send_file(io.BytesIO(data), as_attachment=as_attachment, download_name=download_name)
+
+        # Cache extracted members next to the regular download cache
+        import hashlib
+        cache_dir = os.path.join(app.root_path, '..', 'data', 'cache', 'archive_members')
+        os.makedirs(cache_dir, exist_ok=True)
+        member_key = hashlib.sha1(member_name.encode('utf-8')).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"{archive_file.id}_{member_key}_{secure_filename(download_name) or 'file'}")
+
+        if not (os.path.exists(cache_path) and os.path.getsize(cache_path) > 0):
+            temp_path = f"{cache_path}.{secrets.token_hex(4)}.tmp"
+            try:
+                run_async_in_thread(extract_remote_members_async(archive_file, [(member_name, temp_path)]))
+                os.replace(temp_path, cache_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        return send_file(cache_path, as_attachment=as_attachment, download_name=download_name)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Member not found in archive'}), 404
+    except RemoteArchiveError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Archive member download error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/extract_archive/<int:file_id>', methods=['POST'])
 @login_required
+@admission_controlled('download')
 def extract_archive(file_id):
-    """Extract files from a ZIP archive"""
+    """Extract files from a ZIP archive (optionally only the given members)"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         extract_to_folder = data.get('folder_id')  # Optional folder to extract to
+        selected_members = data.get('members')  # Optional list of member names
 
         user = get_or_create_user()
         archive_file = File.query.filter_by(id=file_id, user_id=user.id, is_deleted=False).first()
@@ -5340,6 +6389,8 @@ def extract_archive(file_id):
             return jsonify({'error': 'File is not a ZIP archive'}), 400
 
         import zipfile
+        import shutil
+        import mimetypes
         from pathlib import Path
 
         # Validate folder if specified
@@ -5349,48 +6400,62 @@ def extract_archive(file_id):
             if not folder:
                 return jsonify({'error': 'Destination folder not found'}), 404
 
-        extracted_files = []
-
-        # Extract archive
-        with zipfile.ZipFile(archive_file.file_path, 'r') as zipf:
-            # Get upload directory
-            upload_dir = Path(web_config.flask_config.get_directories()['uploads'])
-
-            for file_info in zipf.filelist:
-                if not file_info.is_dir():
-                    # Extract file
-                    extracted_data = zipf.read(file_info.filename)
-
-                    # Create unique filename
-                    safe_filename = secure_filename(file_info.filename)
-                    unique_filename = f"{int(time.time())}_{safe_filename}"
-                    file_path = upload_dir / unique_filename
-
-                    # Save extracted file
-                    with open(file_path, 'wb') as f:
-                        f.write(extracted_data)
-
-                    # Create database record
-                    extracted_file = File(
-                        filename=safe_filename,
-                        original_filename=file_info.filename,
-                        file_path=str(file_path),
-                        file_size=file_info.file_size,
-                        mime_type='application/octet-stream',  # Default mime type
-                        user_id=user.id,
-                        folder_id=folder.id if folder else None,
-                        description=f'Extracted from {archive_file.filename}'
-                    )
+        # Get upload directory
+        upload_dir = Path(web_config.flask_config.get_directories()['uploads'])
 
-                    db.session.add(extracted_file)
-                    extracted_files.append({
-                        'filename': safe_filename,
-                        'size': file_info.file_size,
-                        'id': extracted_file.id
-                    })
+        # Telegram archives: list via EOCD/central directory, extract member ranges only
+        if archive_file.is_stored_on_telegram():
+            index = get_cached_index(archive_file) or run_async_in_thread(list_remote_archive_async(archive_file))
+            members = [(entry['name'], entry['size']) for entry in index['entries'] if not entry['is_dir']]
+        else:
+            with zipfile.ZipFile(archive_file.file_path, 'r') as zipf:
+                members = [(info.filename, info.file_size) for info in zipf.filelist if not info.is_dir()]
+
+        if selected_members:
+            wanted = set(selected_members)
+            members = [m for m in members if m[0] in wanted]
+
+        targets = []
+        for member_name, _ in members:
+            safe_filename = secure_filename(member_name)
+            unique_filename = f"{int(time.time())}_{safe_filename}"
+            targets.append((member_name, str(upload_dir / unique_filename)))
+
+        if archive_file.is_stored_on_telegram():
+            run_async_in_thread(extract_remote_members_async(archive_file, targets))
+        else:
+            # Stream members to disk instead of reading them fully into memory
+            with zipfile.ZipFile(archive_file.file_path, 'r') as zipf:
+                for member_name, file_path in targets:
+                    with zipf.open(member_name) as src, open(file_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+
+        extracted_records = []
+        for (member_name, member_size), (_, file_path) in zip(members, targets):
+            safe_filename = secure_filename(member_name)
+
+            # Create database record
+            extracted_file = File(
+                filename=safe_filename,
+                original_filename=member_name,
+                file_path=file_path,
+                file_size=member_size,
+                mime_type=mimetypes.guess_type(member_name)[0] or 'application/octet-stream',
+                user_id=user.id,
+                folder_id=folder.id if folder else None,
+                description=f'Extracted from {archive_file.filename}'
+            )
+            db.session.add(extracted_file)
+            extracted_records.append(extracted_file)
 
         db.session.commit()
 
+        extracted_files = [{
+            'filename': f.filename,
+            'size': f.file_size,
+            'id': f.id
+        } for f in extracted_records]
+
         # Invalidate cache
         for page in range(1, 11):
             for per_page in [20, 50, 100]:
@@ -18,7 +18,9 @@ from telethon import TelegramClient
 from telethon.errors import PhoneCodeInvalidError, PhoneNumberInvalidError, SessionPasswordNeededError, PhoneCodeExpiredError
 from telethon.tl.types import User as TelegramUser
 import config
+from telegram_metrics import InstrumentedTelegramClient
 from db import db, User, get_or_create_user
+from session_manager import session_manager
 from flask import current_app
 
 # Import detailed logging
@@ -128,7 +130,7 @@ class TelegramAuthenticator:
             session_name = f"auth_session_{os.urandom(8).hex()}"
 
         try:
-            self.client = TelegramClient(
+            self.client = InstrumentedTelegramClient(
                 f"data/{session_name}",
                 int(config.API_ID),
                 config.API_HASH
@@ -187,7 +189,7 @@ class TelegramAuthenticator:
             # Use phone number hash to avoid creating too many session files
             phone_hash = hashlib.md5(phone_number.encode()).hexdigest()[:8]
             request_session = f"code_req_{phone_hash}"
-            client = TelegramClient(
+            client = InstrumentedTelegramClient(
                 f"data/{request_session}",
                 int(config.API_ID),
                 config.API_HASH
@@ -409,7 +411,7 @@ class TelegramAuthenticator:
             print(f"[QR_ASYNC] Creating client for token {token[:8]}...")
             
             # Create client in THIS event loop
-            client = TelegramClient(
+            client = InstrumentedTelegramClient(
                 f"data/{session_name}",
                 int(config.API_ID),
                 config.API_HASH
@@ -840,7 +842,7 @@ class TelegramAuthenticator:
             # Create a new client with a unique session name for verification
             # Use a simpler session name to avoid potential issues
             verification_session = session_data.get('request_session', f"verify_{session_id[:8]}")
-            client = TelegramClient(
+            client = InstrumentedTelegramClient(
                 f"data/{verification_session}",
                 int(config.API_ID),
                 config.API_HASH
@@ -1434,8 +1436,11 @@ class TelegramAuthenticator:
             session_file = project_root / "data" / "session.session"
             session_import = project_root / "data" / "session_import.session"
             
-            # Xác định đường dẫn session (không bao gồm .session)
-            if session_file.exists():
+            # Xác định session: ưu tiên session chung trong bộ nhớ (không mở file .session)
+            shared_session = session_manager.get_session()
+            if shared_session is not None:
+                session_path = shared_session
+            elif session_file.exists():
                 session_path = str(project_root / "data" / "session")
             elif session_import.exists():
                 session_path = str(project_root / "data" / "session_import")
@@ -1444,7 +1449,7 @@ class TelegramAuthenticator:
             else:
                 session_path = "session"
             
-            print(f"[CHECK_SESSION] Using session path: {session_path}")
+            print(f"[CHECK_SESSION] Using session: {'in-memory' if shared_session is not None else session_path}")
             
             # Thử với API credentials nếu có
             api_id = int(config.API_ID) if hasattr(config, 'API_ID') and config.API_ID and config.API_ID not in ['', '0'] else None
@@ -1458,7 +1463,7 @@ class TelegramAuthenticator:
                 api_id = 0
                 api_hash = ""
             
-            client = TelegramClient(
+            client = InstrumentedTelegramClient(
                 session_path,
                 api_id,
                 api_hash
@@ -1485,6 +1490,7 @@ class TelegramAuthenticator:
                     print(f"[CHECK_SESSION] Không thể tải avatar: {avatar_err}")
                 
                 await client.disconnect()
+                session_manager.release(client.session)
                 
                 # Format số điện thoại với dấu +
                 phone_formatted = me.phone
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Availability Verifier
+Checks that Telegram-stored files still exist with get_messages(ids=[...]) batches of
+100 (100k files ~ 1k RPCs), refreshes their file references and marks the ones deleted
+outside TeleDrive. Runs incrementally: each pass takes the least recently verified files
+"""
+
+import asyncio
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List
+
+import config
+from db import db, File
+from transfer_scheduler import set_transfer_priority, BACKGROUND
+
+VERIFY_BATCH_SIZE = 100  # messages.getMessages limit
+
+
+class AvailabilityVerifier:
+    """Background verification job"""
+
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.running = False
+        self.stats = {'checked': 0, 'missing': 0, 'restored': 0, 'refreshed': 0, 'rpcs': 0, 'failed': 0,
+                      'last_run': None, 'last_error': None, 'last_report': None}
+
+    def start(self, app):
+        """Start the daemon thread (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.app = app
+            self._thread = threading.Thread(target=self._run, daemon=True, name='availability-verifier')
+            self._thread.start()
+        print("🩺 Started availability verifier")
+
+    def wake(self):
+        """Run a verification pass now"""
+        self._wake.set()
+
+    def status(self) -> Dict[str, Any]:
+        """Job status and last report for the API"""
+        return dict(self.stats, running=self.running, alive=bool(self._thread and self._thread.is_alive()))
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=config.VERIFY_INTERVAL)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.running = True
+                    asyncio.run(self.verify_pass())
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+                print(f"[VERIFY] Worker error: {e}")
+            finally:
+                self.running = False
+
+    def _due_files(self, limit: int, force: bool = False) -> List[File]:
+        query = File.query.filter(
+            File.storage_type == 'telegram',
+            File.is_deleted == False,
+            File.telegram_message_id.isnot(None)
+        )
+        if not force:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=config.VERIFY_MIN_AGE)
+            query = query.filter(db.or_(File.verified_at.is_(None), File.verified_at < cutoff))
+        # Never-verified first, then oldest check
+        return query.order_by(File.verified_at.isnot(None), File.verified_at, File.id).limit(limit).all()
+
+    @staticmethod
+    def apply_result(file_record: File, message, now: datetime) -> str:
+        """Update one row from its fetched message, returns 'missing', 'restored', 'refreshed' or 'ok'"""
+        file_record.verified_at = now
+        media_obj = None
+        if message is not None and message.media:
+            media_obj = getattr(message.media, 'document', None) or getattr(message.media, 'photo', None)
+
+        if message is None or not message.media:
+            outcome = 'ok' if file_record.telegram_missing else 'missing'
+            file_record.telegram_missing = True
+            return outcome
+
+        outcome = 'restored' if file_record.telegram_missing else 'ok'
+        file_record.telegram_missing = False
+        file_reference = getattr(media_obj, 'file_reference', None)
+        if file_reference and file_reference != file_record.telegram_file_reference:
+            file_record.telegram_file_reference = file_reference
+            if outcome == 'ok':
+                outcome = 'refreshed'
+        return outcome
+
+    @staticmethod
+    def _record_failure(records: List[File], peer, error: Exception, report: Dict[str, Any]):
+        """Report files that could not be checked. They are stamped anyway so the next pass
+        moves on to other files, and come round again after VERIFY_MIN_AGE"""
+        now = datetime.now(timezone.utc)
+        for file_record in records:
+            file_record.verified_at = now
+        db.session.commit()
+        report['failed'] += len(records)
+        report['errors'].append({'peer': str(peer), 'files': len(records), 'error': str(error)})
+        print(f"[VERIFY] Could not check {len(records)} files in {peer}: {error}")
+
+    async def verify_pass(self, limit: int = None, force: bool = False) -> Dict[str, Any]:
+        """Verify up to `limit` due files, grouped by chat, 100 IDs per RPC"""
+        from telegram_storage import TelegramStorageManager
+        set_transfer_priority(BACKGROUND)
+
+        files = self._due_files(limit or config.VERIFY_FILES_PER_RUN, force)
+        report = {'checked': 0, 'missing': 0, 'restored': 0, 'refreshed': 0, 'rpcs': 0, 'failed': 0,
+                  'missing_ids': [], 'errors': []}
+        if not files:
+            self.stats['last_run'] = datetime.now(timezone.utc).isoformat()
+            self.stats['last_report'] = report
+            return report
+
+        storage = TelegramStorageManager()
+        if not await storage.initialize():
+            print("[VERIFY] Telegram client not available, will retry later")
+            return report
+
+        by_peer = {}
+        for file_record in files:
+            by_peer.setdefault(storage.resolve_peer(file_record), []).append(file_record)
+
+        try:
+            for peer, records in by_peer.items():
+                # One unreachable chat (left, private, unknown ID) must not abort the pass
+                try:
+                    input_peer = await storage.get_input_peer(peer)
+                except Exception as e:
+                    self._record_failure(records, peer, e, report)
+                    continue
+
+                for start in range(0, len(records), VERIFY_BATCH_SIZE):
+                    batch = records[start:start + VERIFY_BATCH_SIZE]
+                    try:
+                        messages = await storage.get_messages_by_ids(input_peer, [f.telegram_message_id for f in batch])
+                    except Exception as e:
+                        self._record_failure(batch, peer, e, report)
+                        continue
+                    report['rpcs'] += 1
+
+                    now = datetime.now(timezone.utc)
+                    for file_record, message in zip(batch, messages):
+                        outcome = self.apply_result(file_record, message, now)
+                        report['checked'] += 1
+                        if outcome != 'ok':
+                            report[outcome] += 1
+                        if outcome == 'missing':
+                            report['missing_ids'].append(file_record.id)
+                    db.session.commit()
+        finally:
+            await storage.close()
+
+        for key in ('checked', 'missing', 'restored', 'refreshed', 'rpcs', 'failed'):
+            self.stats[key] += report[key]
+        self.stats['last_run'] = datetime.now(timezone.utc).isoformat()
+        self.stats['last_report'] = dict(report, missing_ids=report['missing_ids'][:100], errors=report['errors'][:20])
+        print(f"[VERIFY] Checked {report['checked']} files in {report['rpcs']} RPCs: "
+              f"{report['missing']} missing, {report['restored']} restored, {report['refreshed']} references refreshed, "
+              f"{report['failed']} could not be checked")
+        return report
+
+
+# Global instance
+availability_verifier = AvailabilityVerifier()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Circuit Breaker
+Trips after consecutive Telegram connection failures/timeouts so callers fall back
+to local storage immediately instead of waiting through client retries. After
+reset_timeout one half-open probe is let through; success closes the circuit
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Any, List
+
+import config
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Thread-safe closed/open/half-open breaker"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, enabled: bool = True):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.reset_timeout = float(reset_timeout)
+        self.enabled = enabled
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._listeners: List[Callable[[str, str], None]] = []
+        self._lock = threading.Lock()
+        self.stats = {'trips': 0, 'rejected': 0, 'probes': 0}
+
+    def add_listener(self, callback: Callable[[str, str], None]):
+        """callback(old_state, new_state) on every transition"""
+        self._listeners.append(callback)
+
+    def _transition(self, new_state: str):
+        old_state, self.state = self.state, new_state
+        if old_state != new_state:
+            print(f"[CIRCUIT] Telegram circuit {old_state} -> {new_state}")
+            for callback in self._listeners:
+                try:
+                    callback(old_state, new_state)
+                except Exception as e:
+                    print(f"[CIRCUIT] Listener error: {e}")
+
+    def allow_request(self) -> bool:
+        """Whether a Telegram call may be attempted now"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                # Exactly one probe at a time; everyone else keeps falling back
+                self._probe_in_flight = True
+                self.stats['probes'] += 1
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.stats['trips'] += 1
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def status(self) -> Dict[str, Any]:
+        """Breaker status for the API"""
+        with self._lock:
+            retry_in = 0.0
+            if self.state == OPEN:
+                retry_in = max(0.0, round(self.reset_timeout - (time.monotonic() - self._opened_at), 1))
+            return dict(self.stats, enabled=self.enabled, state=self.state, failures=self.failures,
+                        failure_threshold=self.failure_threshold, retry_in=retry_in)
+
+
+# Global instance
+telegram_breaker = CircuitBreaker(
+    config.CIRCUIT_FAILURE_THRESHOLD,
+    config.CIRCUIT_RESET_TIMEOUT,
+    enabled=config.CIRCUIT_BREAKER_ENABLED
+)
@@ -355,6 +355,14 @@ EXCEL_SHEET_NAME = get_safe(CONFIG, 'output.formats.excel.sheet_name', 'Telegram
 SIMPLE_JSON_ENABLED = get_safe(CONFIG, 'output.formats.simple_json.enabled', False)
 SIMPLE_JSON_FILENAME = get_safe(CONFIG, 'output.formats.simple_json.filename', 'simple_files.json')
 
+JSON_COMPACT = get_safe(CONFIG, 'output.formats.json.compact', True)  # No whitespace; indent is ignored
+
+# Columnar exports for analytics (need pyarrow)
+PARQUET_ENABLED = get_safe(CONFIG, 'output.formats.parquet.enabled', False)
+PARQUET_FILENAME = get_safe(CONFIG, 'output.formats.parquet.filename', 'telegram_files.parquet')
+ARROW_ENABLED = get_safe(CONFIG, 'output.formats.arrow.enabled', False)
+ARROW_FILENAME = get_safe(CONFIG, 'output.formats.arrow.filename', 'telegram_files.arrow')
+
 # Scanning settings
 MAX_MESSAGES = get_safe(CONFIG, 'scanning.max_messages', None)
 BATCH_SIZE = int(get_safe(CONFIG, 'scanning.batch_size', 100))
@@ -450,6 +458,120 @@ RATE_LIMITING_ENABLED = get_safe(CONFIG, 'advanced.rate_limiting.enabled', True)
 REQUESTS_PER_SECOND = int(get_safe(CONFIG, 'advanced.rate_limiting.requests_per_second', 10))
 BURST_LIMIT = int(get_safe(CONFIG, 'advanced.rate_limiting.burst_limit', 20))
 
+# Storage settings
+RANGE_REQUEST_SIZE = int(get_safe(CONFIG, 'storage.range_request_size', 128 * 1024))  # Must divide 1 MB
+
+# Metadata enrichment (ranged head/tail reads, never full downloads)
+METADATA_ENRICHMENT_ENABLED = get_safe(CONFIG, 'storage.metadata_enrichment.enabled', True)
+METADATA_HEAD_BYTES = int(get_safe(CONFIG, 'storage.metadata_enrichment.head_bytes', 256 * 1024))
+METADATA_TAIL_BYTES = int(get_safe(CONFIG, 'storage.metadata_enrichment.tail_bytes', 256 * 1024))
+METADATA_BATCH_SIZE = int(get_safe(CONFIG, 'storage.metadata_enrichment.batch_size', 20))
+METADATA_INTERVAL = int(get_safe(CONFIG, 'storage.metadata_enrichment.interval_seconds', 600))
+METADATA_RETRY_BASE = float(get_safe(CONFIG, 'storage.metadata_enrichment.retry_base_seconds', 600))  # Doubles per failed attempt
+METADATA_MAX_ATTEMPTS = int(get_safe(CONFIG, 'storage.metadata_enrichment.max_attempts', 5))  # Then the error is kept as final
+
+# Remote ZIP browsing (EOCD + central directory via ranged reads)
+ZIP_INDEX_CACHE_SIZE = int(get_safe(CONFIG, 'storage.remote_archive.index_cache_size', 64))
+
+# Pack storage: small files appended into rolling container documents
+PACK_STORAGE_ENABLED = get_safe(CONFIG, 'storage.pack.enabled', False)
+PACK_FILE_THRESHOLD = int(get_safe(CONFIG, 'storage.pack.file_threshold', 256 * 1024))  # Files up to this size are packed
+PACK_TARGET_SIZE = int(get_safe(CONFIG, 'storage.pack.target_size', 64 * 1024 * 1024))  # Seal pack at this size
+PACK_MAX_AGE = int(get_safe(CONFIG, 'storage.pack.max_age_seconds', 900))  # Seal non-empty open packs after this
+PACK_COMPACT_RATIO = float(get_safe(CONFIG, 'storage.pack.compact_live_ratio', 0.5))  # Rewrite packs below this live ratio
+PACK_MAINTENANCE_INTERVAL = int(get_safe(CONFIG, 'storage.pack.maintenance_interval_seconds', 300))
+
+# Replication: second copy forwarded into another chat, hedged downloads
+REPLICATION_FACTOR = int(get_safe(CONFIG, 'storage.replication.factor', 1))  # 1 = primary only, 2 = primary + replica
+REPLICATION_CHAT = get_safe(CONFIG, 'storage.replication.chat', '')  # Username or ID of the replica storage chat
+REPLICATION_BATCH_SIZE = int(get_safe(CONFIG, 'storage.replication.batch_size', 100))
+REPLICATION_INTERVAL = int(get_safe(CONFIG, 'storage.replication.interval_seconds', 300))
+HEDGE_DELAY = float(get_safe(CONFIG, 'storage.replication.hedge_delay_ms', 800)) / 1000  # Start replica read if primary is slower
+REPLICATION_ENABLED = REPLICATION_FACTOR > 1 and bool(REPLICATION_CHAT)
+
+# Circuit breaker around Telegram storage (fast local fallback + deferred sync)
+CIRCUIT_BREAKER_ENABLED = get_safe(CONFIG, 'storage.circuit_breaker.enabled', True)
+CIRCUIT_FAILURE_THRESHOLD = int(get_safe(CONFIG, 'storage.circuit_breaker.failure_threshold', 3))  # Consecutive failures to trip
+CIRCUIT_RESET_TIMEOUT = float(get_safe(CONFIG, 'storage.circuit_breaker.reset_timeout_seconds', 30))  # Open time before a half-open probe
+CIRCUIT_CONNECT_TIMEOUT = float(get_safe(CONFIG, 'storage.circuit_breaker.connect_timeout_seconds', 15))  # Counted as a failure when exceeded
+DEFERRED_SYNC_INTERVAL = int(get_safe(CONFIG, 'storage.deferred_sync.interval_seconds', 60))
+DEFERRED_SYNC_BATCH_SIZE = int(get_safe(CONFIG, 'storage.deferred_sync.batch_size', 20))
+DEFERRED_SYNC_RETRY_BASE = float(get_safe(CONFIG, 'storage.deferred_sync.retry_base_seconds', 60))  # Doubles per failed attempt
+DEFERRED_SYNC_RETRY_MAX = float(get_safe(CONFIG, 'storage.deferred_sync.retry_max_seconds', 3600))
+
+# Admission control for Telegram-bound endpoints (per-class concurrency + bounded queue)
+ADMISSION_CONTROL_ENABLED = get_safe(CONFIG, 'server.admission.enabled', True)
+ADMISSION_LIMITS = {
+    'upload': {'concurrency': int(get_safe(CONFIG, 'server.admission.upload.concurrency', 4)),
+               'queue': int(get_safe(CONFIG, 'server.admission.upload.queue', 16))},
+    'download': {'concurrency': int(get_safe(CONFIG, 'server.admission.download.concurrency', 8)),
+                 'queue': int(get_safe(CONFIG, 'server.admission.download.queue', 32))},
+    'scan': {'concurrency': int(get_safe(CONFIG, 'server.admission.scan.concurrency', 1)),
+             'queue': int(get_safe(CONFIG, 'server.admission.scan.queue', 2))},
+    'delete': {'concurrency': int(get_safe(CONFIG, 'server.admission.delete.concurrency', 4)),
+               'queue': int(get_safe(CONFIG, 'server.admission.delete.queue', 16))},
+}
+ADMISSION_QUEUE_TIMEOUT = float(get_safe(CONFIG, 'server.admission.queue_timeout_seconds', 30))  # Max wait for a slot
+ADMISSION_RETRY_AFTER = int(get_safe(CONFIG, 'server.admission.retry_after_seconds', 5))  # Retry-After on 503
+
+# Transfer scheduler: Telegram transfer slots shared by priority class
+TRANSFER_SCHEDULER_ENABLED = get_safe(CONFIG, 'storage.scheduler.enabled', True)
+TRANSFER_MAX_CONCURRENT = int(get_safe(CONFIG, 'storage.scheduler.max_concurrent_transfers', 4))
+TRANSFER_WEIGHTS = {
+    'interactive': float(get_safe(CONFIG, 'storage.scheduler.weights.interactive', 8)),
+    'bulk': float(get_safe(CONFIG, 'storage.scheduler.weights.bulk', 3)),
+    'background': float(get_safe(CONFIG, 'storage.scheduler.weights.background', 1)),
+}
+TRANSFER_BANDWIDTH_CAPS = {  # Bytes/s, 0 = unlimited
+    'interactive': 0,
+    'bulk': int(get_safe(CONFIG, 'storage.scheduler.bulk_bandwidth_kbps', 0)) * 1024,
+    'background': int(get_safe(CONFIG, 'storage.scheduler.background_bandwidth_kbps', 0)) * 1024,
+}
+
+# Shared in-memory Telethon session (entities/update state written back periodically)
+SESSION_WRITEBACK_INTERVAL = int(get_safe(CONFIG, 'telegram.session_writeback_interval_seconds', 60))
+
+# Availability verification (get_messages with up to 100 IDs per RPC)
+VERIFY_ENABLED = get_safe(CONFIG, 'storage.verify.enabled', True)
+VERIFY_INTERVAL = int(get_safe(CONFIG, 'storage.verify.interval_seconds', 6 * 3600))
+VERIFY_FILES_PER_RUN = int(get_safe(CONFIG, 'storage.verify.files_per_run', 10000))  # Oldest-verified first
+VERIFY_MIN_AGE = int(get_safe(CONFIG, 'storage.verify.min_age_seconds', 24 * 3600))  # Skip files verified more recently
+
+# Search fallback to Telegram messages.search on Saved Messages
+SEARCH_TELEGRAM_FALLBACK = get_safe(CONFIG, 'search.telegram_fallback.enabled', True)  # Default for ?remote=
+SEARCH_REMOTE_LIMIT = int(get_safe(CONFIG, 'search.telegram_fallback.limit', 50))
+SEARCH_REMOTE_TIMEOUT = float(get_safe(CONFIG, 'search.telegram_fallback.timeout_seconds', 5))
+
+# Resumable chunked uploads (create / PATCH by offset / HEAD / finalize)
+RESUMABLE_MAX_SIZE = int(get_safe(CONFIG, 'upload.resumable.max_size', 2 * 1024 * 1024 * 1024))
+RESUMABLE_MAX_CHUNK = int(get_safe(CONFIG, 'upload.resumable.max_chunk_size', 64 * 1024 * 1024))
+RESUMABLE_EXPIRY = int(get_safe(CONFIG, 'upload.resumable.expiry_seconds', 24 * 3600))  # Unfinished sessions are dropped after this
+
+# HMAC-signed media URLs (served without login session or File lookups)
+MEDIA_URL_SECRET = get_safe(CONFIG, 'server.media_urls.secret', '')  # Empty = derived from the Flask secret key
+MEDIA_URL_TTL = int(get_safe(CONFIG, 'server.media_urls.ttl_seconds', 3600))
+MEDIA_URL_MAX_TTL = int(get_safe(CONFIG, 'server.media_urls.max_ttl_seconds', 24 * 3600))
+
+# Multi-channel scan orchestrator (shared client, central rate limiter)
+SCAN_CONCURRENCY = int(get_safe(CONFIG, 'scanning.concurrency', 4))  # Channels scanned at once
+SCAN_MAX_BATCH_CHANNELS = int(get_safe(CONFIG, 'scanning.max_batch_channels', 100))
+SCAN_FLUSH_EVERY = int(get_safe(CONFIG, 'output.flush_every', 500))  # Streamed scan results are flushed every N records
+
+# Fetch only media of the enabled file types via search filters (ignored while stickers are enabled:
+# they have no search filter, so the scan walks the full history)
+SCAN_SERVER_FILTERS = get_safe(CONFIG, 'scanning.server_filters', True)
+
+# Takeout session for bulk channel exports (relaxed flood limits, needs approval in the Telegram app once)
+SCAN_TAKEOUT = get_safe(CONFIG, 'scanning.takeout.enabled', False)
+
+# Crash-safe scans: resume state saved every N processed messages
+SCAN_CHECKPOINT_EVERY = int(get_safe(CONFIG, 'scanning.checkpoint_every', 500))
+
+# Scan catalog: scanned media upserted straight into the File table in batches
+SCAN_CATALOG_ENABLED = get_safe(CONFIG, 'scanning.catalog.enabled', True)
+SCAN_CATALOG_BATCH = int(get_safe(CONFIG, 'scanning.catalog.batch_size', 2000))  # Rows per upsert transaction
+LIST_OUTPUT_REPORTS = get_safe(CONFIG, 'output.list_reports', not SCAN_CATALOG_ENABLED)  # Report files in /api/v2/files
+
 # Production features only
 SMART_RETRY = True  # Always enabled in production
 
@@ -479,6 +601,9 @@ def validate_config():
     if CONNECTION_TIMEOUT <= 0 or CONNECTION_TIMEOUT > 300:
         warnings.append(f"CONNECTION_TIMEOUT ({CONNECTION_TIMEOUT}) nên trong khoảng 1-300")
 
+    if REPLICATION_FACTOR > 1 and not REPLICATION_CHAT:
+        warnings.append("storage.replication.factor > 1 nhưng chưa cấu hình storage.replication.chat")
+
     # Check directories
     if not OUTPUT_DIR:
         errors.append("OUTPUT_DIR không được để trống")
@@ -514,7 +639,10 @@ def get_config_summary():
         "formats_enabled": {
             "csv": CSV_ENABLED,
             "json": JSON_ENABLED,
-            "excel": EXCEL_ENABLED
+            "excel": EXCEL_ENABLED,
+            "simple_json": SIMPLE_JSON_ENABLED,
+            "parquet": PARQUET_ENABLED,
+            "arrow": ARROW_ENABLED
         },
         "file_types": {
             "documents": SCAN_DOCUMENTS,
@@ -15,9 +15,20 @@ import bcrypt
 import secrets
 import hashlib
 import time
+import threading
 
 db = SQLAlchemy()
 
+_unique_id_lock = threading.Lock()
+_last_unique_id = 0
+
+def next_unique_id():
+    """Epoch-ms based unique_id, strictly increasing so bulk inserts never collide"""
+    global _last_unique_id
+    with _unique_id_lock:
+        _last_unique_id = max(int(time.time() * 1000), _last_unique_id + 1)
+        return str(_last_unique_id)
+
 class User(UserMixin, db.Model):
     """User model for authentication and authorization"""
     __tablename__ = 'users'
@@ -231,7 +242,7 @@ class File(db.Model):
     __tablename__ = 'files'
     
     id = Column(Integer, primary_key=True)
-    unique_id = Column(String(50), unique=True, nullable=False, index=True, default=lambda: str(int(time.time() * 1000)))  # Epoch timestamp milliseconds for unique ID
+    unique_id = Column(String(50), unique=True, nullable=False, index=True, default=next_unique_id)  # Epoch timestamp milliseconds for unique ID
     filename = Column(String(255), nullable=False, index=True)
     original_filename = Column(String(255))
     file_path = Column(String(500))  # Path on disk
@@ -248,7 +259,28 @@ class File(db.Model):
     telegram_unique_id = Column(String(255))  # Telegram unique file ID
     telegram_access_hash = Column(String(255))  # Access hash for file
     telegram_file_reference = Column(LargeBinary)  # File reference for download
-    storage_type = Column(String(20), default='local')  # 'local' or 'telegram'
+    storage_type = Column(String(20), default='local')  # 'local', 'telegram' or 'pack'
+    
+    # Pack storage: small files live at [pack_offset, pack_offset + pack_length) of a pack blob
+    pack_id = Column(Integer, ForeignKey('pack_blobs.id'), nullable=True, index=True)
+    pack_offset = Column(BigInteger)
+    pack_length = Column(BigInteger)
+    
+    # Availability verification: message gone from Telegram / last successful check
+    telegram_missing = Column(Boolean, default=False, index=True)
+    verified_at = Column(DateTime, index=True)
+    
+    # Local fallback upload waiting to be moved to Telegram by the deferred syncer
+    sync_pending = Column(Boolean, default=False, index=True)
+    sync_attempts = Column(Integer, default=0)  # Failed uploads so far, drives the retry backoff
+    sync_retry_at = Column(DateTime)  # Not retried before this time
+    
+    # Replica copy (forwarded into the replication chat) used for hedged downloads
+    replica_channel_id = Column(String(100))
+    replica_message_id = Column(Integer)
+    
+    # Row written by the scan catalog upsert (unique per user/channel/message, see below)
+    from_scan = Column(Boolean, default=False)
     
     # File metadata and organization
     tags = Column(Text)  # JSON array of tags
@@ -331,6 +363,14 @@ class File(db.Model):
         """Check if file is stored locally"""
         return self.storage_type == 'local' and self.file_path is not None
 
+    def has_replica(self):
+        """Check if a replica copy exists in the replication chat"""
+        return self.is_stored_on_telegram() and self.replica_message_id is not None
+
+    def is_packed(self):
+        """Check if file is stored inside a pack blob"""
+        return self.storage_type == 'pack' and self.pack_id is not None
+
     def get_telegram_info(self):
         """Get Telegram storage information"""
         if not self.is_stored_on_telegram():
@@ -358,61 +398,6 @@ class File(db.Model):
         # Clear local file path since it's now on Telegram
         self.file_path = None
 
-    def __repr__(self):
-        return f'<File {self.filename}>'
-
-    # Composite indexes for better query performance
-    __table_args__ = (
-        db.Index('idx_user_deleted_created', 'user_id', 'is_deleted', 'created_at'),
-        db.Index('idx_folder_deleted_created', 'folder_id', 'is_deleted', 'created_at'),
-        db.Index('idx_mime_deleted_created', 'mime_type', 'is_deleted', 'created_at'),
-        db.Index('idx_user_favorite', 'user_id', 'is_favorite'),
-    )
-
-class FileVersion(db.Model):
-    """File version model for tracking file history and changes"""
-    __tablename__ = 'file_versions'
-
-    id = Column(Integer, primary_key=True)
-    file_id = Column(Integer, ForeignKey('files.id'), nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
-
-    # Version information
-    version_number = Column(Integer, nullable=False, default=1)
-    version_name = Column(String(100))  # Optional version name/tag
-    change_description = Column(Text)  # Description of changes
-
-    # File metadata for this version
-    filename = Column(String(255), nullable=False)
-    file_path = Column(String(500), nullable=False)  # Path to version file
-    file_size = Column(BigInteger, default=0)
-    mime_type = Column(String(100))
-    file_hash = Column(String(64))  # SHA-256 hash for integrity
-
-    # Timestamps
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
-
-    # Relationships
-    file = relationship('File', backref='versions')
-
-    def __repr__(self):
-        return f'<FileVersion {self.filename} v{self.version_number}>'
-
-    def get_file_info(self):
-        """Get file information for this version"""
-        return {
-            'id': self.id,
-            'file_id': self.file_id,
-            'version_number': self.version_number,
-            'version_name': self.version_name,
-            'filename': self.filename,
-            'file_size': self.file_size,
-            'mime_type': self.mime_type,
-            'change_description': self.change_description,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'file_hash': self.file_hash
-        }
-    
     def get_tags(self):
         """Get tags as a list"""
         if self.tags:
@@ -483,7 +468,155 @@ class FileVersion(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'telegram_date': self.telegram_date.isoformat() if self.telegram_date else None,
-            'storage_type': self.storage_type
+            'storage_type': self.storage_type,
+            'telegram_missing': bool(self.telegram_missing)
+        }
+
+    def __repr__(self):
+        return f'<File {self.filename}>'
+
+    # Composite indexes for better query performance
+    __table_args__ = (
+        db.Index('idx_user_deleted_created', 'user_id', 'is_deleted', 'created_at'),
+        db.Index('idx_folder_deleted_created', 'folder_id', 'is_deleted', 'created_at'),
+        db.Index('idx_mime_deleted_created', 'mime_type', 'is_deleted', 'created_at'),
+        db.Index('idx_user_favorite', 'user_id', 'is_favorite'),
+        # Upsert target of the scan catalog; partial so older duplicate scan rows never block it
+        db.Index('ux_files_scan_message', 'user_id', 'telegram_channel_id', 'telegram_message_id', unique=True,
+                 sqlite_where=from_scan == True, postgresql_where=from_scan == True),
+    )
+
+class PackBlob(db.Model):
+    """Container document holding many small files back to back"""
+    __tablename__ = 'pack_blobs'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+
+    # open: still appended locally, sealed: uploaded to Telegram, retired: compacted away
+    status = Column(String(20), default='open', index=True)
+    local_path = Column(String(500))  # Set while open (or until upload succeeds)
+    size = Column(BigInteger, default=0)
+    entry_count = Column(Integer, default=0)
+
+    # Telegram location once sealed
+    telegram_message_id = Column(Integer)
+    telegram_channel_id = Column(String(100))
+    telegram_file_id = Column(String(255))
+    telegram_access_hash = Column(String(255))
+    telegram_file_reference = Column(LargeBinary)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    sealed_at = Column(DateTime)
+
+    def __repr__(self):
+        return f'<PackBlob {self.id} {self.status} {self.size}B>'
+
+    def to_dict(self):
+        """Convert pack to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'size': self.size,
+            'entry_count': self.entry_count,
+            'telegram_message_id': self.telegram_message_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sealed_at': self.sealed_at.isoformat() if self.sealed_at else None
+        }
+
+class UploadSession(db.Model):
+    """Resumable chunked upload: chunks are written at their offsets into a staging file"""
+    __tablename__ = 'upload_sessions'
+
+    id = Column(Integer, primary_key=True)
+    upload_id = Column(String(64), unique=True, nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    folder_id = Column(Integer, ForeignKey('folders.id'), nullable=True)
+
+    filename = Column(String(255), nullable=False)
+    mime_type = Column(String(100))
+    total_size = Column(BigInteger, nullable=False)
+    staging_path = Column(String(500))
+
+    # Received byte ranges as JSON [[start, end), ...], merged and sorted
+    received_ranges = Column(Text, default='[]')
+    received_bytes = Column(BigInteger, default=0)
+
+    # uploading, finalizing, completed, failed
+    status = Column(String(20), default='uploading', index=True)
+    file_id = Column(Integer, ForeignKey('files.id'), nullable=True)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = Column(DateTime)
+
+    def __repr__(self):
+        return f'<UploadSession {self.upload_id} {self.status} {self.received_bytes}/{self.total_size}>'
+
+    def get_ranges(self):
+        """Received ranges as a list of [start, end) pairs"""
+        try:
+            return json.loads(self.received_ranges or '[]')
+        except ValueError:
+            return []
+
+    def to_dict(self):
+        """Convert upload session to dictionary for JSON serialization"""
+        ranges = self.get_ranges()
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'size': self.total_size,
+            'offset': ranges[0][1] if ranges and ranges[0][0] == 0 else 0,
+            'received': self.received_bytes,
+            'ranges': ranges,
+            'status': self.status,
+            'file_id': self.file_id,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+class FileVersion(db.Model):
+    """File version model for tracking file history and changes"""
+    __tablename__ = 'file_versions'
+
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey('files.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+
+    # Version information
+    version_number = Column(Integer, nullable=False, default=1)
+    version_name = Column(String(100))  # Optional version name/tag
+    change_description = Column(Text)  # Description of changes
+
+    # File metadata for this version
+    filename = Column(String(255), nullable=False)
+    file_path = Column(String(500), nullable=False)  # Path to version file
+    file_size = Column(BigInteger, default=0)
+    mime_type = Column(String(100))
+    file_hash = Column(String(64))  # SHA-256 hash for integrity
+
+    # Timestamps
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    # Relationships
+    file = relationship('File', backref='versions')
+
+    def __repr__(self):
+        return f'<FileVersion {self.filename} v{self.version_number}>'
+
+    def get_file_info(self):
+        """Get file information for this version"""
+        return {
+            'id': self.id,
+            'file_id': self.file_id,
+            'version_number': self.version_number,
+            'version_name': self.version_name,
+            'filename': self.filename,
+            'file_size': self.file_size,
+            'mime_type': self.mime_type,
+            'change_description': self.change_description,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'file_hash': self.file_hash
         }
 
 class ScanSession(db.Model):
@@ -496,7 +629,7 @@ class ScanSession(db.Model):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     
     # Scan status and progress
-    status = Column(String(50), default='pending')  # pending, running, completed, failed, cancelled
+    status = Column(String(50), default='pending')  # pending, running, completed, failed, cancelled, interrupted
     files_found = Column(Integer, default=0)
     messages_scanned = Column(Integer, default=0)
     total_messages = Column(Integer, default=0)
@@ -504,6 +637,22 @@ class ScanSession(db.Model):
     # Error handling
     error_message = Column(Text)
     
+    # Folder holding the File rows produced by this scan
+    folder_id = Column(Integer, ForeignKey('folders.id'), nullable=True)
+    
+    # Import into Saved Messages (bulk forwarding)
+    import_status = Column(String(50))  # None, running, completed, failed
+    imported_files = Column(Integer, default=0)
+    import_folder_id = Column(Integer, ForeignKey('folders.id'), nullable=True)
+    
+    # Incremental rescans: only messages above min_message_id were fetched
+    scan_mode = Column(String(20), default='full')  # full, incremental
+    min_message_id = Column(Integer)
+    
+    # Crash-safe resume: last processed offset_id and output sizes (JSON), saved every N messages
+    checkpoint = Column(Text)
+    checkpoint_at = Column(DateTime)
+    
     # Timestamps
     started_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     completed_at = Column(DateTime)
@@ -511,6 +660,17 @@ class ScanSession(db.Model):
     def __repr__(self):
         return f'<ScanSession {self.channel_name} - {self.status}>'
     
+    def get_checkpoint(self):
+        """Last checkpoint as a dict (None if the scan never reached one)"""
+        try:
+            return json.loads(self.checkpoint) if self.checkpoint else None
+        except ValueError:
+            return None
+    
+    def is_resumable(self):
+        """A stopped scan that saved a checkpoint"""
+        return self.status in ('failed', 'interrupted', 'cancelled') and bool(self.checkpoint)
+    
     def get_progress_percentage(self):
         """Calculate scan progress percentage"""
         if self.total_messages and self.total_messages > 0:
@@ -520,8 +680,12 @@ class ScanSession(db.Model):
     def get_duration(self):
         """Get scan duration in seconds"""
         if self.started_at:
+            # SQLite hands back naive datetimes: compare everything as UTC
+            started = self.started_at if self.started_at.tzinfo else self.started_at.replace(tzinfo=timezone.utc)
             end_time = self.completed_at or datetime.now(timezone.utc)
-            return (end_time - self.started_at).total_seconds()
+            if end_time.tzinfo is None:
+                end_time = end_time.replace(tzinfo=timezone.utc)
+            return (end_time - started).total_seconds()
         return 0
     
     def to_dict(self):
@@ -538,10 +702,48 @@ class ScanSession(db.Model):
             'progress_percentage': self.get_progress_percentage(),
             'duration': self.get_duration(),
             'error_message': self.error_message,
+            'folder_id': self.folder_id,
+            'import_status': self.import_status,
+            'imported_files': self.imported_files or 0,
+            'import_folder_id': self.import_folder_id,
+            'scan_mode': self.scan_mode or 'full',
+            'min_message_id': self.min_message_id,
+            'resumable': self.is_resumable(),
+            'checkpoint_at': self.checkpoint_at.isoformat() if self.checkpoint_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
+class ChannelWatermark(db.Model):
+    """Per-channel high-water mark: highest message ID covered by a completed scan"""
+    __tablename__ = 'channel_watermarks'
+    __table_args__ = (Index('ix_channel_watermarks_user_channel', 'user_id', 'channel_id', unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    channel_id = Column(String(100), nullable=False)
+    channel_name = Column(String(255))
+
+    max_message_id = Column(Integer, nullable=False, default=0)
+    # Folder the incremental scans merge new files into
+    folder_id = Column(Integer, ForeignKey('folders.id'), nullable=True)
+    last_scan_session_id = Column(Integer, ForeignKey('scan_sessions.id'), nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<ChannelWatermark {self.channel_id} @ {self.max_message_id}>'
+
+    def to_dict(self):
+        """Convert watermark to dictionary for JSON serialization"""
+        return {
+            'channel_id': self.channel_id,
+            'channel_name': self.channel_name,
+            'max_message_id': self.max_message_id,
+            'folder_id': self.folder_id,
+            'last_scan_session_id': self.last_scan_session_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class ShareLink(db.Model):
     """Model for file sharing links with permissions and expiration"""
     __tablename__ = 'share_links'
@@ -684,6 +886,46 @@ class ShareLink(db.Model):
         }
 
 # Database utility functions
+def _sql_default(column):
+    """SQL literal for a column's scalar Python default (None if it has none)"""
+    if column.default is None or not column.default.is_scalar:
+        return None
+    value = column.default.arg
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def add_missing_columns():
+    """Add columns introduced after a table was created (create_all never alters tables)"""
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=db.engine.dialect)
+                default = _sql_default(column)
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'
+                if default is not None:
+                    ddl += f' DEFAULT {default}'
+                conn.execute(db.text(ddl))
+                print(f"✅ Added column {table.name}.{column.name}")
+
+def add_missing_indexes():
+    """Create indexes declared after a table was created"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with db.engine.begin() as conn:
+                    index.create(bind=conn, checkfirst=True)
+            except Exception as e:
+                print(f"⚠️ Could not create index {index.name}: {e}")
+
 def init_db(app):
     """Initialize database with Flask app"""
     db.init_app(app)
@@ -691,6 +933,8 @@ def init_db(app):
     with app.app_context():
         # Create all tables
         db.create_all()
+        add_missing_columns()
+        add_missing_indexes()
         
         # Create default admin user if it doesn't exist
         admin_user = User.query.filter_by(username='admin').first()
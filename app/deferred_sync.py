@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Deferred Sync
+Uploads that fell back to local storage (Telegram down or circuit open) are marked
+sync_pending; this worker moves them to Saved Messages once Telegram is reachable
+"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any
+
+import config
+from transfer_scheduler import set_transfer_priority, BACKGROUND
+from circuit_breaker import telegram_breaker, CLOSED, OPEN
+from db import db, File
+
+
+class DeferredSyncWorker:
+    """Background uploader for sync_pending local files"""
+
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.running = False
+        self.stats = {'synced': 0, 'failed': 0, 'pending': 0, 'last_run': None}
+
+    def start(self, app):
+        """Start the daemon thread (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.app = app
+            self._thread = threading.Thread(target=self._run, daemon=True, name='deferred-sync')
+            self._thread.start()
+        print("🔁 Started deferred sync worker")
+
+    def wake(self):
+        """Sync pending files now"""
+        self._wake.set()
+
+    def on_circuit_change(self, old_state: str, new_state: str):
+        """Breaker listener: flush the backlog as soon as Telegram is back"""
+        if new_state == CLOSED:
+            self.wake()
+
+    def _pending_query(self):
+        return File.query.filter(
+            File.sync_pending == True,
+            File.storage_type == 'local',
+            File.is_deleted == False
+        )
+
+    def _due_query(self):
+        """Pending files whose retry backoff has elapsed"""
+        now = datetime.now(timezone.utc)
+        return self._pending_query().filter(db.or_(File.sync_retry_at.is_(None), File.sync_retry_at <= now))
+
+    @staticmethod
+    def _record_failure(file_record: File):
+        """Push the file back with exponential backoff so it does not block the rest of the queue"""
+        attempts = (file_record.sync_attempts or 0) + 1
+        delay = min(config.DEFERRED_SYNC_RETRY_BASE * 2 ** (attempts - 1), config.DEFERRED_SYNC_RETRY_MAX)
+        file_record.sync_attempts = attempts
+        file_record.sync_retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        db.session.commit()
+        print(f"[SYNC] Upload of {file_record.filename} failed (attempt {attempts}), retrying in {delay:.0f}s")
+
+    def status(self) -> Dict[str, Any]:
+        """Worker status for the API"""
+        return dict(self.stats, running=self.running, alive=bool(self._thread and self._thread.is_alive()))
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=config.DEFERRED_SYNC_INTERVAL)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.running = True
+                    asyncio.run(self.process_pending())
+            except Exception as e:
+                print(f"[SYNC] Worker error: {e}")
+            finally:
+                self.running = False
+
+    async def process_pending(self):
+        """Upload pending files; failed files back off individually, the pass stops only when the breaker opens"""
+        set_transfer_priority(BACKGROUND)
+        from telegram_storage import TelegramStorageManager
+
+        self.stats['pending'] = self._pending_query().count()
+        query = self._due_query()
+        if not query.count():
+            return
+
+        # initialize() goes through the breaker: this doubles as the half-open probe
+        storage = TelegramStorageManager()
+        if not await storage.initialize():
+            print(f"[SYNC] Telegram unavailable, {self.stats['pending']} files still pending")
+            return
+
+        stopped = False
+        try:
+            for file_record in query.order_by(File.id).limit(config.DEFERRED_SYNC_BATCH_SIZE).all():
+                if telegram_breaker.state == OPEN:
+                    stopped = True
+                    break
+
+                if not file_record.file_path or not os.path.exists(file_record.file_path):
+                    file_record.sync_pending = False
+                    db.session.commit()
+                    continue
+
+                result = await storage.upload_to_saved_messages(file_record.file_path, file_record.filename)
+                if not result:
+                    self.stats['failed'] += 1
+                    self._record_failure(file_record)
+                    continue
+
+                local_path = file_record.file_path
+                file_record.set_telegram_storage(
+                    message_id=result['message_id'],
+                    channel=result['channel'],
+                    channel_id=result['channel_id'],
+                    file_id=result.get('file_id'),
+                    unique_id=result.get('unique_id'),
+                    access_hash=result.get('access_hash'),
+                    file_reference=result.get('file_reference')
+                )
+                file_record.sync_pending = False
+                file_record.sync_attempts = 0
+                file_record.sync_retry_at = None
+                db.session.commit()
+                try:
+                    os.remove(local_path)
+                except OSError:
+                    pass
+
+                self.stats['synced'] += 1
+                self.stats['pending'] = max(0, self.stats['pending'] - 1)
+                print(f"[SYNC] Moved {file_record.filename} to Telegram")
+        finally:
+            self.stats['last_run'] = datetime.now(timezone.utc).isoformat()
+            await storage.close()
+
+        # More than one batch pending: keep going without waiting for the interval
+        if not stopped and self._due_query().count():
+            self.wake()
+
+
+# Global instance
+deferred_sync_worker = DeferredSyncWorker()
+telegram_breaker.add_listener(deferred_sync_worker.on_circuit_change)
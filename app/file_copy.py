@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+File Copy
+Server-side copies of files and folder trees. Telegram-stored files are duplicated by
+forwarding their messages (done by the caller, up to 100 per RPC) so no data is
+downloaded or re-uploaded; packed files share their pack range; local files are
+copied on disk
+"""
+
+import os
+import secrets
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Optional, Set
+
+from werkzeug.utils import secure_filename
+
+from db import db, File, Folder
+
+# (source File, target folder_id, new filename)
+CopyPlan = List[Tuple[File, Optional[int], str]]
+
+
+def copy_name(name: str, existing_names: Set[str]) -> str:
+    """Pick 'name (copy)', 'name (copy 2)', ... not already used in the target"""
+    if name not in existing_names:
+        return name
+    stem, ext = os.path.splitext(name)
+    candidate = f"{stem} (copy){ext}"
+    counter = 2
+    while candidate in existing_names:
+        candidate = f"{stem} (copy {counter}){ext}"
+        counter += 1
+    return candidate
+
+
+def copy_folder_tree(folder: Folder, parent_id: Optional[int], name: str, user_id: int
+                     ) -> Tuple[List[Folder], CopyPlan]:
+    """Create the folder structure of a copied tree (root first) and plan its files"""
+    plan = []
+    new_folders = []
+
+    def copy_tree(source, target_parent_id, folder_name):
+        new_folder = Folder(name=folder_name, parent_id=target_parent_id, user_id=user_id, path=folder_name)
+        db.session.add(new_folder)
+        db.session.flush()
+        new_folders.append(new_folder)
+
+        for src in source.files.filter_by(is_deleted=False).all():
+            plan.append((src, new_folder.id, src.filename))
+        for child in Folder.query.filter_by(parent_id=source.id, user_id=user_id, is_deleted=False).all():
+            copy_tree(child, new_folder.id, child.name)
+
+    copy_tree(folder, parent_id, name)
+    return new_folders, plan
+
+
+def copy_file_records(user_id: int, plan: CopyPlan, forwarded: Dict[int, Dict[str, Any]],
+                      upload_dir: Path) -> Tuple[List[File], List[Dict[str, Any]]]:
+    """Add File rows for a copy plan. `forwarded` maps source file IDs to the media info of
+    their forwarded message; returns (copies, failed)"""
+    copies = []
+    failed = []
+    for src, folder_id, filename in plan:
+        new_file = File(
+            filename=filename,
+            original_filename=src.original_filename or src.filename,
+            file_size=src.file_size,
+            mime_type=src.mime_type,
+            folder_id=folder_id,
+            user_id=user_id,
+            tags=src.tags,
+            file_metadata=src.file_metadata,
+            description=src.description,
+            telegram_date=src.telegram_date
+        )
+
+        if src.is_stored_on_telegram():
+            info = forwarded.get(src.id)
+            if not info:
+                failed.append({'id': src.id, 'filename': src.filename, 'error': 'Forward failed'})
+                continue
+            new_file.file_size = info['file_size'] or src.file_size
+            new_file.set_telegram_storage(
+                message_id=info['message_id'],
+                channel=info['channel'],
+                channel_id=info['channel_id'],
+                file_id=info['file_id'],
+                unique_id=info['unique_id'],
+                access_hash=info['access_hash'],
+                file_reference=info['file_reference']
+            )
+        elif src.is_packed():
+            # The copy points at the same pack bytes; compaction moves every live row on its own
+            new_file.storage_type = 'pack'
+            new_file.pack_id = src.pack_id
+            new_file.pack_offset = src.pack_offset
+            new_file.pack_length = src.pack_length
+        elif src.file_path and os.path.exists(src.file_path):
+            new_path = Path(upload_dir) / f"{int(time.time())}_{secrets.token_hex(4)}_{secure_filename(filename)}"
+            shutil.copy2(src.file_path, new_path)
+            new_file.file_path = str(new_path)
+            new_file.storage_type = 'local'
+        else:
+            failed.append({'id': src.id, 'filename': src.filename, 'error': 'Source data not available'})
+            continue
+
+        db.session.add(new_file)
+        copies.append(new_file)
+
+    return copies, failed
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Media Filters
+Server-side message filters for scans: instead of pulling the whole history and dropping
+text/service messages on the client, each enabled file type is fetched through
+messages.search with its InputMessagesFilter, and the per-filter streams are merged
+back into one newest-first stream (deduplicated by message ID)
+"""
+
+from typing import Optional, List, Dict, AsyncIterator
+
+from telethon.tl.types import (
+    InputMessagesFilterDocument, InputMessagesFilterPhotos, InputMessagesFilterVideo,
+    InputMessagesFilterRoundVideo, InputMessagesFilterMusic, InputMessagesFilterVoice,
+    InputMessagesFilterGif
+)
+
+import config
+
+# Scanner file type -> search filters returning it (stickers have no search filter)
+TYPE_FILTERS: Dict[str, list] = {
+    'document': [InputMessagesFilterDocument],
+    'photo': [InputMessagesFilterPhotos],
+    'video': [InputMessagesFilterVideo, InputMessagesFilterRoundVideo],
+    'audio': [InputMessagesFilterMusic],
+    'voice': [InputMessagesFilterVoice],
+    'animation': [InputMessagesFilterGif],
+}
+# Every file-like message (Saved Messages storage scan)
+ALL_FILE_FILTERS = [f for filters in TYPE_FILTERS.values() for f in filters]
+
+
+def enabled_types() -> Dict[str, bool]:
+    """File type toggles from config"""
+    return {
+        'document': config.SCAN_DOCUMENTS,
+        'photo': config.SCAN_PHOTOS,
+        'video': config.SCAN_VIDEOS,
+        'audio': config.SCAN_AUDIO,
+        'voice': config.SCAN_VOICE,
+        'sticker': config.SCAN_STICKERS,
+        'animation': config.SCAN_ANIMATIONS,
+    }
+
+
+def server_filters() -> Optional[list]:
+    """Search filters for the enabled file types, or None for an unfiltered history scan"""
+    if not config.SCAN_SERVER_FILTERS:
+        return None
+    types = enabled_types()
+    # Stickers have no search filter: only a full history walk finds them
+    if types.get('sticker'):
+        return None
+    filters = []
+    for file_type, enabled in types.items():
+        if enabled and file_type == 'video' and not config.SCAN_VIDEO_NOTES:
+            filters.append(InputMessagesFilterVideo)
+        elif enabled:
+            filters.extend(TYPE_FILTERS.get(file_type, []))
+    return filters
+
+
+async def iter_media_messages(client, entity, filters: Optional[list], limit: Optional[int] = None,
+                              **kwargs) -> AsyncIterator:
+    """Messages of `entity` newest first: full history when `filters` is None, otherwise only
+    messages matching one of the filters (one search stream per filter, merged by ID)"""
+    if filters is None:
+        async for message in client.iter_messages(entity, limit=limit, **kwargs):
+            yield message
+        return
+    if len(filters) == 1:
+        async for message in client.iter_messages(entity, limit=limit, filter=filters[0], **kwargs):
+            yield message
+        return
+
+    streams = [client.iter_messages(entity, limit=limit, filter=f, **kwargs).__aiter__() for f in filters]
+    heads = {}
+    for stream in streams:
+        heads[stream] = await _next(stream)
+
+    yielded = 0
+    last_id = None
+    while True:
+        live = [s for s in streams if heads[s] is not None]
+        if not live:
+            return
+        stream = max(live, key=lambda s: heads[s].id)
+        message = heads[stream]
+        heads[stream] = await _next(stream)
+        if message.id == last_id:
+            continue  # Same message matched by two filters
+        last_id = message.id
+        yield message
+        yielded += 1
+        if limit and yielded >= limit:
+            return
+
+
+async def _next(stream):
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def count_media_messages(client, entity, filters: List) -> int:
+    """Upper bound of matching messages: sum of the per-filter search counts (limit=0 calls)"""
+    total = 0
+    for f in filters:
+        result = await client.get_messages(entity, limit=0, filter=f)
+        total += getattr(result, 'total', None) or 0
+    return total
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Metadata Enricher
+Fills dimensions, duration, page count, EXIF date and real size for Telegram-stored
+files by reading only the head and tail of each document (ranged iter_download)
+"""
+
+import asyncio
+import json
+import re
+import struct
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any
+
+from telethon.tl.types import (
+    DocumentAttributeVideo, DocumentAttributeAudio, DocumentAttributeImageSize
+)
+import config
+from transfer_scheduler import set_transfer_priority, BACKGROUND
+from circuit_breaker import telegram_breaker, OPEN
+from db import db, File
+
+# Marker written into file_metadata once a file has been processed
+ENRICHED_KEY = 'enriched_at'
+# Failed attempts so far / earliest next attempt, kept until the file is enriched
+ATTEMPTS_KEY = 'enrich_attempts'
+RETRY_AT_KEY = 'enrich_retry_at'
+
+
+# ================================================================
+# HEADER PARSERS (pure functions on partial bytes)
+# ================================================================
+
+def _read_tiff_tag(tiff: bytes, wanted_tags) -> Dict[int, Any]:
+    """Read ASCII/LONG tags from IFD0 and the Exif sub-IFD of a TIFF block"""
+    found = {}
+    if len(tiff) < 8:
+        return found
+    endian = '<' if tiff[:2] == b'II' else '>'
+
+    def read_ifd(ifd_offset):
+        if ifd_offset <= 0 or ifd_offset + 2 > len(tiff):
+            return
+        count = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(count):
+            entry = ifd_offset + 2 + i * 12
+            if entry + 12 > len(tiff):
+                return
+            tag, typ, num = struct.unpack(endian + 'HHI', tiff[entry:entry + 8])
+            value_raw = tiff[entry + 8:entry + 12]
+            if tag == 0x8769 and typ == 4:
+                read_ifd(struct.unpack(endian + 'I', value_raw)[0])
+            elif tag in wanted_tags and typ == 2:
+                if num <= 4:
+                    value = value_raw[:num]
+                else:
+                    value_offset = struct.unpack(endian + 'I', value_raw)[0]
+                    value = tiff[value_offset:value_offset + num]
+                found[tag] = value.rstrip(b'\x00').decode('ascii', 'ignore')
+
+    read_ifd(struct.unpack(endian + 'I', tiff[4:8])[0])
+    return found
+
+
+def _parse_exif_date(tiff: bytes) -> Optional[str]:
+    """Return EXIF DateTimeOriginal (fallback DateTime) as ISO string"""
+    tags = _read_tiff_tag(tiff, (0x9003, 0x0132))
+    raw = tags.get(0x9003) or tags.get(0x0132)
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(raw.strip(), '%Y:%m:%d %H:%M:%S').isoformat()
+    except ValueError:
+        return None
+
+
+def parse_jpeg(data: bytes) -> Dict[str, Any]:
+    """Parse JPEG dimensions and EXIF date from the file head"""
+    result = {}
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            break
+        marker = data[pos + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        seg_len = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        segment = data[pos + 4:pos + 2 + seg_len]
+        if marker == 0xE1 and segment[:6] == b'Exif\x00\x00':
+            exif_date = _parse_exif_date(segment[6:])
+            if exif_date:
+                result['exif_date'] = exif_date
+        elif marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            if len(segment) >= 5:
+                height, width = struct.unpack('>HH', segment[1:5])
+                result['width'] = width
+                result['height'] = height
+            break
+        elif marker == 0xDA:
+            break
+        pos += 2 + seg_len
+    return result
+
+
+def parse_image(data: bytes) -> Dict[str, Any]:
+    """Parse width/height (and EXIF date for JPEG) from an image header"""
+    if data[:3] == b'\xff\xd8\xff':
+        return parse_jpeg(data)
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        width, height = struct.unpack('>II', data[16:24])
+        return {'width': width, 'height': height}
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        width, height = struct.unpack('<HH', data[6:10])
+        return {'width': width, 'height': height}
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', data[26:30])
+            return {'width': width & 0x3FFF, 'height': height & 0x3FFF}
+        if chunk == b'VP8L':
+            bits = struct.unpack('<I', data[21:25])[0]
+            return {'width': (bits & 0x3FFF) + 1, 'height': ((bits >> 14) & 0x3FFF) + 1}
+        if chunk == b'VP8X':
+            width = int.from_bytes(data[24:27], 'little') + 1
+            height = int.from_bytes(data[27:30], 'little') + 1
+            return {'width': width, 'height': height}
+    return {}
+
+
+def parse_mp4(head: bytes, tail: bytes) -> Dict[str, Any]:
+    """Parse duration (mvhd) and video size (tkhd) from MP4/MOV head or tail bytes"""
+    result = {}
+    for data in (head, tail):
+        if 'duration' not in result:
+            idx = data.find(b'mvhd')
+            if idx != -1 and idx + 24 <= len(data):
+                version = data[idx + 4]
+                if version == 1 and idx + 36 <= len(data):
+                    timescale, duration = struct.unpack('>IQ', data[idx + 24:idx + 36])
+                else:
+                    timescale, duration = struct.unpack('>II', data[idx + 16:idx + 24])
+                if timescale:
+                    result['duration'] = round(duration / timescale, 3)
+
+        if 'width' not in result:
+            idx = data.find(b'tkhd')
+            while idx != -1:
+                version = data[idx + 4] if idx + 4 < len(data) else 0
+                size_offset = idx + (92 if version == 1 else 80)
+                if size_offset + 8 > len(data):
+                    break
+                width, height = struct.unpack('>II', data[size_offset:size_offset + 8])
+                if width and height:
+                    result['width'] = width >> 16
+                    result['height'] = height >> 16
+                    break
+                idx = data.find(b'tkhd', idx + 4)
+    return result
+
+
+_PDF_COUNT_RE = re.compile(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b', re.S)
+_PDF_LINEARIZED_RE = re.compile(rb'/Linearized\b[^>]*?/N\s+(\d+)', re.S)
+
+
+def parse_pdf(head: bytes, tail: bytes) -> Dict[str, Any]:
+    """Best-effort PDF page count from linearization dict or the root Pages node"""
+    match = _PDF_LINEARIZED_RE.search(head[:2048])
+    if match:
+        return {'page_count': int(match.group(1))}
+    counts = []
+    for data in (head, tail):
+        for m in _PDF_COUNT_RE.finditer(data):
+            counts.append(int(m.group(1) or m.group(2)))
+    # The root Pages node carries the largest /Count
+    return {'page_count': max(counts)} if counts else {}
+
+
+def parse_from_attributes(message) -> Dict[str, Any]:
+    """Metadata Telegram already knows (no download needed)"""
+    result = {}
+    file = message.file
+    if file is not None and file.size:
+        result['file_size'] = file.size
+
+    document = getattr(message.media, 'document', None)
+    if document is not None:
+        for attr in document.attributes:
+            if isinstance(attr, DocumentAttributeVideo):
+                result['duration'] = attr.duration
+                result['width'] = attr.w
+                result['height'] = attr.h
+            elif isinstance(attr, DocumentAttributeAudio):
+                result['duration'] = attr.duration
+            elif isinstance(attr, DocumentAttributeImageSize):
+                result['width'] = attr.w
+                result['height'] = attr.h
+    elif file is not None and file.width:
+        # Photos: largest PhotoSize gives both dimensions and byte count
+        result['width'] = file.width
+        result['height'] = file.height
+    return result
+
+
+def needs_content(mime_type: str, known: Dict[str, Any]) -> bool:
+    """Whether the head/tail bytes can add anything beyond the Telegram attributes"""
+    mime_type = mime_type or ''
+    if mime_type.startswith('image/'):
+        return True  # EXIF date only lives in the file
+    if mime_type == 'application/pdf':
+        return True
+    if mime_type.startswith('video/') or mime_type in ('audio/mp4', 'audio/x-m4a'):
+        return 'duration' not in known or 'width' not in known
+    return False
+
+
+# ================================================================
+# ENRICHMENT
+# ================================================================
+
+def get_file_metadata(file_record: File) -> Dict[str, Any]:
+    """Parse file_metadata JSON column"""
+    try:
+        return json.loads(file_record.file_metadata) if file_record.file_metadata else {}
+    except (TypeError, ValueError):
+        return {}
+
+
+def set_file_metadata(file_record: File, metadata: Dict[str, Any]):
+    """Store file_metadata JSON column"""
+    file_record.file_metadata = json.dumps(metadata, ensure_ascii=False)
+
+
+async def enrich_file(storage, file_record: File) -> Dict[str, Any]:
+    """Collect metadata for one Telegram file using at most head + tail bytes"""
+    message = await storage.get_message(file_record)
+    if message is None:
+        return {'error': 'message_not_found'}
+
+    metadata = parse_from_attributes(message)
+    size = metadata.get('file_size') or file_record.file_size or 0
+    mime_type = file_record.mime_type or (message.file.mime_type if message.file else '')
+
+    if size and needs_content(mime_type, metadata):
+        head_len = min(size, config.METADATA_HEAD_BYTES)
+        head = await storage.read_range(message.media, 0, head_len)
+        tail = b''
+        if size > head_len and not mime_type.startswith('image/'):
+            tail_len = min(size - head_len, config.METADATA_TAIL_BYTES)
+            tail = await storage.read_range(message.media, size - tail_len, tail_len)
+
+        if mime_type.startswith('image/'):
+            parsed = parse_image(head)
+        elif mime_type == 'application/pdf':
+            parsed = parse_pdf(head, tail)
+        else:
+            parsed = parse_mp4(head, tail)
+
+        for key, value in parsed.items():
+            metadata.setdefault(key, value)
+        metadata['bytes_read'] = len(head) + len(tail)
+
+    return metadata
+
+
+def record_failure(metadata: Dict[str, Any], error: Exception) -> bool:
+    """Note a failed attempt with exponential backoff (FloodWait's own wait if longer).
+    Returns True once attempts are used up and the file should be marked done"""
+    attempts = metadata.get(ATTEMPTS_KEY, 0) + 1
+    metadata[ATTEMPTS_KEY] = attempts
+    metadata['error'] = str(error)[:200]
+    if attempts >= config.METADATA_MAX_ATTEMPTS:
+        metadata.pop(RETRY_AT_KEY, None)
+        return True
+    delay = max(config.METADATA_RETRY_BASE * 2 ** (attempts - 1), getattr(error, 'seconds', 0) or 0)
+    metadata[RETRY_AT_KEY] = (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+    return False
+
+
+def is_backing_off(metadata: Dict[str, Any], now: datetime) -> bool:
+    retry_at = metadata.get(RETRY_AT_KEY)
+    return bool(retry_at) and datetime.fromisoformat(retry_at) > now
+
+
+class MetadataEnrichmentWorker:
+    """Background worker that enriches Telegram files missing metadata"""
+
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.running = False
+        self.stats = {'processed': 0, 'failed': 0, 'bytes_read': 0, 'last_run': None, 'pending': 0}
+
+    def start(self, app):
+        """Start the daemon thread (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.app = app
+            self._thread = threading.Thread(target=self._run, daemon=True, name='metadata-enricher')
+            self._thread.start()
+        print("🔎 Started metadata enrichment worker")
+
+    def wake(self):
+        """Process pending files now instead of waiting for the next interval"""
+        self._wake.set()
+
+    def _pending_query(self):
+        return File.query.filter(
+            File.storage_type == 'telegram',
+            File.is_deleted == False,
+            File.telegram_message_id.isnot(None),
+            db.or_(File.file_metadata.is_(None), ~File.file_metadata.contains(f'"{ENRICHED_KEY}"'))
+        )
+
+    def status(self) -> Dict[str, Any]:
+        """Worker status for the API"""
+        return dict(self.stats, running=self.running, alive=bool(self._thread and self._thread.is_alive()))
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=config.METADATA_INTERVAL)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.running = True
+                    asyncio.run(self.process_pending())
+            except Exception as e:
+                print(f"[ENRICH] Worker error: {e}")
+            finally:
+                self.running = False
+
+    async def process_pending(self, file_ids=None):
+        """Enrich pending files in batches with one Telegram connection"""
+        set_transfer_priority(BACKGROUND)
+        from telegram_storage import TelegramStorageManager
+
+        query = self._pending_query()
+        if file_ids:
+            query = query.filter(File.id.in_(file_ids))
+        self.stats['pending'] = query.count()
+        if not self.stats['pending']:
+            return
+
+        # Own client: the shared telegram_storage instance is opened/closed per request
+        storage = TelegramStorageManager()
+        if not await storage.initialize():
+            print("[ENRICH] Telegram client not available, will retry later")
+            return
+
+        try:
+            # Walk by ID: files that fail stay pending and must not be fetched again this pass
+            last_id = 0
+            now = datetime.now(timezone.utc)
+            while telegram_breaker.state != OPEN:
+                batch = query.filter(File.id > last_id).order_by(File.id).limit(config.METADATA_BATCH_SIZE).all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                for file_record in batch:
+                    if telegram_breaker.state == OPEN:
+                        break  # Telegram is down: leave the rest without burning their attempts
+                    metadata = get_file_metadata(file_record)
+                    if is_backing_off(metadata, now):
+                        continue
+                    try:
+                        enriched = await enrich_file(storage, file_record)
+                        self.stats['processed'] += 1
+                    except Exception as e:
+                        # FloodWait, timeouts, open circuit: retried on a later pass
+                        print(f"[ENRICH] Failed for {file_record.filename}: {e}")
+                        self.stats['failed'] += 1
+                        if record_failure(metadata, e):
+                            metadata[ENRICHED_KEY] = datetime.now(timezone.utc).isoformat()
+                        set_file_metadata(file_record, metadata)
+                        continue
+
+                    for key in (ATTEMPTS_KEY, RETRY_AT_KEY, 'error'):
+                        metadata.pop(key, None)
+                    real_size = enriched.pop('file_size', None)
+                    if real_size and not file_record.file_size:
+                        file_record.file_size = real_size
+                    self.stats['bytes_read'] += enriched.get('bytes_read', 0)
+
+                    metadata.update(enriched)
+                    metadata[ENRICHED_KEY] = datetime.now(timezone.utc).isoformat()
+                    set_file_metadata(file_record, metadata)
+                db.session.commit()
+                self.stats['pending'] = max(0, self.stats['pending'] - len(batch))
+                await asyncio.sleep(0.5)
+        finally:
+            self.stats['last_run'] = datetime.now(timezone.utc).isoformat()
+            await storage.close()
+
+
+# Global instance
+metadata_worker = MetadataEnrichmentWorker()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Pack Storage
+Small files are appended into rolling container documents ("packs") instead of
+costing one Telegram message each. Files keep an offset/length into their pack and
+are served with ranged reads; a background worker seals full/old packs to Saved
+Messages and compacts packs that deletes have made sparse
+"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+import config
+from transfer_scheduler import set_transfer_priority, BACKGROUND
+from db import db, File, PackBlob
+
+PACK_DIR = Path(__file__).parent.parent / 'data' / 'packs'
+PACK_FILENAME_PREFIX = 'teledrive_pack_'
+
+# Adjacent live entries closer than this are fetched with one ranged read during compaction
+COALESCE_GAP = 64 * 1024
+
+
+def is_pack_filename(filename: str) -> bool:
+    """Check whether a Saved Messages document is a pack container"""
+    return bool(filename) and filename.startswith(PACK_FILENAME_PREFIX)
+
+
+def pack_path(pack_id: int) -> Path:
+    """Local file of a pack while it is open"""
+    return PACK_DIR / f"{PACK_FILENAME_PREFIX}{pack_id}.pack"
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _as_aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class PackStorage:
+    """Appends small files to open packs and serves them back"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def should_pack(self, file_size: int) -> bool:
+        """Whether a file of this size goes into a pack"""
+        return bool(config.PACK_STORAGE_ENABLED) and 0 < file_size <= config.PACK_FILE_THRESHOLD
+
+    def _open_pack(self, user_id: int) -> PackBlob:
+        pack = PackBlob.query.filter_by(user_id=user_id, status='open').order_by(PackBlob.id.desc()).first()
+        if pack and pack.size < config.PACK_TARGET_SIZE:
+            return pack
+
+        PACK_DIR.mkdir(parents=True, exist_ok=True)
+        pack = PackBlob(user_id=user_id, status='open', size=0, entry_count=0)
+        db.session.add(pack)
+        db.session.flush()
+        pack.local_path = str(pack_path(pack.id))
+        open(pack.local_path, 'ab').close()
+        return pack
+
+    def append_bytes(self, user_id: int, data: bytes) -> Tuple[PackBlob, int, int]:
+        """Append raw bytes to the user's open pack, returns (pack, offset, length)"""
+        with self._lock:
+            pack = self._open_pack(user_id)
+            with open(pack.local_path, 'r+b') as f:
+                # Trust the file over the row: a crash may have left unreferenced bytes
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            pack.size = offset + len(data)
+            pack.entry_count = (pack.entry_count or 0) + 1
+            return pack, offset, len(data)
+
+    def append_file(self, user_id: int, source_path: str) -> Tuple[PackBlob, int, int]:
+        """Append a local file to the user's open pack"""
+        with open(source_path, 'rb') as f:
+            return self.append_bytes(user_id, f.read())
+
+    def needs_seal(self, pack: PackBlob) -> bool:
+        """Open pack is full, or non-empty and old enough"""
+        if pack.status != 'open' or not pack.size:
+            return False
+        if pack.size >= config.PACK_TARGET_SIZE:
+            return True
+        created = _as_aware(pack.created_at)
+        return created is not None and _utcnow() - created >= timedelta(seconds=config.PACK_MAX_AGE)
+
+    def pack_message_id(self, pack_id: int) -> Optional[int]:
+        """Saved Messages ID of a sealed pack (None while open)"""
+        pack = db.session.get(PackBlob, pack_id)
+        if pack is None:
+            raise Exception('Pack not found')
+        return pack.telegram_message_id
+
+    async def read_range(self, storage, pack_id: int, message_id: Optional[int], offset: int, length: int) -> bytes:
+        """Read [offset, offset + length) of a pack: local file while open, ranged Telegram read once
+        sealed. `message_id` may be None (or stale-open) for a pack sealed since the caller looked"""
+        local_path = pack_path(pack_id)
+        if local_path.exists():
+            with open(local_path, 'rb') as f:
+                f.seek(offset)
+                return f.read(length)
+
+        if message_id is None:
+            message_id = self.pack_message_id(pack_id)
+        message = await storage.get_saved_message(message_id) if message_id else None
+        if message is None:
+            raise Exception('Pack message not found on Telegram')
+        return await storage.read_range(message.media, offset, length)
+
+    async def read_entry(self, storage, file_record: File) -> bytes:
+        """Read one packed file"""
+        message_id = self.pack_message_id(file_record.pack_id)
+        return await self.read_range(storage, file_record.pack_id, message_id, file_record.pack_offset,
+                                     file_record.pack_length)
+
+    async def seal(self, storage, pack: PackBlob) -> bool:
+        """Upload an open pack to Saved Messages as one document"""
+        with self._lock:
+            if pack.status != 'open':
+                return False
+            pack.status = 'sealing'
+            db.session.commit()
+
+        result = await storage.upload_to_saved_messages(pack.local_path, f"{PACK_FILENAME_PREFIX}{pack.id}.pack")
+        if not result:
+            pack.status = 'open'
+            db.session.commit()
+            return False
+
+        pack.telegram_message_id = result['message_id']
+        pack.telegram_channel_id = result['channel_id']
+        pack.telegram_file_id = result.get('file_id')
+        pack.telegram_access_hash = result.get('access_hash')
+        pack.telegram_file_reference = result.get('file_reference')
+        pack.status = 'sealed'
+        pack.sealed_at = _utcnow()
+        local_path = pack.local_path
+        pack.local_path = None
+        db.session.commit()
+
+        try:
+            os.remove(local_path)
+        except OSError:
+            pass
+        print(f"[PACK] Sealed pack {pack.id}: {pack.entry_count} entries, {pack.size} bytes -> message {pack.telegram_message_id}")
+        return True
+
+    def pack_stats(self, pack_id: int) -> Dict[str, int]:
+        """Live entries/bytes of a pack (deleted files are dead space)"""
+        live_count, live_bytes = db.session.query(
+            db.func.count(File.id), db.func.coalesce(db.func.sum(File.pack_length), 0)
+        ).filter(File.pack_id == pack_id, File.is_deleted == False).one()
+        return {'live_count': int(live_count), 'live_bytes': int(live_bytes)}
+
+    def _coalesce(self, entries: List[File]) -> List[Tuple[int, int, List[File]]]:
+        """Group entries (sorted by offset) into (offset, length, entries) read ranges"""
+        groups = []
+        for entry in entries:
+            end = entry.pack_offset + entry.pack_length
+            if groups and entry.pack_offset - (groups[-1][0] + groups[-1][1]) <= COALESCE_GAP:
+                start, _, members = groups[-1]
+                groups[-1] = (start, max(end, start + groups[-1][1]) - start, members + [entry])
+            else:
+                groups.append((entry.pack_offset, entry.pack_length, [entry]))
+        return groups
+
+    async def compact(self, storage, pack: PackBlob) -> Dict[str, Any]:
+        """Move live entries of a sparse sealed pack into the open pack, then drop the old message"""
+        entries = File.query.filter(File.pack_id == pack.id, File.is_deleted == False).order_by(File.pack_offset).all()
+
+        moved = 0
+        if entries:
+            message = await storage.get_saved_message(pack.telegram_message_id)
+            if message is None:
+                raise Exception(f'Pack {pack.id} message not found on Telegram')
+
+            for start, length, members in self._coalesce(entries):
+                data = await storage.read_range(message.media, start, length)
+                for entry in members:
+                    rel = entry.pack_offset - start
+                    new_pack, offset, entry_length = self.append_bytes(pack.user_id, data[rel:rel + entry.pack_length])
+                    entry.pack_id = new_pack.id
+                    entry.pack_offset = offset
+                    entry.pack_length = entry_length
+                    moved += 1
+                db.session.commit()
+
+        # Deleted rows still pointing at the old pack can never be served again
+        File.query.filter(File.pack_id == pack.id, File.is_deleted == True).update(
+            {File.pack_id: None, File.pack_offset: None, File.pack_length: None}, synchronize_session=False)
+
+        await storage.delete_saved_messages([pack.telegram_message_id])
+        pack.status = 'retired'
+        db.session.commit()
+        print(f"[PACK] Compacted pack {pack.id}: moved {moved} live entries")
+        return {'pack_id': pack.id, 'moved': moved}
+
+    def packs_to_compact(self) -> List[PackBlob]:
+        """Sealed packs whose live ratio fell below PACK_COMPACT_RATIO"""
+        candidates = []
+        for pack in PackBlob.query.filter_by(status='sealed').all():
+            stats = self.pack_stats(pack.id)
+            if not pack.size or stats['live_bytes'] / pack.size < config.PACK_COMPACT_RATIO:
+                candidates.append(pack)
+        return candidates
+
+
+class PackMaintenanceWorker:
+    """Background sealing + compaction"""
+
+    def __init__(self, storage: PackStorage):
+        self.packs = storage
+        self.app = None
+        self._thread = None
+        self._wake = threading.Event()
+        self.stats = {'sealed': 0, 'compacted': 0, 'last_run': None, 'last_error': None}
+
+    def start(self, app):
+        """Start the daemon thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.app = app
+        self._thread = threading.Thread(target=self._run, daemon=True, name='pack-maintenance')
+        self._thread.start()
+        print("📦 Started pack maintenance worker")
+
+    def wake(self):
+        """Run maintenance now"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=config.PACK_MAINTENANCE_INTERVAL)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    asyncio.run(self.run_once())
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+                print(f"[PACK] Maintenance error: {e}")
+
+    async def run_once(self):
+        """Seal due packs and compact sparse ones with one Telegram connection"""
+        set_transfer_priority(BACKGROUND)
+        from telegram_storage import TelegramStorageManager
+
+        # Only this worker seals, so a 'sealing' pack here was interrupted mid-upload
+        PackBlob.query.filter_by(status='sealing').update({PackBlob.status: 'open'}, synchronize_session=False)
+        db.session.commit()
+
+        to_seal = [p for p in PackBlob.query.filter_by(status='open').all() if self.packs.needs_seal(p)]
+        to_compact = self.packs.packs_to_compact()
+        self.stats['last_run'] = _utcnow().isoformat()
+        if not to_seal and not to_compact:
+            return
+
+        storage = TelegramStorageManager()
+        if not await storage.initialize():
+            print("[PACK] Telegram client not available, will retry later")
+            return
+        try:
+            for pack in to_seal:
+                if await self.packs.seal(storage, pack):
+                    self.stats['sealed'] += 1
+            for pack in to_compact:
+                await self.packs.compact(storage, pack)
+                self.stats['compacted'] += 1
+            # Compaction refills the open pack; seal it if that made it due
+            for pack in PackBlob.query.filter_by(status='open').all():
+                if pack.size >= config.PACK_TARGET_SIZE and await self.packs.seal(storage, pack):
+                    self.stats['sealed'] += 1
+        finally:
+            await storage.close()
+
+    def status(self) -> Dict[str, Any]:
+        """Pack storage overview for the API"""
+        counts = dict(db.session.query(PackBlob.status, db.func.count(PackBlob.id)).group_by(PackBlob.status).all())
+        return dict(self.stats, enabled=bool(config.PACK_STORAGE_ENABLED), packs=counts,
+                    alive=bool(self._thread and self._thread.is_alive()))
+
+
+# Global instances
+pack_storage = PackStorage()
+pack_worker = PackMaintenanceWorker(pack_storage)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Telegram Rate Limiter
+Central token bucket shared by every Telegram RPC issuer (storage, scanner, workers)
+so bulk operations stay under REQUESTS_PER_SECOND / BURST_LIMIT and back off together
+on FloodWait
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, Any
+
+import config
+
+
+class TelegramRateLimiter:
+    """Thread-safe token bucket usable from any asyncio loop"""
+
+    def __init__(self, rate: float, burst: int, enabled: bool = True):
+        self.rate = max(float(rate), 0.1)
+        self.burst = max(int(burst), 1)
+        self.enabled = enabled
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'acquired': 0, 'waited_seconds': 0.0, 'flood_waits': 0}
+
+    def _reserve(self, cost: float) -> float:
+        """Take tokens now, returns how long the caller must wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= cost
+            wait = max(0.0, -self._tokens / self.rate, self._paused_until - now)
+            self.stats['acquired'] += 1
+            self.stats['waited_seconds'] += wait
+            return wait
+
+    async def acquire(self, cost: float = 1):
+        """Wait until `cost` requests may be sent"""
+        if not self.enabled:
+            return
+        wait = self._reserve(cost)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Block every caller for `seconds` (Telegram FloodWait applies per account)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.stats['flood_waits'] += 1
+
+    def status(self) -> Dict[str, Any]:
+        """Limiter status for the API"""
+        with self._lock:
+            return dict(
+                self.stats,
+                enabled=self.enabled,
+                rate=self.rate,
+                burst=self.burst,
+                paused_for=max(0.0, round(self._paused_until - time.monotonic(), 1))
+            )
+
+
+# Global instance
+telegram_rate_limiter = TelegramRateLimiter(
+    config.REQUESTS_PER_SECOND,
+    config.BURST_LIMIT,
+    enabled=config.RATE_LIMITING_ENABLED
+)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Remote Archive Reader
+Browse and extract single members of Telegram-stored ZIP archives using ranged reads:
+only the end-of-central-directory, the central directory and the requested member
+bytes are fetched from Telegram
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+
+import config
+
+EOCD_SIGNATURE = b'PK\x05\x06'
+ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_EOCD_SIGNATURE = b'PK\x06\x06'
+CENTRAL_SIGNATURE = b'PK\x01\x02'
+LOCAL_SIGNATURE = b'PK\x03\x04'
+
+EOCD_SIZE = 22
+MAX_COMMENT_SIZE = 0xFFFF
+LOCAL_HEADER_SIZE = 30
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# Index cache: memory (LRU) + JSON files under data/cache/zip_index
+INDEX_CACHE_DIR = Path(__file__).parent.parent / 'data' / 'cache' / 'zip_index'
+_memory_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+ReadRange = Callable[[int, int], Awaitable[bytes]]
+
+
+class RemoteArchiveError(Exception):
+    """Raised when an archive can't be read remotely"""
+
+
+# ================================================================
+# ZIP STRUCTURE PARSING (pure functions)
+# ================================================================
+
+def parse_eocd(tail: bytes, tail_offset: int) -> Dict[str, Any]:
+    """Locate the end-of-central-directory record inside the archive tail"""
+    idx = tail.rfind(EOCD_SIGNATURE)
+    if idx == -1 or idx + EOCD_SIZE > len(tail):
+        raise RemoteArchiveError('End of central directory not found (not a ZIP file?)')
+
+    (_, disk, cd_disk, _, total_entries, cd_size, cd_offset, _) = struct.unpack(
+        '<4sHHHHIIH', tail[idx:idx + EOCD_SIZE])
+    eocd = {
+        'eocd_offset': tail_offset + idx,
+        'total_entries': total_entries,
+        'cd_size': cd_size,
+        'cd_offset': cd_offset,
+        'zip64_eocd_offset': None,
+    }
+
+    # ZIP64: the locator sits right before the classic EOCD
+    locator = idx - 20
+    if locator >= 0 and tail[locator:locator + 4] == ZIP64_LOCATOR_SIGNATURE:
+        eocd['zip64_eocd_offset'] = struct.unpack('<Q', tail[locator + 8:locator + 16])[0]
+    return eocd
+
+
+def parse_zip64_eocd(data: bytes, eocd: Dict[str, Any]) -> Dict[str, Any]:
+    """Override sizes/offsets with the ZIP64 end-of-central-directory record"""
+    if data[:4] != ZIP64_EOCD_SIGNATURE:
+        raise RemoteArchiveError('Invalid ZIP64 end of central directory')
+    total_entries, cd_size, cd_offset = struct.unpack('<QQQ', data[32:56])
+    eocd.update(total_entries=total_entries, cd_size=cd_size, cd_offset=cd_offset)
+    return eocd
+
+
+def _dos_datetime(date: int, time_: int) -> Optional[str]:
+    try:
+        return datetime(
+            ((date >> 9) & 0x7F) + 1980, (date >> 5) & 0x0F, date & 0x1F,
+            (time_ >> 11) & 0x1F, (time_ >> 5) & 0x3F, (time_ & 0x1F) * 2
+        ).isoformat()
+    except ValueError:
+        return None
+
+
+def parse_central_directory(data: bytes) -> List[Dict[str, Any]]:
+    """Parse central directory records into a list of member entries"""
+    entries = []
+    pos = 0
+    while pos + 46 <= len(data) and data[pos:pos + 4] == CENTRAL_SIGNATURE:
+        (_, _, _, flags, method, mtime, mdate, crc, comp_size, size,
+         name_len, extra_len, comment_len, _, _, _, local_offset) = struct.unpack(
+            '<4sHHHHHHIIIHHHHHII', data[pos:pos + 46])
+        name_raw = data[pos + 46:pos + 46 + name_len]
+        extra = data[pos + 46 + name_len:pos + 46 + name_len + extra_len]
+        name = name_raw.decode('utf-8' if flags & 0x800 else 'cp437', 'replace')
+
+        # ZIP64 extended information replaces the 0xFFFFFFFF placeholders in order
+        if 0xFFFFFFFF in (size, comp_size, local_offset):
+            epos = 0
+            while epos + 4 <= len(extra):
+                header_id, data_size = struct.unpack('<HH', extra[epos:epos + 4])
+                if header_id == 0x0001:
+                    values = extra[epos + 4:epos + 4 + data_size]
+                    vpos = 0
+                    if size == 0xFFFFFFFF:
+                        size = struct.unpack('<Q', values[vpos:vpos + 8])[0]
+                        vpos += 8
+                    if comp_size == 0xFFFFFFFF:
+                        comp_size = struct.unpack('<Q', values[vpos:vpos + 8])[0]
+                        vpos += 8
+                    if local_offset == 0xFFFFFFFF:
+                        local_offset = struct.unpack('<Q', values[vpos:vpos + 8])[0]
+                    break
+                epos += 4 + data_size
+
+        entries.append({
+            'name': name,
+            'size': size,
+            'compressed_size': comp_size,
+            'compress_type': method,
+            'crc': crc,
+            'encrypted': bool(flags & 0x1),
+            'is_dir': name.endswith('/'),
+            'modified': _dos_datetime(mdate, mtime),
+            'header_offset': local_offset,
+        })
+        pos += 46 + name_len + extra_len + comment_len
+
+    return entries
+
+
+def local_data_offset(local_header: bytes, entry: Dict[str, Any]) -> int:
+    """Absolute offset of a member's compressed data from its local file header"""
+    if local_header[:4] != LOCAL_SIGNATURE:
+        raise RemoteArchiveError(f"Invalid local header for {entry['name']}")
+    name_len, extra_len = struct.unpack('<HH', local_header[26:30])
+    return entry['header_offset'] + LOCAL_HEADER_SIZE + name_len + extra_len
+
+
+# ================================================================
+# REMOTE READER
+# ================================================================
+
+class RemoteZipReader:
+    """ZIP reader on top of an async read_range(offset, length) callable"""
+
+    def __init__(self, read_range: ReadRange, size: int, index: Optional[Dict[str, Any]] = None):
+        self.read_range = read_range
+        self.size = size
+        self.index = index
+        self.bytes_read = 0
+
+    async def _read(self, offset: int, length: int) -> bytes:
+        data = await self.read_range(offset, length)
+        self.bytes_read += len(data)
+        return data
+
+    async def load_index(self) -> Dict[str, Any]:
+        """Fetch EOCD + central directory (one or two ranged reads)"""
+        if self.index is not None:
+            return self.index
+
+        tail_len = min(self.size, EOCD_SIZE + MAX_COMMENT_SIZE + 20)
+        tail_offset = self.size - tail_len
+        tail = await self._read(tail_offset, tail_len)
+        eocd = parse_eocd(tail, tail_offset)
+
+        if eocd['zip64_eocd_offset'] is not None:
+            zip64_offset = eocd['zip64_eocd_offset']
+            if zip64_offset >= tail_offset:
+                record = tail[zip64_offset - tail_offset:zip64_offset - tail_offset + 56]
+            else:
+                record = await self._read(zip64_offset, 56)
+            eocd = parse_zip64_eocd(record, eocd)
+
+        cd_offset, cd_size = eocd['cd_offset'], eocd['cd_size']
+        if cd_offset >= tail_offset:
+            # Small archives: the central directory already came with the tail
+            cd_data = tail[cd_offset - tail_offset:cd_offset - tail_offset + cd_size]
+        else:
+            cd_data = await self._read(cd_offset, cd_size)
+
+        entries = parse_central_directory(cd_data)
+        self.index = {
+            'archive_size': self.size,
+            'total_entries': eocd['total_entries'],
+            'entries': entries,
+        }
+        return self.index
+
+    def get_entry(self, name: str) -> Dict[str, Any]:
+        """Find a member entry by name"""
+        for entry in self.index['entries']:
+            if entry['name'] == name:
+                return entry
+        raise KeyError(name)
+
+    async def iter_member(self, name: str, chunk_size: int = 1024 * 1024):
+        """Yield the decompressed bytes of one member, reading only its byte range"""
+        await self.load_index()
+        entry = self.get_entry(name)
+        if entry['is_dir']:
+            return
+        if entry['encrypted']:
+            raise RemoteArchiveError(f"Encrypted member not supported: {name}")
+        if entry['compress_type'] not in (ZIP_STORED, ZIP_DEFLATED):
+            raise RemoteArchiveError(f"Unsupported compression method {entry['compress_type']} for {name}")
+
+        # Local header name/extra lengths may differ from the central directory
+        header = await self._read(entry['header_offset'], LOCAL_HEADER_SIZE)
+        offset = local_data_offset(header, entry)
+        remaining = entry['compressed_size']
+
+        decompressor = zlib.decompressobj(-15) if entry['compress_type'] == ZIP_DEFLATED else None
+        crc = 0
+        while remaining > 0:
+            chunk = await self._read(offset, min(chunk_size, remaining))
+            if not chunk:
+                raise RemoteArchiveError(f"Unexpected end of data for {name}")
+            offset += len(chunk)
+            remaining -= len(chunk)
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            crc = zlib.crc32(chunk, crc)
+            if chunk:
+                yield chunk
+        if decompressor:
+            chunk = decompressor.flush()
+            crc = zlib.crc32(chunk, crc)
+            if chunk:
+                yield chunk
+
+        if crc != entry['crc']:
+            raise RemoteArchiveError(f"CRC mismatch for {name}")
+
+    async def extract_member(self, name: str, dest_path: str) -> int:
+        """Write one member to dest_path, returns bytes written"""
+        written = 0
+        with open(dest_path, 'wb') as f:
+            async for chunk in self.iter_member(name):
+                f.write(chunk)
+                written += len(chunk)
+        return written
+
+
+# ================================================================
+# INDEX CACHE
+# ================================================================
+
+def _cache_key(file_record) -> str:
+    return f"{file_record.id}_{file_record.telegram_file_id or file_record.telegram_message_id}"
+
+
+def get_cached_index(file_record) -> Optional[Dict[str, Any]]:
+    """Get archive index from memory or disk cache"""
+    key = _cache_key(file_record)
+    with _cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    cache_file = INDEX_CACHE_DIR / f"{key}.json"
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            _remember(key, index)
+            return index
+        except (OSError, ValueError):
+            pass
+    return None
+
+
+def _remember(key: str, index: Dict[str, Any]):
+    with _cache_lock:
+        _memory_cache[key] = index
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > config.ZIP_INDEX_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def store_index(file_record, index: Dict[str, Any]):
+    """Persist archive index in memory and on disk"""
+    key = _cache_key(file_record)
+    _remember(key, index)
+    try:
+        INDEX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = INDEX_CACHE_DIR / f"{key}.json.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, INDEX_CACHE_DIR / f"{key}.json")
+    except OSError as e:
+        print(f"[ARCHIVE] Could not persist index for file {file_record.id}: {e}")
+
+
+# ================================================================
+# TELEGRAM HELPERS
+# ================================================================
+
+async def open_remote_zip(storage, file_record) -> RemoteZipReader:
+    """Build a reader for a Telegram-stored archive (storage must be initialized)"""
+    message = await storage.get_message(file_record)
+    if message is None:
+        raise RemoteArchiveError('Archive message not found on Telegram')
+
+    size = (message.file.size if message.file else 0) or file_record.file_size
+    if not size:
+        raise RemoteArchiveError('Archive size unknown')
+
+    async def read_range(offset, length):
+        return await storage.read_range(message.media, offset, length)
+
+    reader = RemoteZipReader(read_range, size, index=get_cached_index(file_record))
+    if reader.index is None:
+        store_index(file_record, await reader.load_index())
+    return reader
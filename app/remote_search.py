@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Remote Search
+Telegram-side fallback for /api/search: runs messages.search on Saved Messages in a
+thread alongside the local query, so files older than the rescan window are found
+without a full history sync. Hits that are not in the DB yet are upserted in the
+background
+"""
+
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional
+
+from db import db, File
+from pack_storage import is_pack_filename
+from saved_messages_sync import sync_lock
+
+
+def _run_search(app, query: str, limit: int, result: Dict[str, Any]):
+    from telegram_storage import TelegramStorageManager
+
+    async def search():
+        storage = TelegramStorageManager()
+        if not await storage.initialize():
+            raise Exception('Telegram client not available')
+        try:
+            return await storage.search_saved_messages(query, limit)
+        finally:
+            await storage.close()
+
+    try:
+        with app.app_context():
+            result['hits'] = asyncio.run(search())
+    except Exception as e:
+        result['error'] = str(e)
+
+
+class RemoteSearch:
+    """Handle for a Telegram search running in parallel with the local query"""
+
+    def __init__(self, app, query: str, limit: int):
+        self.result = {'hits': [], 'error': None}
+        self._thread = threading.Thread(target=_run_search, args=(app, query, limit, self.result),
+                                        daemon=True, name='remote-search')
+        self._thread.start()
+
+    def wait(self, timeout: float) -> Optional[List[Dict[str, Any]]]:
+        """Hits, or None if the search failed or did not finish in time"""
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.result['error'] = 'timeout'
+            return None
+        if self.result['error']:
+            return None
+        return self.result['hits']
+
+
+def known_message_ids(user_id: int, message_ids: List[int]) -> set:
+    """Saved Messages IDs already tracked in the DB (any folder, deleted included)"""
+    if not message_ids:
+        return set()
+    rows = File.query.with_entities(File.telegram_message_id).filter(
+        File.user_id == user_id,
+        File.storage_type == 'telegram',
+        File.telegram_message_id.in_(message_ids),
+        db.or_(File.telegram_channel == 'Saved Messages', File.telegram_channel_id == 'me')
+    ).all()
+    return {row[0] for row in rows}
+
+
+def unknown_hits(user_id: int, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Hits whose message is not tracked yet, one per message ID"""
+    known = known_message_ids(user_id, [h['message_id'] for h in hits])
+    fresh = []
+    for hit in hits:
+        # Pack containers are internal storage, not user files
+        if is_pack_filename(hit['filename']):
+            continue
+        if hit['message_id'] not in known:
+            known.add(hit['message_id'])
+            fresh.append(hit)
+    return fresh
+
+
+def hit_to_dict(hit: Dict[str, Any]) -> Dict[str, Any]:
+    """Search result entry for a remote hit (no DB id yet)"""
+    return {
+        'id': None,
+        'filename': hit['filename'],
+        'original_filename': hit['filename'],
+        'file_size': hit['file_size'],
+        'mime_type': hit['mime_type'],
+        'storage_type': 'telegram',
+        'telegram_message_id': hit['message_id'],
+        'telegram_channel': 'Saved Messages',
+        'telegram_date': hit['date'].isoformat() if hit.get('date') else None,
+        'description': hit.get('caption', ''),
+        'source': 'telegram',
+        'relevance_score': 0
+    }
+
+
+def _upsert_hits(app, user_id: int, hits: List[Dict[str, Any]]):
+    # The known check and the inserts run under the sync lock, so concurrent searches
+    # (or a rescan) cannot both insert the same message
+    with app.app_context(), sync_lock:
+        try:
+            added = 0
+            for hit in unknown_hits(user_id, hits):
+                file_record = File(
+                    filename=hit['filename'],
+                    original_filename=hit['filename'],
+                    file_size=hit['file_size'] or 0,
+                    mime_type=hit['mime_type'] or 'application/octet-stream',
+                    user_id=user_id,
+                    description=f"Synced from Saved Messages: {hit['filename']}",
+                    telegram_date=hit.get('date')
+                )
+                file_record.set_telegram_storage(
+                    message_id=hit['message_id'],
+                    channel='Saved Messages',
+                    channel_id='me',
+                    file_id=hit['file_id'],
+                    unique_id=hit['unique_id'],
+                    access_hash=hit['access_hash'],
+                    file_reference=hit['file_reference']
+                )
+                db.session.add(file_record)
+                added += 1
+            db.session.commit()
+            if added:
+                print(f"[SEARCH] Upserted {added} files found by Telegram search")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[SEARCH] Upsert of remote hits failed: {e}")
+
+
+def upsert_hits_async(app, user_id: int, hits: List[Dict[str, Any]]):
+    """Insert remote hits that are not in the DB yet, off the request thread"""
+    if hits:
+        threading.Thread(target=_upsert_hits, args=(app, user_id, hits), daemon=True, name='search-upsert').start()
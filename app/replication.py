@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Replication
+Keeps a second copy of every Telegram-stored file in the replication chat by forwarding
+(no re-upload). Downloads of replicated files are hedged against that copy
+"""
+
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any
+
+import config
+from transfer_scheduler import set_transfer_priority, BACKGROUND
+from db import db, File
+
+
+class ReplicationWorker:
+    """Background worker that forwards unreplicated files into the replica chat"""
+
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.running = False
+        self.stats = {'replicated': 0, 'failed': 0, 'pending': 0, 'last_run': None, 'last_error': None}
+
+    def start(self, app):
+        """Start the daemon thread (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.app = app
+            self._thread = threading.Thread(target=self._run, daemon=True, name='replication')
+            self._thread.start()
+        print("🪞 Started replication worker")
+
+    def wake(self):
+        """Replicate pending files now"""
+        self._wake.set()
+
+    def _pending_query(self):
+        # Only files the drive owns in Saved Messages; scanned channel media stays where it is
+        return File.query.filter(
+            File.storage_type == 'telegram',
+            File.is_deleted == False,
+            File.telegram_message_id.isnot(None),
+            File.replica_message_id.is_(None),
+            db.or_(File.telegram_channel_id == 'me', File.telegram_channel == 'Saved Messages'),
+            db.or_(File.from_scan.is_(None), File.from_scan == False)
+        )
+
+    def status(self) -> Dict[str, Any]:
+        """Worker status for the API"""
+        from telegram_storage import hedge_stats
+        return dict(
+            self.stats,
+            enabled=config.REPLICATION_ENABLED,
+            factor=config.REPLICATION_FACTOR,
+            hedge_delay=config.HEDGE_DELAY,
+            hedging=dict(hedge_stats),
+            running=self.running,
+            alive=bool(self._thread and self._thread.is_alive())
+        )
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=config.REPLICATION_INTERVAL)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.running = True
+                    asyncio.run(self.process_pending())
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+                print(f"[REPLICA] Worker error: {e}")
+            finally:
+                self.running = False
+
+    async def process_pending(self):
+        """Forward pending files in batches (one forward RPC per 100 messages)"""
+        set_transfer_priority(BACKGROUND)
+        from telegram_storage import TelegramStorageManager
+
+        query = self._pending_query()
+        self.stats['pending'] = query.count()
+        if not self.stats['pending']:
+            return
+
+        storage = TelegramStorageManager()
+        if not await storage.initialize():
+            print("[REPLICA] Telegram client not available, will retry later")
+            return
+
+        replica_peer = storage.parse_peer(config.REPLICATION_CHAT)
+        last_id = 0
+        try:
+            while True:
+                # Cursor on id so files that fail to forward are not retried in a loop
+                batch = query.filter(File.id > last_id).order_by(File.id).limit(config.REPLICATION_BATCH_SIZE).all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                replicated = await storage.replicate_files(batch, replica_peer)
+                db.session.commit()
+
+                self.stats['replicated'] += replicated
+                self.stats['failed'] += len(batch) - replicated
+                self.stats['pending'] = max(0, self.stats['pending'] - len(batch))
+        finally:
+            self.stats['last_run'] = datetime.now(timezone.utc).isoformat()
+            await storage.close()
+
+
+# Global instance
+replication_worker = ReplicationWorker()
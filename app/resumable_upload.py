@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Resumable Uploads
+tus-style chunked client-to-server uploads: a session is created with the total size,
+chunks are PATCHed at their byte offsets straight into a preallocated staging file
+(no multipart buffering, chunks may arrive in parallel or be retried after a
+disconnect), and finalize hands the assembled file to the normal storage path
+"""
+
+import json
+import os
+import secrets
+import shutil
+import threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+import config
+from db import db, UploadSession
+
+STAGING_DIR = Path(__file__).parent.parent / 'data' / 'upload_staging'
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class ResumableUploadError(Exception):
+    """Invalid chunk or session state, carries the HTTP status for the API"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Add [start, end) to sorted, non-overlapping ranges (adjacent ranges are joined)"""
+    if end <= start:
+        return [list(r) for r in ranges]
+    merged = []
+    for r_start, r_end in sorted(ranges + [[start, end]]):
+        if merged and r_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], r_end)
+        else:
+            merged.append([r_start, r_end])
+    return merged
+
+
+def contiguous_offset(ranges: List[List[int]]) -> int:
+    """End of the received prefix: the Upload-Offset a sequential client resumes from"""
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def covered_bytes(ranges: List[List[int]]) -> int:
+    """Total bytes received"""
+    return sum(end - start for start, end in ranges)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+class ResumableUploadManager:
+    """Creates upload sessions, writes chunks and tracks received ranges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int, filename: str, total_size: int,
+               mime_type: Optional[str] = None, folder_id: Optional[int] = None) -> UploadSession:
+        """Open a session and preallocate its staging file"""
+        if total_size <= 0:
+            raise ResumableUploadError('Upload size must be positive')
+        if total_size > config.RESUMABLE_MAX_SIZE:
+            raise ResumableUploadError(f'File too large (max {config.RESUMABLE_MAX_SIZE} bytes)', 413)
+
+        self.cleanup_expired()
+        STAGING_DIR.mkdir(parents=True, exist_ok=True)
+        upload_id = secrets.token_urlsafe(24)
+        staging_path = STAGING_DIR / f"{upload_id}.part"
+        with open(staging_path, 'wb') as f:
+            f.truncate(total_size)  # Sparse where supported, chunks land at their offsets
+
+        session = UploadSession(
+            upload_id=upload_id,
+            user_id=user_id,
+            folder_id=folder_id,
+            filename=filename,
+            mime_type=mime_type or 'application/octet-stream',
+            total_size=total_size,
+            staging_path=str(staging_path),
+            received_ranges='[]',
+            received_bytes=0,
+            status='uploading',
+            expires_at=_utcnow() + timedelta(seconds=config.RESUMABLE_EXPIRY)
+        )
+        db.session.add(session)
+        db.session.commit()
+        print(f"[RESUMABLE] Created upload {upload_id}: {filename} ({total_size} bytes)")
+        return session
+
+    def get(self, upload_id: str, user_id: int) -> UploadSession:
+        """Session owned by the user, raises 404 otherwise"""
+        session = UploadSession.query.filter_by(upload_id=upload_id, user_id=user_id).first()
+        if session is None:
+            raise ResumableUploadError('Upload not found', 404)
+        return session
+
+    def write_chunk(self, session: UploadSession, offset: int, stream, length: Optional[int]) -> Dict[str, Any]:
+        """Copy a request body into the staging file at `offset` and record the range.
+        A body cut short by a disconnect still counts for the bytes that arrived"""
+        if session.status != 'uploading':
+            raise ResumableUploadError(f'Upload is {session.status}', 409)
+        if offset < 0 or offset > session.total_size:
+            raise ResumableUploadError('Invalid Upload-Offset', 416)
+        if length is not None and (length > config.RESUMABLE_MAX_CHUNK or offset + length > session.total_size):
+            raise ResumableUploadError('Chunk exceeds upload size or chunk limit', 413)
+
+        limit = min(session.total_size - offset, config.RESUMABLE_MAX_CHUNK)
+        written = 0
+        try:
+            with open(session.staging_path, 'r+b') as f:
+                f.seek(offset)
+                while written < limit:
+                    block = stream.read(min(COPY_BLOCK_SIZE, limit - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    written += len(block)
+                if written == limit and stream.read(1):
+                    raise ResumableUploadError('Chunk exceeds upload size or chunk limit', 413)
+        finally:
+            if written:
+                self._record(session, offset, offset + written)
+        return dict(session.to_dict(), written=written)
+
+    def _record(self, session: UploadSession, start: int, end: int):
+        """Merge a written range into the session (parallel chunks serialize here)"""
+        with self._lock:
+            db.session.refresh(session)
+            ranges = merge_range(session.get_ranges(), start, end)
+            session.received_ranges = json.dumps(ranges)
+            session.received_bytes = covered_bytes(ranges)
+            session.updated_at = _utcnow()
+            session.expires_at = session.updated_at + timedelta(seconds=config.RESUMABLE_EXPIRY)
+            db.session.commit()
+
+    def is_complete(self, session: UploadSession) -> bool:
+        """All bytes received"""
+        return contiguous_offset(session.get_ranges()) >= session.total_size
+
+    def begin_finalize(self, session: UploadSession) -> str:
+        """Claim a complete session for finalize, returns the staging path"""
+        with self._lock:
+            db.session.refresh(session)
+            if session.status != 'uploading':
+                raise ResumableUploadError(f'Upload is {session.status}', 409)
+            if not self.is_complete(session):
+                raise ResumableUploadError(
+                    f'Upload incomplete: {session.received_bytes}/{session.total_size} bytes received', 409)
+            session.status = 'finalizing'
+            db.session.commit()
+            return session.staging_path
+
+    def complete(self, session: UploadSession, file_id: int):
+        """Finalize succeeded, the staging file now belongs to the storage path"""
+        session.status = 'completed'
+        session.file_id = file_id
+        session.staging_path = None
+        session.updated_at = _utcnow()
+        db.session.commit()
+
+    def abort_finalize(self, session: UploadSession):
+        """Finalize failed before storage took the file, allow a retry"""
+        session.status = 'uploading'
+        db.session.commit()
+
+    def fail_finalize(self, session: UploadSession, moved_path: Optional[str]):
+        """Storage failed after the staging file was moved out: move it back so finalize can be
+        retried, or mark the session failed when storage already consumed the file"""
+        try:
+            if moved_path and os.path.exists(moved_path):
+                shutil.move(moved_path, session.staging_path)
+                session.status = 'uploading'
+            else:
+                session.status = 'failed'
+        except OSError:
+            session.status = 'failed'
+        session.updated_at = _utcnow()
+        db.session.commit()
+
+    def delete(self, session: UploadSession):
+        """Cancel an upload and drop its staging file"""
+        self._remove_staging(session.staging_path)
+        db.session.delete(session)
+        db.session.commit()
+
+    def cleanup_expired(self) -> int:
+        """Drop unfinished sessions past their expiry (including finalizes that never returned)"""
+        expired = UploadSession.query.filter(
+            UploadSession.status.in_(['uploading', 'finalizing', 'failed']),
+            UploadSession.expires_at < _utcnow()
+        ).all()
+        for session in expired:
+            self._remove_staging(session.staging_path)
+            db.session.delete(session)
+        if expired:
+            db.session.commit()
+            print(f"[RESUMABLE] Removed {len(expired)} expired upload(s)")
+        return len(expired)
+
+    @staticmethod
+    def _remove_staging(path: Optional[str]):
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Global instance
+resumable_uploads = ResumableUploadManager()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Saved Messages Sync
+Reconciliation rules for the Saved Messages rescan: which DB rows the rescan owns
+and which of them no longer match a message in Saved Messages. Channel scan
+catalog rows and pack entries share the files table but are never touched here
+"""
+
+import threading
+from typing import List, Tuple, Iterable, Set, Dict, Any
+
+from db import File
+
+SAVED_MESSAGES = 'Saved Messages'
+
+# Held by every writer that inserts synced Saved Messages rows (rescan, search upsert),
+# so two of them never both decide a message is missing and insert it twice
+sync_lock = threading.Lock()
+
+
+def is_saved_messages_row(db_file: File) -> bool:
+    """Whether the row stands for a Saved Messages message (upload, copy or synced file)"""
+    # Packed files live inside pack containers, not in their own messages
+    if db_file.storage_type == 'pack':
+        return False
+    # Channel scan catalog rows point at messages in other chats
+    if db_file.from_scan:
+        return False
+    # Local fallbacks still waiting for the deferred sync have no message yet
+    if db_file.sync_pending:
+        return False
+    # Synced rows use 'me', uploads record the numeric self chat ID with the Saved Messages label
+    return db_file.telegram_channel_id in (None, 'me') or db_file.telegram_channel == SAVED_MESSAGES
+
+
+def saved_messages_rows(db_files: Iterable[File]) -> List[File]:
+    return [f for f in db_files if is_saved_messages_row(f)]
+
+
+def scan_window_floor(telegram_files: List[Dict[str, Any]]) -> int:
+    """Oldest message ID covered by a rescan. The rescan only walks the newest messages, so
+    rows below this (e.g. older files upserted by remote search) cannot be judged missing"""
+    return min((f['message_id'] for f in telegram_files), default=0)
+
+
+def reconcile_saved_messages(db_files: Iterable[File], telegram_message_ids: Set[int],
+                             window_floor: int = 0) -> List[Tuple[File, str]]:
+    """Saved Messages rows to delete, with the reason; kept rows are relabelled 'Saved Messages'
+
+    A row is stale when it has no message, its message is gone from Saved Messages
+    (within the scanned window), or another row already claims the same message
+    """
+    kept_message_ids = set()
+    stale = []
+    for db_file in saved_messages_rows(db_files):
+        if not db_file.telegram_message_id:
+            stale.append((db_file, "no message_id (local file)"))
+        elif db_file.telegram_message_id not in telegram_message_ids:
+            if db_file.telegram_message_id >= window_floor:
+                stale.append((db_file, "not in Saved Messages"))
+        elif db_file.telegram_message_id in kept_message_ids:
+            stale.append((db_file, "duplicate"))
+        else:
+            kept_message_ids.add(db_file.telegram_message_id)
+            # Update channel to 'Saved Messages' for consistency
+            if db_file.telegram_channel != SAVED_MESSAGES:
+                db_file.telegram_channel = SAVED_MESSAGES
+    return stale
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Scan Catalog
+Writes scanned media straight into the File table. Rows are plain dicts upserted with one
+INSERT ... ON CONFLICT statement per batch (executemany, one transaction), so a rescan
+refreshes existing entries in place and no ORM object is built per message. With the
+catalog disabled, scans fall back to per-row ORM inserts
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+import config
+from db import db, File, next_unique_id
+
+# Upsert target (partial unique index ux_files_scan_message)
+CONFLICT_COLUMNS = ['user_id', 'telegram_channel_id', 'telegram_message_id']
+# Refreshed on rescan; name, tags, favourite and deleted state stay as the user left them
+UPDATE_COLUMNS = ['folder_id', 'file_size', 'mime_type', 'telegram_channel', 'telegram_date',
+                  'file_metadata', 'telegram_missing', 'updated_at']
+# Commit interval of the per-row fallback (catalog disabled)
+ROW_COMMIT_EVERY = 50
+
+
+def _telegram_date(value) -> Optional[datetime]:
+    if isinstance(value, datetime) or value is None:
+        return value
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def scanned_file_row(file_info, user_id: int, folder_id: Optional[int], channel_id: Optional[str],
+                     channel_name: Optional[str]) -> Dict[str, Any]:
+    """File column values for a scanned message (scanner metadata kept for import)"""
+    now = datetime.now(timezone.utc)
+    name = file_info.get('file_name') or ''
+    return {
+        'unique_id': next_unique_id(),
+        'filename': name,
+        'original_filename': name,
+        'file_size': file_info.get('file_size') or 0,
+        'mime_type': file_info.get('mime_type') or '',
+        'folder_id': folder_id,
+        'user_id': user_id,
+        'storage_type': 'telegram',
+        'telegram_message_id': file_info.get('message_id'),
+        'telegram_channel': channel_name or 'Saved Messages',
+        'telegram_channel_id': channel_id,
+        'telegram_date': _telegram_date(file_info.get('date')),
+        'telegram_missing': False,
+        'from_scan': True,
+        'file_metadata': json.dumps({
+            'download_url': file_info.get('download_link') or '',
+            'file_type': file_info.get('file_type') or '',
+            'sender_id': file_info.get('sender_id'),
+            'duration': file_info.get('duration'),
+            'width': file_info.get('width'),
+            'height': file_info.get('height'),
+            'message_text': file_info.get('message_text') or ''
+        }, ensure_ascii=False),
+        'is_deleted': False,
+        'is_favorite': False,
+        'download_count': 0,
+        'current_version': 1,
+        'version_count': 1,
+        'sync_pending': False,
+        'created_at': now,
+        'updated_at': now
+    }
+
+
+def upsert_statement(dialect_name: str):
+    """INSERT ... ON CONFLICT DO UPDATE for File rows (plain INSERT on other databases)"""
+    table = File.__table__
+    if dialect_name not in ('sqlite', 'postgresql'):
+        return table.insert()
+    insert = (postgresql if dialect_name == 'postgresql' else sqlite).insert(table)
+    return insert.on_conflict_do_update(
+        index_elements=[table.c[name] for name in CONFLICT_COLUMNS],
+        index_where=table.c.from_scan == True,
+        set_={name: insert.excluded[name] for name in UPDATE_COLUMNS}
+    )
+
+
+class ScanCatalogWriter:
+    """Buffers a channel's scanned files and upserts them every `batch_size` rows"""
+
+    def __init__(self, user_id: int, folder_id: Optional[int], channel_id: Optional[str],
+                 channel_name: Optional[str], batch_size: Optional[int] = None):
+        self.user_id = user_id
+        self.folder_id = folder_id
+        self.channel_id = channel_id
+        self.channel_name = channel_name
+        self.batch_size = max(1, int(batch_size or config.SCAN_CATALOG_BATCH))
+        self.written = 0
+        self._rows: List[Dict[str, Any]] = []
+        self._statement = None
+
+    def add(self, file_info):
+        """Queue one scanned file (flushes when the batch is full)"""
+        self._rows.append(scanned_file_row(file_info, self.user_id, self.folder_id,
+                                           self.channel_id, self.channel_name))
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """Upsert the buffered rows in one transaction, returns the number written"""
+        if not self._rows:
+            return 0
+        if self._statement is None:
+            self._statement = upsert_statement(db.engine.dialect.name)
+        rows, self._rows = self._rows, []
+        try:
+            db.session.execute(self._statement, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.written += len(rows)
+        return len(rows)
+
+
+class ScanRowWriter(ScanCatalogWriter):
+    """Fallback with scanning.catalog.enabled off: one ORM insert per scanned file, committed
+    every `batch_size` rows. Rows are not upsert targets, so a rescan adds new rows"""
+
+    def __init__(self, user_id: int, folder_id: Optional[int], channel_id: Optional[str],
+                 channel_name: Optional[str], batch_size: Optional[int] = None):
+        super().__init__(user_id, folder_id, channel_id, channel_name, batch_size or ROW_COMMIT_EVERY)
+
+    def flush(self) -> int:
+        if not self._rows:
+            return 0
+        rows, self._rows = self._rows, []
+        try:
+            for row in rows:
+                row['from_scan'] = False
+                db.session.add(File(**row))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.written += len(rows)
+        return len(rows)
+
+
+def scan_file_writer(user_id: int, folder_id: Optional[int], channel_id: Optional[str],
+                     channel_name: Optional[str]) -> ScanCatalogWriter:
+    """Writer for a channel scan's File rows: batched upsert, or per-row inserts when the catalog is off"""
+    writer_class = ScanCatalogWriter if config.SCAN_CATALOG_ENABLED else ScanRowWriter
+    return writer_class(user_id, folder_id, channel_id, channel_name)
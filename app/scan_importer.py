@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Scan Importer
+Imports the files found by a completed ScanSession into the drive by bulk-forwarding
+the channel messages into Saved Messages (100 per RPC, under the central rate limiter)
+and bulk-inserting File rows with the metadata the scanner already extracted
+"""
+
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Callable
+
+from db import db, File, Folder, ScanSession, next_unique_id
+from transfer_scheduler import set_transfer_priority, BULK
+
+FORWARD_BATCH_SIZE = 100
+
+
+def _source_peer(scan_session: ScanSession):
+    """Peer the scanned messages live in"""
+    if (scan_session.channel_name or '').startswith('Saved Messages') or not scan_session.channel_id:
+        return 'me'
+    return int(scan_session.channel_id)
+
+
+def _get_or_create_import_folder(scan_session: ScanSession) -> Folder:
+    """Destination folder named after the channel"""
+    if scan_session.import_folder_id:
+        folder = db.session.get(Folder, scan_session.import_folder_id)
+        if folder and not folder.is_deleted:
+            return folder
+
+    name = "".join(c for c in (scan_session.channel_name or 'Channel') if c.isalnum() or c in (' ', '_', '-')).strip()
+    folder = Folder(name=name or f"Import_{scan_session.id}", user_id=scan_session.user_id, path=name)
+    db.session.add(folder)
+    db.session.flush()
+    scan_session.import_folder_id = folder.id
+    db.session.commit()
+    return folder
+
+
+def _already_imported(folder: Folder) -> set:
+    """Source message IDs already imported into the folder (makes import resumable)"""
+    imported = set()
+    for (metadata,) in File.query.filter_by(folder_id=folder.id, is_deleted=False).with_entities(File.file_metadata):
+        try:
+            source_id = json.loads(metadata or '{}').get('source_message_id')
+        except ValueError:
+            continue
+        if source_id:
+            imported.add(source_id)
+    return imported
+
+
+def _file_mapping(source: File, info: Dict[str, Any], folder: Folder, scan_session: ScanSession) -> Dict[str, Any]:
+    """Row for bulk insert: scanner metadata + new Saved Messages location"""
+    try:
+        metadata = json.loads(source.file_metadata) if source.file_metadata else {}
+    except ValueError:
+        metadata = {}
+    metadata.update(
+        source_channel_id=scan_session.channel_id,
+        source_channel=scan_session.channel_name,
+        source_message_id=source.telegram_message_id,
+        scan_session_id=scan_session.id
+    )
+    now = datetime.now(timezone.utc)
+    return {
+        'unique_id': next_unique_id(),
+        'filename': source.filename,
+        'original_filename': source.original_filename or source.filename,
+        'file_path': None,
+        'file_size': info['file_size'] or source.file_size or 0,
+        'mime_type': source.mime_type or info['mime_type'],
+        'folder_id': folder.id,
+        'user_id': scan_session.user_id,
+        'storage_type': 'telegram',
+        'telegram_message_id': info['message_id'],
+        'telegram_channel': info['channel'],
+        'telegram_channel_id': info['channel_id'],
+        'telegram_file_id': info['file_id'],
+        'telegram_unique_id': info['unique_id'],
+        'telegram_access_hash': info['access_hash'],
+        'telegram_file_reference': info['file_reference'],
+        'file_metadata': json.dumps(metadata, ensure_ascii=False),
+        'description': f"Imported from {scan_session.channel_name}",
+        'is_deleted': False,
+        'is_favorite': False,
+        'download_count': 0,
+        'current_version': 1,
+        'version_count': 1,
+        'created_at': now,
+        'updated_at': now,
+        'telegram_date': source.telegram_date
+    }
+
+
+async def import_scan_session(session_id: int, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Forward all files of a scan session into Saved Messages and create File rows in bulk"""
+    set_transfer_priority(BULK)
+    from telegram_storage import TelegramStorageManager
+
+    scan_session = db.session.get(ScanSession, session_id)
+    folder = _get_or_create_import_folder(scan_session)
+    done = _already_imported(folder)
+
+    sources = [f for f in File.query.filter_by(folder_id=scan_session.folder_id, is_deleted=False)
+               .filter(File.telegram_message_id.isnot(None))
+               .order_by(File.telegram_message_id).all()
+               if f.telegram_message_id not in done]
+
+    scan_session.import_status = 'running'
+    scan_session.imported_files = len(done)
+    db.session.commit()
+
+    result = {'imported': len(done), 'failed': 0, 'total': len(done) + len(sources), 'folder_id': folder.id}
+    storage = TelegramStorageManager()
+    if not await storage.initialize():
+        scan_session.import_status = 'failed'
+        db.session.commit()
+        raise Exception('Telegram client not available')
+
+    try:
+        peer = _source_peer(scan_session)
+        for start in range(0, len(sources), FORWARD_BATCH_SIZE):
+            batch = sources[start:start + FORWARD_BATCH_SIZE]
+            forwarded = await storage.forward_to_saved_messages(peer, [f.telegram_message_id for f in batch])
+
+            mappings = [
+                _file_mapping(source, forwarded[source.telegram_message_id], folder, scan_session)
+                for source in batch if source.telegram_message_id in forwarded
+            ]
+            if mappings:
+                db.session.bulk_insert_mappings(File, mappings)
+
+            result['imported'] += len(mappings)
+            result['failed'] += len(batch) - len(mappings)
+            scan_session.imported_files = result['imported']
+            db.session.commit()
+
+            if progress:
+                progress(dict(result, session_id=session_id, status='running'))
+
+        scan_session.import_status = 'completed'
+        db.session.commit()
+        return result
+    except Exception:
+        db.session.rollback()
+        scan_session.import_status = 'failed'
+        db.session.commit()
+        raise
+    finally:
+        await storage.close()
+
+
+class ScanImportManager:
+    """Runs scan imports in background threads (one per session)"""
+
+    def __init__(self):
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def is_running(self, session_id: int) -> bool:
+        thread = self._threads.get(session_id)
+        return bool(thread and thread.is_alive())
+
+    def start(self, app, session_id: int, progress=None) -> bool:
+        """Start importing a session, False if already running"""
+        with self._lock:
+            if self.is_running(session_id):
+                return False
+
+            def run():
+                with app.app_context():
+                    try:
+                        result = asyncio.run(import_scan_session(session_id, progress))
+                        print(f"[IMPORT] Session {session_id}: {result['imported']}/{result['total']} files imported")
+                        if progress:
+                            progress(dict(result, session_id=session_id, status='completed'))
+                    except Exception as e:
+                        print(f"[IMPORT] Session {session_id} failed: {e}")
+                        if progress:
+                            progress({'session_id': session_id, 'status': 'failed', 'error': str(e)})
+
+            thread = threading.Thread(target=run, daemon=True, name=f'scan-import-{session_id}')
+            self._threads[session_id] = thread
+            thread.start()
+            return True
+
+
+# Global instance
+scan_import_manager = ScanImportManager()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Scan Orchestrator
+Scans many channels concurrently under a parallelism limit. All channels share one
+Telegram client and pace every history page through the central rate limiter; each
+channel tracks its own progress (and incremental watermark) in its own ScanSession
+"""
+
+import asyncio
+import json
+import secrets
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+import config
+from db import db, Folder, ScanSession, ChannelWatermark
+from rate_limiter import telegram_rate_limiter
+from scan_catalog import scan_file_writer
+from media_filters import server_filters, iter_media_messages
+
+HISTORY_PAGE_SIZE = 100  # Messages per GetHistory RPC
+
+
+def incremental_start(user_id: int, channel_id: Optional[str], full_rescan: bool = False
+                      ) -> Tuple[Optional[ChannelWatermark], Optional[Folder], int]:
+    """(watermark, prior folder, min_id) for a channel scan; min_id is 0 for a full scan"""
+    watermark = None
+    if channel_id:
+        watermark = ChannelWatermark.query.filter_by(user_id=user_id, channel_id=channel_id).first()
+    prior_folder = None
+    if watermark and watermark.folder_id and not full_rescan:
+        prior_folder = Folder.query.filter_by(id=watermark.folder_id, is_deleted=False).first()
+    return watermark, prior_folder, (watermark.max_message_id if prior_folder else 0)
+
+
+def advance_watermark(watermark: Optional[ChannelWatermark], scan_session: ScanSession,
+                      folder_id: int, max_message_id: int) -> ChannelWatermark:
+    """Record the highest message ID covered by a completed scan"""
+    if watermark is None:
+        watermark = ChannelWatermark(user_id=scan_session.user_id, channel_id=scan_session.channel_id, max_message_id=0)
+        db.session.add(watermark)
+    watermark.max_message_id = max(watermark.max_message_id or 0, max_message_id)
+    watermark.channel_name = scan_session.channel_name
+    watermark.folder_id = folder_id
+    watermark.last_scan_session_id = scan_session.id
+    watermark.updated_at = datetime.now(timezone.utc)
+    db.session.commit()
+    return watermark
+
+
+def walk_exhausted(processed: int, limit: Optional[int]) -> bool:
+    """Whether a newest-first walk ran down to min_id instead of stopping at the message cap.
+    Only then is everything above the old watermark covered"""
+    return not limit or processed < limit
+
+
+def save_checkpoint(scan_session: ScanSession, channel_input: str, offset_id: int, max_message_id: int,
+                    processed: int, files_found: int, catalog=None, writer=None):
+    """Persist resume state. Catalog rows and output files are flushed first, so a checkpoint
+    never runs ahead of what is on disk"""
+    if catalog is not None:
+        catalog.flush()
+    checkpoint = {
+        'channel_input': channel_input,
+        'offset_id': offset_id,
+        'max_message_id': max_message_id,
+        'messages_scanned': processed,
+        'files_found': files_found
+    }
+    if writer is not None:
+        checkpoint['output'] = dict(writer.positions(), timestamp=writer.timestamp)
+    scan_session.messages_scanned = processed
+    scan_session.files_found = files_found
+    scan_session.checkpoint = json.dumps(checkpoint)
+    scan_session.checkpoint_at = datetime.now(timezone.utc)
+    db.session.commit()
+
+
+def mark_interrupted_scans() -> int:
+    """Sessions left 'running' by a process that died: mark them resumable"""
+    count = ScanSession.query.filter_by(status='running').update(
+        {'status': 'interrupted', 'error_message': 'Process stopped during the scan',
+         'completed_at': datetime.now(timezone.utc)})
+    db.session.commit()
+    if count:
+        print(f"[SCAN] {count} interrupted scan session(s) can be resumed")
+    return count
+
+
+def scan_folder_name(channel_name: Optional[str]) -> str:
+    """Folder name for a new (full) scan of a channel"""
+    safe = "".join(c for c in (channel_name or 'Unknown') if c.isalnum() or c in (' ', '_', '-')).strip()
+    return f"Scan_{safe or 'Unknown'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+
+class ScanBatch:
+    """One orchestrated multi-channel scan"""
+
+    def __init__(self, user_id: int, channels: List[str], full_rescan: bool, concurrency: int):
+        self.id = secrets.token_hex(8)
+        self.user_id = user_id
+        self.channels = channels
+        self.full_rescan = full_rescan
+        self.concurrency = concurrency
+        self.status = 'pending'  # pending, running, completed, failed, cancelled
+        self.cancelled = False
+        self.error = None
+        self.session_ids: Dict[str, int] = {}
+        self.started_at = datetime.now(timezone.utc)
+        self.completed_at = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Batch status with per-channel ScanSession progress"""
+        sessions = {s.id: s for s in ScanSession.query.filter(ScanSession.id.in_(list(self.session_ids.values()))).all()} \
+            if self.session_ids else {}
+        channels = []
+        for channel in self.channels:
+            session = sessions.get(self.session_ids.get(channel))
+            channels.append(dict(session.to_dict(), channel=channel) if session else {'channel': channel, 'status': 'queued'})
+        return {
+            'batch_id': self.id,
+            'status': self.status,
+            'concurrency': self.concurrency,
+            'full_rescan': self.full_rescan,
+            'error': self.error,
+            'files_found': sum(c.get('files_found') or 0 for c in channels),
+            'messages_scanned': sum(c.get('messages_scanned') or 0 for c in channels),
+            'channels': channels,
+            'started_at': self.started_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class ScanOrchestrator:
+    """Runs scan batches in background threads, channels of a batch concurrently"""
+
+    def __init__(self):
+        self._batches: Dict[str, ScanBatch] = {}
+        self._lock = threading.Lock()
+
+    def start(self, app, user_id: int, channels: List[str], full_rescan: bool = False,
+              concurrency: Optional[int] = None) -> ScanBatch:
+        """Start scanning `channels` (deduplicated, order kept), returns the batch"""
+        channels = list(dict.fromkeys(c.strip() for c in channels if c and c.strip()))
+        if not channels:
+            raise ValueError('No channels given')
+        if len(channels) > config.SCAN_MAX_BATCH_CHANNELS:
+            raise ValueError(f'Too many channels (max {config.SCAN_MAX_BATCH_CHANNELS})')
+
+        concurrency = max(1, min(int(concurrency or config.SCAN_CONCURRENCY), len(channels)))
+        batch = ScanBatch(user_id, channels, full_rescan, concurrency)
+        with self._lock:
+            self._batches[batch.id] = batch
+
+        def run():
+            with app.app_context():
+                try:
+                    asyncio.run(self.run_batch(batch))
+                except Exception as e:
+                    batch.status = 'failed'
+                    batch.error = str(e)
+                    print(f"[SCAN] Batch {batch.id} failed: {e}")
+                finally:
+                    batch.completed_at = datetime.now(timezone.utc)
+
+        threading.Thread(target=run, daemon=True, name=f'scan-batch-{batch.id}').start()
+        print(f"[SCAN] Batch {batch.id}: {len(channels)} channels, concurrency {concurrency}")
+        return batch
+
+    def get(self, batch_id: str) -> Optional[ScanBatch]:
+        """Batch by ID (kept in memory for the process lifetime)"""
+        return self._batches.get(batch_id)
+
+    def cancel(self, batch_id: str) -> bool:
+        """Stop a running batch after the current history page of each channel"""
+        batch = self._batches.get(batch_id)
+        if batch is None or batch.status not in ('pending', 'running'):
+            return False
+        batch.cancelled = True
+        return True
+
+    def batches(self) -> List[Dict[str, Any]]:
+        """Summary of known batches"""
+        return [{'batch_id': b.id, 'status': b.status, 'channels': len(b.channels),
+                 'started_at': b.started_at.isoformat()} for b in self._batches.values()]
+
+    async def run_batch(self, batch: ScanBatch):
+        """Scan every channel of the batch with one shared client"""
+        from scanner import TelegramFileScanner
+
+        batch.status = 'running'
+        scanner = TelegramFileScanner()
+        await scanner.initialize()
+        try:
+            semaphore = asyncio.Semaphore(batch.concurrency)
+
+            async def bounded(channel):
+                async with semaphore:
+                    if batch.cancelled:
+                        return
+                    await self.scan_channel(scanner, batch, channel)
+
+            await asyncio.gather(*(bounded(channel) for channel in batch.channels))
+            batch.status = 'cancelled' if batch.cancelled else 'completed'
+        finally:
+            await scanner.close()
+
+    async def scan_channel(self, scanner, batch: ScanBatch, channel_input: str):
+        """Scan one channel into its own ScanSession (incremental when a watermark exists)"""
+        scan_session = ScanSession(channel_name=channel_input, user_id=batch.user_id, status='running')
+        db.session.add(scan_session)
+        db.session.commit()
+        batch.session_ids[channel_input] = scan_session.id
+
+        try:
+            await telegram_rate_limiter.acquire()
+            entity = await scanner.get_channel_entity(channel_input)
+            if not entity:
+                raise ValueError('Could not resolve channel')
+
+            scan_session.channel_id = str(entity.id)
+            if getattr(entity, 'title', None):
+                scan_session.channel_name = entity.title
+            elif getattr(entity, 'first_name', None):
+                scan_session.channel_name = f"Saved Messages ({entity.first_name})"
+
+            watermark, folder, min_id = incremental_start(batch.user_id, scan_session.channel_id, batch.full_rescan)
+            scan_session.scan_mode = 'incremental' if folder else 'full'
+            scan_session.min_message_id = min_id or None
+            if folder is None:
+                folder = Folder(name=scan_folder_name(scan_session.channel_name), user_id=batch.user_id)
+                folder.path = folder.name
+                db.session.add(folder)
+                db.session.flush()
+            scan_session.folder_id = folder.id
+
+            filters = server_filters()
+            await telegram_rate_limiter.acquire()
+            scan_session.total_messages = await scanner.get_message_count(entity, config.MAX_MESSAGES, min_id, filters)
+            db.session.commit()
+
+            catalog = scan_file_writer(batch.user_id, folder.id, scan_session.channel_id, scan_session.channel_name)
+            processed = 0
+            files_found = 0
+            max_seen_id = min_id
+            last_id = 0
+            # Pages are paced by the shared limiter, not Telethon's per-iterator wait_time
+            async for message in iter_media_messages(scanner.client, entity, filters, limit=config.MAX_MESSAGES,
+                                                     min_id=min_id, wait_time=0):
+                if batch.cancelled:
+                    break
+                max_seen_id = max(max_seen_id, message.id)
+                last_id = message.id
+                file_info = scanner.extract_file_info(message)
+                if file_info and scanner.should_include_file_type(file_info['file_type']):
+                    catalog.add(file_info)
+                    files_found += 1
+
+                processed += 1
+                if processed % config.SCAN_CHECKPOINT_EVERY == 0:
+                    save_checkpoint(scan_session, channel_input, last_id, max_seen_id, processed, files_found, catalog)
+                if processed % HISTORY_PAGE_SIZE == 0:
+                    scan_session.messages_scanned = processed
+                    scan_session.files_found = files_found
+                    db.session.commit()
+                    await telegram_rate_limiter.acquire()
+
+            catalog.flush()
+            scan_session.messages_scanned = processed
+            scan_session.files_found = files_found
+            scan_session.status = 'cancelled' if batch.cancelled else 'completed'
+            if not batch.cancelled:
+                scan_session.checkpoint = None
+            scan_session.completed_at = datetime.now(timezone.utc)
+            db.session.commit()
+
+            # A capped walk stopped above older unseen messages: keep the old mark so they are picked up later
+            if not batch.cancelled and walk_exhausted(processed, config.MAX_MESSAGES):
+                advance_watermark(watermark, scan_session, folder.id, max_seen_id)
+            print(f"[SCAN] {scan_session.channel_name}: {processed} messages, {files_found} files ({scan_session.scan_mode})")
+        except Exception as e:
+            print(f"[SCAN] {channel_input} failed: {e}")
+            try:
+                scan_session.status = 'failed'
+                scan_session.error_message = str(e)
+                scan_session.completed_at = datetime.now(timezone.utc)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+
+# Global instance
+scan_orchestrator = ScanOrchestrator()
@@ -0,0 +1,555 @@
+#!/usr/bin/env python3
+"""
+Scan Output
+Streaming sinks for scan results: every extracted file is appended to CSV and JSON Lines
+files as it is found and flushed every SCAN_FLUSH_EVERY records, so memory stays constant
+and a crash keeps everything up to the last flush. The end-of-scan summary comes from
+running counters. The other formats (JSON, simple JSON, write-only Excel, Parquet, Arrow)
+are derived in a single streaming pass over the JSON Lines file that feeds every enabled
+exporter
+"""
+
+import csv
+import json
+import sys
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Iterator, List
+
+import config
+
+# Optional: Parquet/Arrow exports
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+SCAN_FIELDS = [
+    'message_id', 'date', 'file_type', 'file_name', 'file_size', 'mime_type',
+    'duration', 'width', 'height', 'download_link', 'message_text', 'sender_id'
+]
+JSONL_SUFFIX = 'telegram_files.jsonl'
+EXCEL_MAX_ROWS = 1048576  # Excel sheet limit, header included
+COLUMNAR_BATCH_ROWS = 50000  # Rows per Arrow record batch / Parquet row group
+
+
+class ScannedFile:
+    """Compact scan record: slots instead of a dict, interned type/MIME strings, and the
+    date and download link kept as the message datetime plus a shared per-chat prefix.
+    Reads like a dict (`get`, `[]`) and is turned into one only when written out"""
+
+    __slots__ = ('message_id', '_date', 'file_type', 'file_name', 'file_size', '_mime_type',
+                 'duration', 'width', 'height', 'link_prefix', 'message_text', 'sender_id')
+
+    def __init__(self, message_id: int, date: Any = None, message_text: str = '', sender_id: Optional[int] = None):
+        self.message_id = message_id
+        self._date = date
+        self.file_type = None
+        self.file_name = None
+        self.file_size = None
+        self._mime_type = None
+        self.duration = None
+        self.width = None
+        self.height = None
+        self.link_prefix = None
+        self.message_text = message_text
+        self.sender_id = sender_id
+
+    @property
+    def date(self) -> Optional[str]:
+        return self._date.isoformat() if isinstance(self._date, datetime) else self._date
+
+    @property
+    def mime_type(self) -> Optional[str]:
+        return self._mime_type
+
+    @mime_type.setter
+    def mime_type(self, value: Optional[str]):
+        self._mime_type = sys.intern(value) if value else value
+
+    def set_link_prefix(self, prefix: str):
+        """Download link is `prefix + message_id`; the prefix string is shared per chat"""
+        self.link_prefix = sys.intern(prefix)
+
+    @property
+    def download_link(self) -> Optional[str]:
+        return f"{self.link_prefix}{self.message_id}" if self.link_prefix else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in SCAN_FIELDS else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in SCAN_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in SCAN_FIELDS}
+
+
+def as_dict(file_info) -> Dict[str, Any]:
+    """Plain dict for a ScannedFile or dict record"""
+    return file_info.to_dict() if isinstance(file_info, ScannedFile) else file_info
+
+
+def format_size(size_bytes: Optional[float]) -> str:
+    """Format kích thước file"""
+    if size_bytes is None:
+        return "N/A"
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} PB"
+
+
+class ScanStats:
+    """Running counters for the end-of-scan summary"""
+
+    def __init__(self):
+        self.total_files = 0
+        self.total_size = 0
+        self.sized_files = 0
+        self.by_type = Counter()
+
+    def add(self, file_info: Dict[str, Any]):
+        self.total_files += 1
+        self.by_type[file_info.get('file_type')] += 1
+        if file_info.get('file_size') is not None:
+            self.total_size += file_info['file_size']
+            self.sized_files += 1
+
+    @property
+    def average_size(self) -> Optional[float]:
+        return self.total_size / self.sized_files if self.sized_files else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_files': self.total_files,
+            'total_size': self.total_size,
+            'average_size': self.average_size,
+            'by_type': dict(self.by_type.most_common())
+        }
+
+
+class CsvSink:
+    """Appends rows to a CSV file"""
+
+    def __init__(self, path: Path, append: bool = False):
+        self.path = path
+        self._file = open(path, 'a' if append else 'w', newline='', encoding=config.CSV_ENCODING)
+        self._writer = csv.DictWriter(self._file, fieldnames=SCAN_FIELDS, delimiter=config.CSV_DELIMITER,
+                                      extrasaction='ignore')
+        if not append:
+            self._writer.writeheader()
+
+    def write(self, file_info: Dict[str, Any]):
+        self._writer.writerow(file_info)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JsonLinesSink:
+    """Appends one JSON object per line"""
+
+    def __init__(self, path: Path, append: bool = False):
+        self.path = path
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, file_info: Dict[str, Any]):
+        self._file.write(json.dumps(as_dict(file_info), ensure_ascii=False, default=str) + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """Records of a JSON Lines file (a torn last line from a crash is skipped)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class StreamingScanWriter:
+    """CSV + JSON Lines sinks with periodic flush and running counters"""
+
+    def __init__(self, output_dir: Path, timestamp: Optional[str] = None, flush_every: Optional[int] = None):
+        self.output_dir = Path(output_dir)
+        self.timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.flush_every = max(1, int(flush_every or config.SCAN_FLUSH_EVERY))
+        self.stats = ScanStats()
+        self.jsonl_path = self.output_dir / f"{self.timestamp}_{JSONL_SUFFIX}"
+        self.csv_path = self.output_dir / f"{self.timestamp}_{config.CSV_FILENAME}" if config.CSV_ENABLED else None
+        self._sinks = []
+        self._pending = 0
+        self.closed = False
+
+    def _open(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # JSON Lines is always written: derived exports are streamed from it
+        self._sinks.append(JsonLinesSink(self.jsonl_path))
+        if self.csv_path:
+            self._sinks.append(CsvSink(self.csv_path))
+
+    def write(self, file_info: Dict[str, Any]):
+        """Append one file record (sinks open on the first record)"""
+        if not self._sinks:
+            self._open()
+        for sink in self._sinks:
+            sink.write(file_info)
+        self.stats.add(file_info)
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        for sink in self._sinks:
+            sink.flush()
+        self._pending = 0
+
+    def close(self):
+        """Flush and close all sinks (idempotent)"""
+        if self.closed:
+            return
+        self.flush()
+        for sink in self._sinks:
+            sink.close()
+        self.closed = True
+
+    def positions(self) -> Dict[str, int]:
+        """Byte size of each output after a flush (saved in scan checkpoints)"""
+        self.flush()
+        return {
+            'jsonl': self.jsonl_path.stat().st_size if self.jsonl_path.exists() else 0,
+            'csv': self.csv_path.stat().st_size if self.csv_path and self.csv_path.exists() else 0
+        }
+
+    def resume(self, positions: Dict[str, int]):
+        """Continue the outputs of an interrupted scan: cut them back to the checkpoint sizes
+        (records written after it are scanned again) and append; counters are rebuilt"""
+        jsonl_size = positions.get('jsonl') or 0
+        csv_size = positions.get('csv') or 0
+        if not jsonl_size or not self.jsonl_path.exists():
+            return  # Nothing kept: sinks are created on the first record
+        with open(self.jsonl_path, 'r+b') as f:
+            f.truncate(jsonl_size)
+
+        csv_sink = None
+        rebuild_csv = False
+        if self.csv_path:
+            if csv_size and self.csv_path.exists():
+                with open(self.csv_path, 'r+b') as f:
+                    f.truncate(csv_size)
+                csv_sink = CsvSink(self.csv_path, append=True)
+            else:
+                # CSV lost (or not enabled before): rebuild it from the JSON Lines file
+                csv_sink = CsvSink(self.csv_path)
+                rebuild_csv = True
+
+        for file_data in iter_jsonl(self.jsonl_path):
+            self.stats.add(file_data)
+            if rebuild_csv:
+                csv_sink.write(file_data)
+
+        self._sinks.append(JsonLinesSink(self.jsonl_path, append=True))
+        if csv_sink:
+            self._sinks.append(csv_sink)
+
+    def paths(self) -> Dict[str, str]:
+        """Files written so far"""
+        if not self._sinks:
+            return {}
+        return {type(s).__name__.replace('Sink', '').lower(): str(s.path) for s in self._sinks}
+
+
+def _detailed_record(file_data: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON document entry focused on file name and link"""
+    record = {
+        "file_name": file_data.get('file_name'),
+        "download_link": file_data.get('download_link'),
+        "file_info": {
+            "type": file_data.get('file_type'),
+            "size": file_data.get('file_size'),
+            "size_formatted": format_size(file_data['file_size']) if file_data.get('file_size') else "N/A",
+            "mime_type": file_data.get('mime_type'),
+            "upload_date": file_data.get('date')
+        },
+        "message_info": {
+            "message_id": file_data.get('message_id'),
+            "message_text": file_data.get('message_text'),
+            "sender_id": file_data.get('sender_id')
+        }
+    }
+    if file_data.get('duration'):
+        record['file_info']['duration'] = file_data['duration']
+    if file_data.get('width') and file_data.get('height'):
+        record['file_info']['dimensions'] = {"width": file_data['width'], "height": file_data['height']}
+    return record
+
+
+def _simple_record(file_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "file_name": file_data.get('file_name'),
+        "download_link": file_data.get('download_link'),
+        "file_size": format_size(file_data['file_size']) if file_data.get('file_size') else "N/A",
+        "file_type": file_data.get('file_type')
+    }
+
+
+def _scan_info(writer: StreamingScanWriter) -> Dict[str, Any]:
+    return {
+        "timestamp": writer.timestamp,
+        "total_files": writer.stats.total_files,
+        "scan_date": datetime.now().isoformat()
+    }
+
+
+def _json_dumps(obj: Any, indent: int = 0) -> str:
+    """Compact JSON, or indented by `indent` levels when JSON_COMPACT is off"""
+    if config.JSON_COMPACT:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+    text = json.dumps(obj, ensure_ascii=False, indent=config.JSON_INDENT)
+    return text.replace('\n', '\n' + ' ' * (config.JSON_INDENT or 0) * indent)
+
+
+class _JsonStreamExporter(ABC):
+    """JSON array written element by element between a fixed head and tail"""
+
+    def __init__(self, path: Path, head: str, tail: str, depth: int):
+        self.path = path
+        self.tail = tail
+        self.depth = depth
+        self.pad = '' if config.JSON_COMPACT else ' ' * (config.JSON_INDENT or 0)
+        self.newline = '' if config.JSON_COMPACT else '\n'
+        self.count = 0
+        self.file = open(path, 'w', encoding=config.JSON_ENCODING)
+        self.file.write(head.format(pad=self.pad, nl=self.newline))
+
+    @abstractmethod
+    def _record(self, file_data: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON entry for one scanned file"""
+
+    def write(self, file_data: Dict[str, Any]):
+        self.file.write((',' if self.count else '') + self.newline + self.pad * self.depth
+                        + _json_dumps(self._record(file_data), self.depth))
+        self.count += 1
+
+    def close(self) -> str:
+        self.file.write(self.tail.format(pad=self.pad, nl=self.newline))
+        self.file.close()
+        return str(self.path)
+
+    def abort(self):
+        self.file.close()
+
+
+class JsonExporter(_JsonStreamExporter):
+    """Detailed JSON document: scan_info plus one entry per file"""
+
+    def __init__(self, writer: StreamingScanWriter):
+        info = _json_dumps(_scan_info(writer), 1).replace('{', '{{').replace('}', '}}')
+        super().__init__(writer.output_dir / f"{writer.timestamp}_{config.JSON_FILENAME}",
+                         '{{{nl}{pad}"scan_info":' + info + ',{nl}{pad}"files":[', '{nl}{pad}]{nl}}}\n', 2)
+
+    def _record(self, file_data):
+        return _detailed_record(file_data)
+
+
+class SimpleJsonExporter(_JsonStreamExporter):
+    """Simple JSON list (name, link, size, type)"""
+
+    def __init__(self, writer: StreamingScanWriter):
+        super().__init__(writer.output_dir / f"{writer.timestamp}_{config.SIMPLE_JSON_FILENAME}",
+                         '[', '{nl}]\n', 1)
+
+    def _record(self, file_data):
+        return _simple_record(file_data)
+
+
+class ExcelExporter:
+    """Excel in openpyxl write-only mode: rows are streamed to disk, never held as cells"""
+
+    def __init__(self, writer: StreamingScanWriter):
+        from openpyxl import Workbook
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        self.path = writer.output_dir / f"{writer.timestamp}_{config.EXCEL_FILENAME}"
+        self.illegal = ILLEGAL_CHARACTERS_RE
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(title=config.EXCEL_SHEET_NAME[:31])
+        self.sheet.append(SCAN_FIELDS)
+        self.rows = 1
+
+    def write(self, file_data: Dict[str, Any]):
+        if self.rows >= EXCEL_MAX_ROWS:
+            if self.rows == EXCEL_MAX_ROWS:
+                print(f"⚠️ Excel giới hạn {EXCEL_MAX_ROWS:,} dòng, các file còn lại chỉ có trong CSV/JSON")
+                self.rows += 1
+            return
+        self.sheet.append([self.illegal.sub('', v) if isinstance(v, str) else v
+                           for v in (file_data.get(field) for field in SCAN_FIELDS)])
+        self.rows += 1
+
+    def close(self) -> str:
+        self.workbook.save(self.path)
+        return str(self.path)
+
+    def abort(self):
+        pass
+
+
+def arrow_schema():
+    """Arrow schema of the scan columns"""
+    return pa.schema([
+        ('message_id', pa.int64()), ('date', pa.string()), ('file_type', pa.string()),
+        ('file_name', pa.string()), ('file_size', pa.int64()), ('mime_type', pa.string()),
+        ('duration', pa.float64()), ('width', pa.int64()), ('height', pa.int64()),
+        ('download_link', pa.string()), ('message_text', pa.string()), ('sender_id', pa.int64())
+    ])
+
+
+class ColumnarExporter(ABC):
+    """Buffers COLUMNAR_BATCH_ROWS rows and hands each Arrow record batch to `_write_batch`"""
+
+    def __init__(self):
+        self.schema = arrow_schema()
+        self.rows = []
+
+    def write(self, file_data: Dict[str, Any]):
+        self.rows.append({field: file_data.get(field) for field in SCAN_FIELDS})
+        if len(self.rows) >= COLUMNAR_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            self._write_batch(pa.RecordBatch.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    @abstractmethod
+    def _write_batch(self, batch):
+        """Write one Arrow record batch"""
+
+
+class ParquetExporter(ColumnarExporter):
+    """Parquet file written batch by batch (one row group per batch)"""
+
+    def __init__(self, writer: StreamingScanWriter):
+        super().__init__()
+        self.path = writer.output_dir / f"{writer.timestamp}_{config.PARQUET_FILENAME}"
+        self.parquet = pq.ParquetWriter(str(self.path), self.schema, compression='zstd')
+
+    def _write_batch(self, batch):
+        self.parquet.write_batch(batch)
+
+    def close(self) -> str:
+        self._flush()
+        self.parquet.close()
+        return str(self.path)
+
+    def abort(self):
+        self.parquet.close()
+
+
+class ArrowExporter(ColumnarExporter):
+    """Arrow IPC (Feather v2) file written batch by batch"""
+
+    def __init__(self, writer: StreamingScanWriter):
+        super().__init__()
+        self.path = writer.output_dir / f"{writer.timestamp}_{config.ARROW_FILENAME}"
+        self.sink = pa.OSFile(str(self.path), 'wb')
+        self.ipc = pa.ipc.new_file(self.sink, self.schema)
+
+    def _write_batch(self, batch):
+        self.ipc.write_batch(batch)
+
+    def close(self) -> str:
+        self._flush()
+        self.ipc.close()
+        self.sink.close()
+        return str(self.path)
+
+    def abort(self):
+        self.sink.close()
+
+
+EXPORTERS = {
+    'json': JsonExporter,
+    'simple_json': SimpleJsonExporter,
+    'excel': ExcelExporter,
+    'parquet': ParquetExporter,
+    'arrow': ArrowExporter,
+}
+
+
+def enabled_formats() -> List[str]:
+    """Derived export formats switched on in config (CSV/JSON Lines are streamed during the scan)"""
+    flags = {
+        'json': config.JSON_ENABLED,
+        'simple_json': config.SIMPLE_JSON_ENABLED,
+        'excel': config.EXCEL_ENABLED,
+        'parquet': config.PARQUET_ENABLED,
+        'arrow': config.ARROW_ENABLED,
+    }
+    return [name for name, enabled in flags.items() if enabled]
+
+
+def export_results(writer: StreamingScanWriter, formats: Optional[List[str]] = None) -> Dict[str, str]:
+    """Write the chosen formats from the closed writer in one pass over the JSON Lines file
+    (each record is parsed once and handed to every exporter); returns {format: path}
+
+    A format that fails (or needs a missing optional package) is reported and skipped
+    without affecting the others
+    """
+    formats = [f for f in (enabled_formats() if formats is None else formats) if f in EXPORTERS]
+    if not PYARROW_AVAILABLE:
+        for name in [f for f in formats if f in ('parquet', 'arrow')]:
+            print(f"⚠️ Bỏ qua {name}: cần cài pyarrow")
+            formats.remove(name)
+    if not formats:
+        return {}
+
+    writer.close()
+    exporters = {}
+    for name in formats:
+        try:
+            exporters[name] = EXPORTERS[name](writer)
+        except Exception as e:
+            print(f"❌ Lỗi xuất {name}: {e}")
+
+    def drop(name, error):
+        print(f"❌ Lỗi xuất {name}: {error}")
+        try:
+            exporters.pop(name).abort()
+        except Exception:
+            pass
+
+    for file_data in iter_jsonl(writer.jsonl_path):
+        if not exporters:
+            break
+        for name, exporter in list(exporters.items()):
+            try:
+                exporter.write(file_data)
+            except Exception as e:
+                drop(name, e)
+
+    results = {}
+    for name, exporter in list(exporters.items()):
+        try:
+            results[name] = exporter.close()
+        except Exception as e:
+            drop(name, e)
+    return results
@@ -5,13 +5,13 @@ Hỗ trợ cả public và private channel
 """
 
 import asyncio
-import json
-import pandas as pd
+import contextlib
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Optional
 from pathlib import Path
 
 from telethon import TelegramClient
+from telethon.errors import TakeoutInitDelayError
 from telethon.tl.types import (
     MessageMediaDocument, MessageMediaPhoto,
     DocumentAttributeFilename, DocumentAttributeVideo,
@@ -19,9 +19,12 @@ from telethon.tl.types import (
     DocumentAttributeAnimated
 )
 from tqdm.asyncio import tqdm
-import aiofiles
 
 import config
+from telegram_metrics import InstrumentedTelegramClient
+from session_manager import session_manager
+from scan_output import StreamingScanWriter, ScannedFile, export_results, format_size
+from media_filters import server_filters, iter_media_messages, count_media_messages
 
 # Import detailed logging
 try:
@@ -38,7 +41,8 @@ except ImportError:
 class TelegramFileScanner:
     def __init__(self, offline_mode=False):
         self.client = None
-        self.files_data = []
+        self.results = None  # StreamingScanWriter, opened on the first file found
+        self.max_message_id = 0  # Highest message ID seen by the last scan (watermark)
         self.output_dir = Path(config.OUTPUT_DIR)
         self.output_dir.mkdir(exist_ok=True)
         self.offline_mode = offline_mode
@@ -75,74 +79,20 @@ class TelegramFileScanner:
                 log_step("VALIDATION ERROR", error_msg, "ERROR")
             raise ValueError(error_msg)
 
-        # Kiểm tra session file tồn tại - copy sang temp để tránh lock
-        import shutil
-        import tempfile
-        import time
-        import sqlite3
-        
-        project_root = Path(__file__).parent.parent
-        session_import = project_root / "data" / "session_import.session"
-        session_main = project_root / "data" / "session.session"
-        
-        # Tạo thư mục temp cho scanner
-        scanner_temp_dir = project_root / "data" / "scanner_temp"
-        scanner_temp_dir.mkdir(exist_ok=True)
-        scanner_session = scanner_temp_dir / f"scan_{int(time.time())}.session"
-        
-        # Copy session file sang temp folder để tránh lock
-        source_session = None
-        if session_import.exists():
-            source_session = session_import
-            print(f"✅ Found session_import")
-        elif session_main.exists():
-            source_session = session_main
-            print(f"⚠️ Using main session")
-        
-        if source_session:
-            # Dùng sqlite3 backup API để tránh lock
-            max_retries = 3
-            copy_success = False
-            for attempt in range(max_retries):
-                try:
-                    # Kết nối read-only đến source và backup sang dest
-                    src_conn = sqlite3.connect(f"file:{source_session}?mode=ro", uri=True)
-                    dst_conn = sqlite3.connect(str(scanner_session))
-                    with dst_conn:
-                        src_conn.backup(dst_conn)
-                    dst_conn.close()
-                    src_conn.close()
-                    
-                    print(f"✅ Copied session to {scanner_session} (sqlite3 backup)")
-                    copy_success = True
-                    break
-                except Exception as e:
-                    print(f"⚠️ Copy attempt {attempt + 1}/{max_retries} failed: {e}")
-                    if attempt < max_retries - 1:
-                        print(f"⏳ Chờ 2 giây trước khi thử lại...")
-                        time.sleep(2)
-            
-            if not copy_success:
-                print(f"❌ Failed to copy session after {max_retries} attempts.")
-                print(f"⚠️ Using ORIGINAL session file directly as fallback (Risk: Database Locked)")
-                scanner_session = source_session
-                
-        else:
+        # Dùng session chung trong bộ nhớ - không copy file .session
+        session = session_manager.get_session()
+        if session is None:
             raise ValueError("No valid session file found")
-        
-        session_name = str(scanner_session).replace('.session', '')
-        session_path = scanner_session
-        session_exists = session_path.exists()
 
         if DETAILED_LOGGING_AVAILABLE:
-            log_step("SESSION CHECK", f"Session file exists: {session_exists} at {session_path}")
+            log_step("SESSION CHECK", f"Using shared in-memory session ({session_manager.status()['session_file']})")
 
         try:
             if DETAILED_LOGGING_AVAILABLE:
-                log_step("TẠO CLIENT", f"API_ID: {config.API_ID}, Session: {session_name}")
+                log_step("TẠO CLIENT", f"API_ID: {config.API_ID}, Session: in-memory")
 
-            self.client = TelegramClient(
-                session_name,
+            self.client = InstrumentedTelegramClient(
+                session,
                 int(config.API_ID),
                 config.API_HASH,
                 connection_retries=3,
@@ -165,29 +115,26 @@ class TelegramFileScanner:
                     # Wrap connection attempt with timeout
                     async def connect_with_timeout():
                         # Thử kết nối với session có sẵn (chỉ connect, không start)
-                        if session_exists:
-                            try:
-                                if DETAILED_LOGGING_AVAILABLE:
-                                    log_step("SỬ DỤNG SESSION", "Thử kết nối với session có sẵn")
-                                # Chỉ connect, không start (start sẽ yêu cầu đăng nhập mới)
-                                await self.client.connect()
-                                
-                                # Kiểm tra xem đã authorized chưa
-                                if await self.client.is_user_authorized():
-                                    print("✅ Kết nối thành công với session có sẵn!")
-                                    if DETAILED_LOGGING_AVAILABLE:
-                                        log_step("SESSION SUCCESS", "Kết nối thành công với session có sẵn", "SUCCESS")
-                                    return True
-                                else:
-                                    print("⚠️ Session tồn tại nhưng không authorized")
-                                    raise ValueError("Session not authorized - cần đăng nhập lại qua Telegram Desktop")
-                            except Exception as session_error:
-                                print(f"⚠️ Session không hợp lệ: {session_error}")
+                        try:
+                            if DETAILED_LOGGING_AVAILABLE:
+                                log_step("SỬ DỤNG SESSION", "Thử kết nối với session có sẵn")
+                            # Chỉ connect, không start (start sẽ yêu cầu đăng nhập mới)
+                            await self.client.connect()
+                            
+                            # Kiểm tra xem đã authorized chưa
+                            if await self.client.is_user_authorized():
+                                print("✅ Kết nối thành công với session có sẵn!")
                                 if DETAILED_LOGGING_AVAILABLE:
-                                    log_step("SESSION INVALID", f"Session không hợp lệ: {session_error}", "WARNING")
-                                raise ValueError(f"Session không hợp lệ: {session_error}")
-                        else:
-                            raise ValueError("Không tìm thấy session file - cần đăng nhập qua Telegram Desktop")
+                                    log_step("SESSION SUCCESS", "Kết nối thành công với session có sẵn", "SUCCESS")
+                                return True
+                            else:
+                                print("⚠️ Session tồn tại nhưng không authorized")
+                                raise ValueError("Session not authorized - cần đăng nhập lại qua Telegram Desktop")
+                        except Exception as session_error:
+                            print(f"⚠️ Session không hợp lệ: {session_error}")
+                            if DETAILED_LOGGING_AVAILABLE:
+                                log_step("SESSION INVALID", f"Session không hợp lệ: {session_error}", "WARNING")
+                            raise ValueError(f"Session không hợp lệ: {session_error}")
 
                     # Apply timeout to connection attempt
                     await asyncio.wait_for(connect_with_timeout(), timeout=connection_timeout)
@@ -358,91 +305,83 @@ class TelegramFileScanner:
                 log_error(e, f"Channel resolution failed for: {channel_input}")
             return None
             
-    def extract_file_info(self, message) -> Optional[Dict]:
+    def extract_file_info(self, message) -> Optional[ScannedFile]:
         """Trích xuất thông tin file từ message"""
         if not message.media:
             return None
             
-        file_info = {
-            'message_id': message.id,
-            'date': message.date.isoformat(),
-            'file_type': None,
-            'file_name': None,
-            'file_size': None,
-            'mime_type': None,
-            'duration': None,
-            'width': None,
-            'height': None,
-            'download_link': None,
-            'message_text': message.text or '',
-            'sender_id': getattr(message.sender, 'id', None) if message.sender else None
-        }
+        file_info = ScannedFile(
+            message.id,
+            message.date,
+            message.text or '',
+            getattr(message.sender, 'id', None) if message.sender else None
+        )
         
         # Xử lý Document (files, videos, audio, etc.)
         if isinstance(message.media, MessageMediaDocument):
             doc = message.media.document
-            file_info['file_size'] = doc.size
-            file_info['mime_type'] = doc.mime_type
+            file_info.file_size = doc.size
+            file_info.mime_type = doc.mime_type
             
             # Lấy tên file và các thuộc tính
             for attr in doc.attributes:
                 if isinstance(attr, DocumentAttributeFilename):
-                    file_info['file_name'] = attr.file_name
-                    file_info['file_type'] = 'document'
+                    file_info.file_name = attr.file_name
+                    file_info.file_type = 'document'
                 elif isinstance(attr, DocumentAttributeVideo):
-                    file_info['file_type'] = 'video'
-                    file_info['duration'] = attr.duration
-                    file_info['width'] = attr.w
-                    file_info['height'] = attr.h
+                    file_info.file_type = 'video'
+                    file_info.duration = attr.duration
+                    file_info.width = attr.w
+                    file_info.height = attr.h
                 elif isinstance(attr, DocumentAttributeAudio):
-                    file_info['file_type'] = 'audio'
-                    file_info['duration'] = attr.duration
+                    file_info.file_type = 'audio'
+                    file_info.duration = attr.duration
                     if attr.voice:
-                        file_info['file_type'] = 'voice'
+                        file_info.file_type = 'voice'
                 elif isinstance(attr, DocumentAttributeSticker):
-                    file_info['file_type'] = 'sticker'
+                    file_info.file_type = 'sticker'
                 elif isinstance(attr, DocumentAttributeAnimated):
-                    file_info['file_type'] = 'animation'
+                    file_info.file_type = 'animation'
                     
             # Nếu không có tên file, tạo tên mặc định
-            if not file_info['file_name']:
-                ext = self.get_extension_from_mime(file_info['mime_type'])
-                file_info['file_name'] = f"file_{message.id}{ext}"
+            if not file_info.file_name:
+                ext = self.get_extension_from_mime(file_info.mime_type)
+                file_info.file_name = f"file_{message.id}{ext}"
                 
         # Xử lý Photo
         elif isinstance(message.media, MessageMediaPhoto):
             photo = message.media.photo
-            file_info['file_type'] = 'photo'
-            file_info['file_name'] = f"photo_{message.id}.jpg"
+            file_info.file_type = 'photo'
+            file_info.file_name = f"photo_{message.id}.jpg"
             if photo.sizes:
                 largest_size = max(photo.sizes, key=lambda x: getattr(x, 'size', 0))
-                file_info['file_size'] = getattr(largest_size, 'size', None)
-                file_info['width'] = getattr(largest_size, 'w', None)
-                file_info['height'] = getattr(largest_size, 'h', None)
+                file_info.file_size = getattr(largest_size, 'size', None)
+                file_info.width = getattr(largest_size, 'w', None)
+                file_info.height = getattr(largest_size, 'h', None)
                 
         # Tạo download link nếu được yêu cầu
-        if config.GENERATE_DOWNLOAD_LINKS and file_info['file_type']:
+        if config.GENERATE_DOWNLOAD_LINKS and file_info.file_type:
             # Kiểm tra message.chat tồn tại (Saved Messages có thể không có chat context)
             if message.chat is not None:
                 # Tạo link download phù hợp cho cả public và private channel
                 if hasattr(message.chat, 'username') and message.chat.username:
                     # Public channel
-                    file_info['download_link'] = f"https://t.me/{message.chat.username}/{message.id}"
+                    file_info.set_link_prefix(f"https://t.me/{message.chat.username}/")
                 else:
                     # Private channel hoặc group - sử dụng chat_id
                     chat_id = message.chat.id
                     if str(chat_id).startswith('-100'):
                         # Supergroup/Channel
                         clean_id = str(chat_id)[4:]  # Remove -100 prefix
-                        file_info['download_link'] = f"https://t.me/c/{clean_id}/{message.id}"
+                        file_info.set_link_prefix(f"https://t.me/c/{clean_id}/")
                     else:
                         # Fallback (including Saved Messages)
-                        file_info['download_link'] = f"tg://openmessage?chat_id={chat_id}&message_id={message.id}"
+                        file_info.set_link_prefix(f"tg://openmessage?chat_id={chat_id}&message_id=")
             else:
                 # Saved Messages hoặc các trường hợp không có chat
-                file_info['download_link'] = f"tg://openmessage?message_id={message.id}"
+                file_info.set_link_prefix("tg://openmessage?message_id=")
             
-        return file_info if file_info['file_type'] else None
+        return file_info if file_info.file_type else None
         
     def get_extension_from_mime(self, mime_type: str) -> str:
         """Lấy extension từ MIME type"""
@@ -473,8 +412,52 @@ class TelegramFileScanner:
         }
         return type_config.get(file_type, True)
         
-    async def scan_channel(self, channel_input: str):
-        """Quét tất cả file trong kênh"""
+    async def get_message_count(self, entity, limit: Optional[int] = None, min_id: int = 0,
+                                filters: Optional[list] = None) -> int:
+        """Tổng số tin nhắn lấy từ trường count của lời gọi limit=0 (1 RPC, không duyệt lịch sử).
+        Với min_id: cận trên = ID mới nhất - min_id (count của server không lọc theo min_id).
+        Với filters: tổng count của từng bộ lọc (1 RPC mỗi bộ lọc)"""
+        if min_id:
+            latest = await self.client.get_messages(entity, limit=1)
+            total = max(0, latest[0].id - min_id) if latest else 0
+            if filters is not None:
+                total = min(total, await count_media_messages(self.client, entity, filters))
+        elif filters is not None:
+            total = await count_media_messages(self.client, entity, filters)
+        else:
+            history = await self.client.get_messages(entity, limit=0)
+            total = getattr(history, 'total', None) or 0
+        return min(total, limit) if limit else total
+
+    @contextlib.asynccontextmanager
+    async def history_client(self, use_takeout: bool):
+        """Client để duyệt lịch sử: phiên takeout (giới hạn nới lỏng cho xuất hàng loạt) hoặc client thường.
+        Takeout được kết thúc khi thoát (thành công nếu không có lỗi)"""
+        takeout = None
+        if use_takeout:
+            try:
+                takeout = self.client.takeout(finalize=True, users=True, chats=True, megagroups=True, channels=True)
+                await takeout.__aenter__()
+            except TakeoutInitDelayError as e:
+                print(f"⚠️ Takeout cần được xác nhận trong ứng dụng Telegram (thử lại sau {e.seconds}s), quét ở chế độ thường")
+                takeout = None
+        if takeout is None:
+            yield self.client
+            return
+
+        print("📦 Đang dùng phiên takeout")
+        try:
+            yield takeout
+        except BaseException as e:
+            await takeout.__aexit__(type(e), e, e.__traceback__)
+            raise
+        await takeout.__aexit__(None, None, None)
+
+    async def scan_channel(self, channel_input: str, min_id: int = 0, takeout: Optional[bool] = None):
+        """Quét tất cả file trong kênh (chỉ tin nhắn có ID > min_id nếu quét tăng dần).
+        takeout=True (hoặc scanning.takeout.enabled) duyệt lịch sử qua phiên takeout"""
+        use_takeout = config.SCAN_TAKEOUT if takeout is None else takeout
+        self.max_message_id = min_id
         scan_step_id = None
         if DETAILED_LOGGING_AVAILABLE:
             scan_step_id = log_step_start("SCAN_CHANNEL", f"Scanning channel: {channel_input}")
@@ -502,25 +485,20 @@ class TelegramFileScanner:
             if DETAILED_LOGGING_AVAILABLE:
                 log_step("THÔNG TIN KÊNH", f"Tên: {entity.title}, ID: {entity.id}")
 
-            # Step 2: Count total messages
+            # Step 2: Total from the count field of one limit=0 history call (no extra traversal)
             count_step_id = None
             if DETAILED_LOGGING_AVAILABLE:
                 count_step_id = log_step_start("COUNT_MESSAGES", f"Counting messages in {entity.title}")
 
-            print(f"📊 Đang đếm tổng số tin nhắn...")
-            if DETAILED_LOGGING_AVAILABLE:
-                log_step("ĐẾM TIN NHẮN", "Bắt đầu đếm tổng số tin nhắn")
-
-            # Đếm tổng số tin nhắn
-            total_messages = 0
-            async for _ in self.client.iter_messages(entity, limit=config.MAX_MESSAGES):
-                total_messages += 1
+            # Takeout export dùng messages.getHistory (không dùng search filter)
+            filters = None if use_takeout else server_filters()
+            total_messages = await self.get_message_count(entity, config.MAX_MESSAGES, min_id, filters)
 
             print(f"📝 Tổng số tin nhắn: {total_messages:,}")
             if DETAILED_LOGGING_AVAILABLE:
                 log_step_end(count_step_id, "COUNT_MESSAGES", success=True, result=f"{total_messages:,} messages")
                 log_step("TỔNG TIN NHẮN", f"Tìm thấy {total_messages:,} tin nhắn")
-                log_api_call("iter_messages", {"entity": entity.title, "limit": config.MAX_MESSAGES}, f"{total_messages} messages")
+                log_api_call("get_messages", {"entity": entity.title, "limit": 0}, f"{total_messages} messages")
 
             # Step 3: Start file scanning
             scan_files_step_id = None
@@ -538,35 +516,40 @@ class TelegramFileScanner:
             files_filtered = 0
             start_time = datetime.now()
 
-            async for message in self.client.iter_messages(entity, limit=config.MAX_MESSAGES):
-                try:
-                    file_info = self.extract_file_info(message)
-
-                    if file_info:
-                        if self.should_include_file_type(file_info['file_type']):
-                            self.files_data.append(file_info)
-                            files_found += 1
-
-                            if DETAILED_LOGGING_AVAILABLE and files_found % 50 == 0:
-                                log_step("FILE PROGRESS", f"Đã tìm thấy {files_found} file phù hợp từ {processed_count} tin nhắn")
-                                log_performance_metric("files_per_message", files_found/processed_count, "ratio", f"Channel: {entity.title}")
-                        else:
-                            files_filtered += 1
-                            if DETAILED_LOGGING_AVAILABLE and files_filtered % 100 == 0:
-                                log_step("FILTER INFO", f"Đã lọc bỏ {files_filtered} file không phù hợp")
-
-                    processed_count += 1
-                    progress_bar.update(1)
-
-                    # Log performance every 1000 messages
-                    if DETAILED_LOGGING_AVAILABLE and processed_count % 1000 == 0:
-                        elapsed = (datetime.now() - start_time).total_seconds()
-                        log_performance_metric("message_processing_rate", processed_count/elapsed, "msg/sec", f"Channel: {entity.title}")
-
-                except Exception as e:
-                    if DETAILED_LOGGING_AVAILABLE:
-                        log_error(e, f"Error processing message {message.id}")
-                    continue
+            # Chế độ thường: chỉ tin nhắn media đi qua mạng (bộ lọc phía server).
+            # Takeout: toàn bộ lịch sử, không sleep giữa các trang (wait_time=0)
+            async with self.history_client(use_takeout) as history:
+                async for message in iter_media_messages(history, entity, filters, limit=config.MAX_MESSAGES, min_id=min_id,
+                                                         **({'wait_time': 0} if history is not self.client else {})):
+                    self.max_message_id = max(self.max_message_id, message.id)
+                    try:
+                        file_info = self.extract_file_info(message)
+
+                        if file_info:
+                            if self.should_include_file_type(file_info['file_type']):
+                                self.record_file(file_info)
+                                files_found += 1
+
+                                if DETAILED_LOGGING_AVAILABLE and files_found % 50 == 0:
+                                    log_step("FILE PROGRESS", f"Đã tìm thấy {files_found} file phù hợp từ {processed_count} tin nhắn")
+                                    log_performance_metric("files_per_message", files_found/processed_count, "ratio", f"Channel: {entity.title}")
+                            else:
+                                files_filtered += 1
+                                if DETAILED_LOGGING_AVAILABLE and files_filtered % 100 == 0:
+                                    log_step("FILTER INFO", f"Đã lọc bỏ {files_filtered} file không phù hợp")
+
+                        processed_count += 1
+                        progress_bar.update(1)
+
+                        # Log performance every 1000 messages
+                        if DETAILED_LOGGING_AVAILABLE and processed_count % 1000 == 0:
+                            elapsed = (datetime.now() - start_time).total_seconds()
+                            log_performance_metric("message_processing_rate", processed_count/elapsed, "msg/sec", f"Channel: {entity.title}")
+
+                    except Exception as e:
+                        if DETAILED_LOGGING_AVAILABLE:
+                            log_error(e, f"Error processing message {message.id}")
+                        continue
 
             progress_bar.close()
 
@@ -577,13 +560,13 @@ class TelegramFileScanner:
                 log_performance_metric("final_processing_rate", processed_count/total_time, "msg/sec", f"Channel: {entity.title}")
                 log_step("SCAN STATISTICS", f"Processed: {processed_count}, Found: {files_found}, Filtered: {files_filtered}")
 
-            print(f"✅ Hoàn thành! Tìm thấy {len(self.files_data)} file")
+            print(f"✅ Hoàn thành! Tìm thấy {self.files_found} file")
             if DETAILED_LOGGING_AVAILABLE:
                 log_step_end(scan_files_step_id, "SCAN_FILES", success=True,
                            result=f"Found {files_found} files, filtered {files_filtered}")
                 log_step_end(scan_step_id, "SCAN_CHANNEL", success=True,
-                           result=f"Scanned {processed_count:,} messages, found {len(self.files_data)} files")
-                log_step("HOÀN THÀNH QUÉT", f"Đã quét {processed_count:,} tin nhắn, tìm thấy {len(self.files_data)} file")
+                           result=f"Scanned {processed_count:,} messages, found {self.files_found} files")
+                log_step("HOÀN THÀNH QUÉT", f"Đã quét {processed_count:,} tin nhắn, tìm thấy {self.files_found} file")
 
         except Exception as e:
             if DETAILED_LOGGING_AVAILABLE:
@@ -598,143 +581,74 @@ class TelegramFileScanner:
                     log_step_end(scan_step_id, "SCAN_CHANNEL", success=False, error=str(e))
             raise
         
+    def record_file(self, file_info: ScannedFile):
+        """Ghi file tìm được vào các sink CSV/JSON Lines (flush định kỳ, bộ nhớ không đổi)"""
+        if self.results is None:
+            self.results = StreamingScanWriter(self.output_dir)
+        self.results.write(file_info)
+
+    @property
+    def files_found(self) -> int:
+        """Số file đã ghi (bộ đếm chạy)"""
+        return self.results.stats.total_files if self.results else 0
+
     async def save_results(self):
-        """Lưu kết quả ra các file"""
+        """Đóng các sink đã ghi trong lúc quét và tạo các file xuất còn lại"""
         if DETAILED_LOGGING_AVAILABLE:
-            log_step("BẮT ĐẦU LƯU KẾT QUẢ", f"Có {len(self.files_data)} file để lưu")
+            log_step("BẮT ĐẦU LƯU KẾT QUẢ", f"Có {self.files_found} file để lưu")
 
-        if not self.files_data:
+        if not self.files_found:
             print("⚠️ Không có dữ liệu để lưu")
             if DETAILED_LOGGING_AVAILABLE:
                 log_step("KHÔNG CÓ DỮ LIỆU", "Không có file nào để lưu", "WARNING")
             return
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        if DETAILED_LOGGING_AVAILABLE:
-            log_step("CHUẨN BỊ LƯU", f"Timestamp: {timestamp}")
-
-        # Lưu CSV
-        csv_path = self.output_dir / f"{timestamp}_{config.CSV_FILENAME}"
-        df = pd.DataFrame(self.files_data)
-        df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-        print(f"💾 Đã lưu CSV: {csv_path}")
-        if DETAILED_LOGGING_AVAILABLE:
-            log_file_operation("SAVE", str(csv_path), f"CSV với {len(self.files_data)} records")
-
-        # Lưu Excel
-        excel_path = self.output_dir / f"{timestamp}_{config.EXCEL_FILENAME}"
-        df.to_excel(excel_path, index=False, engine='openpyxl')
-        print(f"💾 Đã lưu Excel: {excel_path}")
-        if DETAILED_LOGGING_AVAILABLE:
-            log_file_operation("SAVE", str(excel_path), f"Excel với {len(self.files_data)} records")
-
-        # Tạo JSON với format tối ưu cho file và link
-        json_data = {
-            "scan_info": {
-                "timestamp": timestamp,
-                "total_files": len(self.files_data),
-                "scan_date": datetime.now().isoformat()
-            },
-            "files": []
-        }
+        self.results.close()
+        for kind, path in self.results.paths().items():
+            print(f"💾 Đã lưu {kind}: {path}")
+            if DETAILED_LOGGING_AVAILABLE:
+                log_file_operation("SAVE", path, f"{kind} với {self.files_found} records")
 
-        # Format lại data cho JSON với focus vào tên file và link
-        for file_data in self.files_data:
-            json_file = {
-                "file_name": file_data['file_name'],
-                "download_link": file_data['download_link'],
-                "file_info": {
-                    "type": file_data['file_type'],
-                    "size": file_data['file_size'],
-                    "size_formatted": self.format_size(file_data['file_size']) if file_data['file_size'] else "N/A",
-                    "mime_type": file_data['mime_type'],
-                    "upload_date": file_data['date']
-                },
-                "message_info": {
-                    "message_id": file_data['message_id'],
-                    "message_text": file_data['message_text'],
-                    "sender_id": file_data['sender_id']
-                }
-            }
-
-            # Thêm thông tin media nếu có
-            if file_data['duration']:
-                json_file['file_info']['duration'] = file_data['duration']
-            if file_data['width'] and file_data['height']:
-                json_file['file_info']['dimensions'] = {
-                    "width": file_data['width'],
-                    "height": file_data['height']
-                }
-
-            json_data["files"].append(json_file)
-
-        # Lưu JSON
-        json_path = self.output_dir / f"{timestamp}_{config.JSON_FILENAME}"
-        async with aiofiles.open(json_path, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(json_data, ensure_ascii=False, indent=2))
-        print(f"💾 Đã lưu JSON: {json_path}")
-        if DETAILED_LOGGING_AVAILABLE:
-            log_file_operation("SAVE", str(json_path), f"JSON chi tiết với {len(self.files_data)} files")
-
-        # Lưu JSON đơn giản chỉ tên file và link
-        simple_json_data = [
-            {
-                "file_name": file_data['file_name'],
-                "download_link": file_data['download_link'],
-                "file_size": self.format_size(file_data['file_size']) if file_data['file_size'] else "N/A",
-                "file_type": file_data['file_type']
-            }
-            for file_data in self.files_data
-        ]
-
-        simple_json_path = self.output_dir / f"{timestamp}_simple_files.json"
-        async with aiofiles.open(simple_json_path, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(simple_json_data, ensure_ascii=False, indent=2))
-        print(f"💾 Đã lưu JSON đơn giản: {simple_json_path}")
-        if DETAILED_LOGGING_AVAILABLE:
-            log_file_operation("SAVE", str(simple_json_path), f"JSON đơn giản với {len(self.files_data)} files")
+        # Các định dạng còn lại được dựng từ file JSON Lines, song song
+        for kind, path in export_results(self.results).items():
+            print(f"💾 Đã lưu {kind}: {path}")
+            if DETAILED_LOGGING_AVAILABLE:
+                log_file_operation("SAVE", path, f"{kind} với {self.files_found} files")
 
         # Thống kê
         self.print_statistics()
 
         if DETAILED_LOGGING_AVAILABLE:
-            log_step("HOÀN THÀNH LƯU KẾT QUẢ", f"Đã lưu thành công {len(self.files_data)} files vào 4 định dạng")
-        
+            log_step("HOÀN THÀNH LƯU KẾT QUẢ", f"Đã lưu thành công {self.files_found} files")
+
     def print_statistics(self):
-        """In thống kê"""
-        if not self.files_data:
+        """In thống kê (từ bộ đếm chạy, không dựng DataFrame)"""
+        if not self.files_found:
             return
-            
-        df = pd.DataFrame(self.files_data)
-        
+
+        stats = self.results.stats
         print("\n📊 THỐNG KÊ:")
-        print(f"Tổng số file: {len(self.files_data):,}")
-        
+        print(f"Tổng số file: {stats.total_files:,}")
+
         # Thống kê theo loại file
-        type_counts = df['file_type'].value_counts()
         print("\nPhân loại theo type:")
-        for file_type, count in type_counts.items():
+        for file_type, count in stats.by_type.most_common():
             print(f"  {file_type}: {count:,}")
-            
+
         # Thống kê kích thước
-        total_size = df['file_size'].sum()
-        if total_size > 0:
-            print(f"\nTổng kích thước: {self.format_size(total_size)}")
-            print(f"Kích thước trung bình: {self.format_size(df['file_size'].mean())}")
-            
+        if stats.total_size > 0:
+            print(f"\nTổng kích thước: {self.format_size(stats.total_size)}")
+            print(f"Kích thước trung bình: {self.format_size(stats.average_size)}")
+
     def format_size(self, size_bytes: float) -> str:
         """Format kích thước file"""
-        if pd.isna(size_bytes):
-            return "N/A"
-            
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} PB"
-        
+        return format_size(size_bytes)
+
     async def close(self):
         """Đóng kết nối với proper cleanup"""
+        if self.results:
+            # Keep everything streamed so far even if the scan died
+            self.results.close()
         if self.client:
             try:
                 # Check if client is connected before trying to disconnect
@@ -744,6 +658,7 @@ class TelegramFileScanner:
 
                     # Disconnect with timeout
                     await asyncio.wait_for(self.client.disconnect(), timeout=10.0)
+                    session_manager.release(self.client.session)
                     if DETAILED_LOGGING_AVAILABLE:
                         log_step("CLIENT DISCONNECT", "Successfully disconnected Telegram client")
                 else:
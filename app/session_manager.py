@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Session Manager
+Loads the authorized Telethon session (data/session.session) into memory once and
+hands out MemorySession clones to the storage, scanner and auth clients, so the hot
+path never copies .session files. Entities and update state learned by those clients
+are merged back and periodically written to the session file
+"""
+
+import atexit
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession
+from telethon.tl.types.updates import State
+
+import config
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+SESSION_FILES = [DATA_DIR / 'session_import.session', DATA_DIR / 'session.session']
+
+# Per-operation session copies made before sessions were shared in memory
+LEGACY_TEMP_DIRS = [DATA_DIR / 'storage_temp', DATA_DIR / 'scanner_temp']
+
+
+def find_session_file() -> Optional[Path]:
+    """Session file to use, same priority as before (import first)"""
+    for path in SESSION_FILES:
+        if path.exists():
+            return path
+    return None
+
+
+class SessionManager:
+    """Process-wide in-memory copy of the authorized session"""
+
+    def __init__(self, writeback_interval: int):
+        self.writeback_interval = writeback_interval
+        self._lock = threading.Lock()
+        self._path = None
+        self._mtime = None
+        self._auth = None  # (dc_id, server_address, port, auth_key bytes, takeout_id)
+        self._entities = {}  # id -> (id, hash, username, phone, name)
+        self._update_states = {}  # entity id -> State
+        self._dirty = False
+        self._writer = None
+        self._stop = threading.Event()
+        self.stats = {'loads': 0, 'clones': 0, 'writebacks': 0, 'last_writeback': None}
+
+    def _load_locked(self, path: Path):
+        """Read auth key, entities and update state from the session file (read-only)"""
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+        try:
+            row = conn.execute('select dc_id, server_address, port, auth_key, takeout_id from sessions').fetchone()
+            if not row or not row[3]:
+                raise ValueError(f"Session file has no auth key: {path}")
+            entities = conn.execute('select id, hash, username, phone, name from entities').fetchall()
+            states = conn.execute('select id, pts, qts, date, seq from update_state').fetchall()
+        finally:
+            conn.close()
+
+        self._auth = row
+        self._entities = {e[0]: tuple(e) for e in entities}
+        self._update_states = {
+            s[0]: State(pts=s[1], qts=s[2], date=datetime.fromtimestamp(s[3], tz=timezone.utc), seq=s[4], unread_count=0)
+            for s in states
+        }
+        self._path = path
+        self._mtime = path.stat().st_mtime
+        self._dirty = False
+        self.stats['loads'] += 1
+        print(f"[SESSION] Loaded {path.name} into memory ({len(self._entities)} entities)")
+
+    def _ensure_loaded_locked(self) -> bool:
+        path = find_session_file()
+        if path is None:
+            self._auth = None
+            self._path = None
+            return False
+        # Re-read after login/logout replaced the file
+        if self._auth is None or path != self._path or path.stat().st_mtime != self._mtime:
+            self._load_locked(path)
+        return True
+
+    def get_session(self) -> Optional[MemorySession]:
+        """Fresh MemorySession with the shared auth key and entity cache, None without a session file"""
+        with self._lock:
+            if not self._ensure_loaded_locked():
+                return None
+            dc_id, server_address, port, auth_key, takeout_id = self._auth
+            session = MemorySession()
+            session.set_dc(dc_id, server_address, port)
+            session.auth_key = AuthKey(data=auth_key)
+            session.takeout_id = takeout_id
+            session._entities = set(self._entities.values())
+            for entity_id, state in self._update_states.items():
+                session.set_update_state(entity_id, state)
+            self.stats['clones'] += 1
+        self._start_writer()
+        return session
+
+    def release(self, session):
+        """Merge what a client learned (entities, update state) back into the shared copy"""
+        if not isinstance(session, MemorySession):
+            return
+        with self._lock:
+            if self._auth is None:
+                return
+            for row in session._entities:
+                if self._entities.get(row[0]) != tuple(row):
+                    self._entities[row[0]] = tuple(row)
+                    self._dirty = True
+            for entity_id, state in session.get_update_states():
+                if self._update_states.get(entity_id) != state:
+                    self._update_states[entity_id] = state
+                    self._dirty = True
+
+    def write_back(self) -> bool:
+        """Persist merged entities/update state into the session file"""
+        with self._lock:
+            if not self._dirty or self._path is None or not self._path.exists():
+                return False
+            # The file changed under us (new login): drop our state rather than mix accounts
+            if self._path.stat().st_mtime != self._mtime:
+                self._auth = None
+                return False
+            entities = list(self._entities.values())
+            states = [(i, s.pts, s.qts, int(s.date.timestamp()), s.seq) for i, s in self._update_states.items()]
+            now = int(datetime.now(timezone.utc).timestamp())
+
+            conn = sqlite3.connect(str(self._path), timeout=5)
+            try:
+                with conn:
+                    conn.executemany('insert or replace into entities values (?,?,?,?,?,?)', [e + (now,) for e in entities])
+                    conn.executemany('insert or replace into update_state values (?,?,?,?,?)', states)
+            finally:
+                conn.close()
+            self._mtime = self._path.stat().st_mtime
+            self._dirty = False
+            self.stats['writebacks'] += 1
+            self.stats['last_writeback'] = datetime.now(timezone.utc).isoformat()
+            return True
+
+    def _start_writer(self):
+        if self._writer and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, daemon=True, name='session-writeback')
+            self._writer.start()
+
+    def _run_writer(self):
+        while not self._stop.wait(self.writeback_interval):
+            try:
+                self.write_back()
+            except Exception as e:
+                print(f"[SESSION] Write-back failed: {e}")
+
+    def shutdown(self):
+        """Final write-back on exit"""
+        self._stop.set()
+        try:
+            self.write_back()
+        except Exception as e:
+            print(f"[SESSION] Final write-back failed: {e}")
+
+    def cleanup_legacy_temp_sessions(self) -> int:
+        """Remove leftover per-operation session copies"""
+        removed = 0
+        for temp_dir in LEGACY_TEMP_DIRS:
+            if temp_dir.exists():
+                removed += len(os.listdir(temp_dir))
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        if removed:
+            print(f"[SESSION] Removed {removed} legacy temp session files")
+        return removed
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, loaded=self._auth is not None, dirty=self._dirty,
+                        session_file=self._path.name if self._path else None, entities=len(self._entities))
+
+
+# Global instance
+session_manager = SessionManager(config.SESSION_WRITEBACK_INTERVAL)
+atexit.register(session_manager.shutdown)
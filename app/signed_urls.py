@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Signed Media URLs
+Short-lived, file-scoped media URLs: the token carries everything the media handler
+needs (file id, name, mime type, storage location, expiry) under an HMAC, so serving
+a media request (each video seek included) needs no login session and no File query
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Dict, Any, Optional
+
+import config
+from db import File
+from pack_storage import pack_storage
+
+
+class SignedUrlError(Exception):
+    """Malformed, tampered or expired media token"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class MediaUrlSigner:
+    """HMAC-SHA256 signed media tokens"""
+
+    def __init__(self, secret: Optional[str] = None):
+        self._key = secret.encode('utf-8') if secret else None
+
+    def init_app(self, app):
+        """Use MEDIA_URL_SECRET, else a key derived from the Flask secret key"""
+        if config.MEDIA_URL_SECRET:
+            self._key = config.MEDIA_URL_SECRET.encode('utf-8')
+        else:
+            self._key = hmac.new(str(app.secret_key).encode('utf-8'), b'teledrive-media-url', hashlib.sha256).digest()
+
+    def _signature(self, payload: str) -> str:
+        if not self._key:
+            raise SignedUrlError('Media URL signer not initialized')
+        return _b64encode(hmac.new(self._key, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def sign(self, claims: Dict[str, Any], ttl: Optional[int] = None) -> str:
+        """Token for `claims`, valid for `ttl` seconds (capped at MEDIA_URL_MAX_TTL)"""
+        ttl = min(int(ttl or config.MEDIA_URL_TTL), config.MEDIA_URL_MAX_TTL)
+        claims = dict(claims, e=int(time.time()) + ttl)
+        payload = _b64encode(json.dumps(claims, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+        return f"{payload}.{self._signature(payload)}"
+
+    def verify(self, token: str, now: Optional[float] = None) -> Dict[str, Any]:
+        """Claims of a valid token, raises SignedUrlError otherwise"""
+        payload, _, signature = (token or '').partition('.')
+        if not payload or not signature:
+            raise SignedUrlError('Malformed media token')
+        if not hmac.compare_digest(signature, self._signature(payload)):
+            raise SignedUrlError('Invalid media token signature')
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            raise SignedUrlError('Malformed media token')
+        if claims.get('e', 0) < (now if now is not None else time.time()):
+            raise SignedUrlError('Media token expired')
+        return claims
+
+    @staticmethod
+    def claims_for(file_record: File) -> Dict[str, Any]:
+        """Claims describing where a file's bytes live (packed files: pack, range and the
+        pack's message, None while the pack is still open)"""
+        claims = {
+            'i': file_record.id,
+            'n': file_record.filename,
+            'm': file_record.mime_type,
+            's': file_record.storage_type
+        }
+        if file_record.is_stored_on_telegram():
+            claims.update(c=file_record.telegram_channel, ci=file_record.telegram_channel_id,
+                          mi=file_record.telegram_message_id)
+            if file_record.has_replica():
+                claims.update(rc=file_record.replica_channel_id, rm=file_record.replica_message_id)
+        elif file_record.is_packed():
+            claims.update(pk=file_record.pack_id, po=file_record.pack_offset, pl=file_record.pack_length,
+                          pm=pack_storage.pack_message_id(file_record.pack_id))
+        return claims
+
+    @staticmethod
+    def record_from_claims(claims: Dict[str, Any]) -> File:
+        """Transient (never added to the session) File carrying the signed location"""
+        return File(
+            id=claims['i'],
+            filename=claims['n'],
+            mime_type=claims.get('m'),
+            storage_type=claims.get('s'),
+            telegram_channel=claims.get('c'),
+            telegram_channel_id=claims.get('ci'),
+            telegram_message_id=claims.get('mi'),
+            replica_channel_id=claims.get('rc'),
+            replica_message_id=claims.get('rm'),
+            pack_id=claims.get('pk'),
+            pack_offset=claims.get('po'),
+            pack_length=claims.get('pl')
+        )
+
+
+# Global instance
+media_url_signer = MediaUrlSigner()
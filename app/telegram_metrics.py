@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Telegram Metrics
+Per-RPC instrumentation for every Telethon client TeleDrive creates: call counts,
+latency histograms, bytes in/out, FloodWait seconds and error types per method and
+DC, plus timings of non-RPC phases (connect, DB commits). Exposed as JSON or
+Prometheus text
+"""
+
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple
+
+from telethon import TelegramClient, utils
+from telethon.errors import FloodWaitError
+
+# Latency histogram upper bounds in seconds (Prometheus style, +Inf implied)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def method_name(request) -> str:
+    """'upload.GetFile' style name of a Telethon request (first one for batches)"""
+    if utils.is_list_like(request):
+        request = request[0] if request else None
+    cls = type(request)
+    module = cls.__module__.rsplit('.', 1)[-1]
+    name = cls.__name__[:-len('Request')] if cls.__name__.endswith('Request') else cls.__name__
+    return name if module == 'functions' else f"{module}.{name}"
+
+
+def _payload_size(obj) -> int:
+    """File bytes carried by a request/response (upload parts, getFile results)"""
+    data = getattr(obj, 'bytes', None)
+    return len(data) if isinstance(data, (bytes, bytearray)) else 0
+
+
+class _Series:
+    __slots__ = ('calls', 'errors', 'buckets', 'latency_sum', 'bytes_in', 'bytes_out', 'flood_waits', 'flood_wait_seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = defaultdict(int)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0
+
+    def observe(self, seconds: float):
+        self.calls += 1
+        self.latency_sum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative, running = {}, 0
+        for bound, count in zip(list(LATENCY_BUCKETS) + ['+Inf'], self.buckets):
+            running += count
+            cumulative[str(bound)] = running
+        return {
+            'calls': self.calls,
+            'latency_sum': round(self.latency_sum, 6),
+            'latency_avg': round(self.latency_sum / self.calls, 6) if self.calls else 0,
+            'latency_buckets': cumulative,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'flood_waits': self.flood_waits,
+            'flood_wait_seconds': self.flood_wait_seconds,
+            'errors': dict(self.errors)
+        }
+
+
+class TelegramMetrics:
+    """Thread-safe registry keyed by (kind, name, dc)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str, str], _Series] = {}
+        self.started_at = time.time()
+
+    def _get(self, kind: str, name: str, dc) -> _Series:
+        key = (kind, name, str(dc) if dc is not None else '')
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        return series
+
+    def record_rpc(self, name: str, dc, seconds: float, bytes_in: int = 0, bytes_out: int = 0, error: str = None):
+        with self._lock:
+            series = self._get('rpc', name, dc)
+            series.observe(seconds)
+            series.bytes_in += bytes_in
+            series.bytes_out += bytes_out
+            if error:
+                series.errors[error] += 1
+
+    def record_flood_wait(self, name: str, dc, seconds: int):
+        with self._lock:
+            series = self._get('rpc', name, dc)
+            series.flood_waits += 1
+            series.flood_wait_seconds += seconds
+
+    def record_phase(self, name: str, seconds: float, error: str = None):
+        with self._lock:
+            series = self._get('phase', name, None)
+            series.observe(seconds)
+            if error:
+                series.errors[error] += 1
+
+    @contextmanager
+    def track(self, phase: str):
+        """with telegram_metrics.track('db.commit'): ... times a non-RPC phase"""
+        start = time.monotonic()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record_phase(phase, time.monotonic() - start, error)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            rpc, phases = [], []
+            for (kind, name, dc), series in sorted(self._series.items()):
+                entry = dict(series.to_dict(), name=name)
+                if kind == 'rpc':
+                    rpc.append(dict(entry, dc=dc))
+                else:
+                    phases.append(entry)
+            return {'since': self.started_at, 'rpc': rpc, 'phases': phases}
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        def labels(**kv):
+            return '{' + ','.join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in kv.items()) + '}'
+
+        lines = []
+        families = [
+            ('teledrive_telegram_rpc_calls_total', 'counter', 'Telegram RPC calls'),
+            ('teledrive_telegram_rpc_duration_seconds', 'histogram', 'Telegram RPC latency'),
+            ('teledrive_telegram_rpc_bytes_total', 'counter', 'File bytes transferred by RPCs'),
+            ('teledrive_telegram_flood_wait_seconds_total', 'counter', 'FloodWait seconds imposed by Telegram'),
+            ('teledrive_telegram_rpc_errors_total', 'counter', 'Telegram RPC errors by type'),
+            ('teledrive_telegram_phase_duration_seconds', 'histogram', 'Non-RPC phases (connect, DB commit)'),
+        ]
+        samples = defaultdict(list)
+        with self._lock:
+            for (kind, name, dc), s in sorted(self._series.items()):
+                if kind == 'rpc':
+                    base = dict(method=name, dc=dc)
+                    samples['teledrive_telegram_rpc_calls_total'].append(f"teledrive_telegram_rpc_calls_total{labels(**base)} {s.calls}")
+                    hist, extra = 'teledrive_telegram_rpc_duration_seconds', base
+                    samples['teledrive_telegram_rpc_bytes_total'].append(
+                        f"teledrive_telegram_rpc_bytes_total{labels(**base, direction='in')} {s.bytes_in}")
+                    samples['teledrive_telegram_rpc_bytes_total'].append(
+                        f"teledrive_telegram_rpc_bytes_total{labels(**base, direction='out')} {s.bytes_out}")
+                    samples['teledrive_telegram_flood_wait_seconds_total'].append(
+                        f"teledrive_telegram_flood_wait_seconds_total{labels(**base)} {s.flood_wait_seconds}")
+                    for error, count in s.errors.items():
+                        samples['teledrive_telegram_rpc_errors_total'].append(
+                            f"teledrive_telegram_rpc_errors_total{labels(**base, error=error)} {count}")
+                else:
+                    hist, extra = 'teledrive_telegram_phase_duration_seconds', dict(phase=name)
+
+                running = 0
+                for bound, count in zip(list(LATENCY_BUCKETS) + ['+Inf'], s.buckets):
+                    running += count
+                    samples[hist].append(f"{hist}_bucket{labels(**extra, le=bound)} {running}")
+                samples[hist].append(f"{hist}_sum{labels(**extra)} {s.latency_sum:.6f}")
+                samples[hist].append(f"{hist}_count{labels(**extra)} {s.calls}")
+
+        for family, kind, help_text in families:
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            lines.extend(samples.get(family, []))
+        return '\n'.join(lines) + '\n'
+
+
+# Global instance
+telegram_metrics = TelegramMetrics()
+
+
+class InstrumentedTelegramClient(TelegramClient):
+    """TelegramClient that records every RPC (main and exported DC senders) in telegram_metrics"""
+
+    async def connect(self):
+        with telegram_metrics.track('connect'):
+            return await super().connect()
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        if flood_sleep_threshold is None:
+            flood_sleep_threshold = self.flood_sleep_threshold
+        name = method_name(request)
+        connection = getattr(sender, '_connection', None)
+        dc = getattr(connection, '_dc_id', None) or (self.session.dc_id if self.session else None)
+        bytes_out = sum(_payload_size(r) for r in request) if utils.is_list_like(request) else _payload_size(request)
+
+        while True:
+            start = time.monotonic()
+            try:
+                # Telethon sleeps through short FloodWaits internally, invisibly; take them here instead
+                result = await super()._call(sender, request, ordered=ordered, flood_sleep_threshold=0)
+            except FloodWaitError as e:
+                telegram_metrics.record_rpc(name, dc, time.monotonic() - start, bytes_out=bytes_out, error='FloodWaitError')
+                telegram_metrics.record_flood_wait(name, dc, e.seconds)
+                if e.seconds > flood_sleep_threshold:
+                    raise
+                await asyncio.sleep(e.seconds)
+                continue
+            except Exception as e:
+                telegram_metrics.record_rpc(name, dc, time.monotonic() - start, bytes_out=bytes_out, error=type(e).__name__)
+                raise
+
+            bytes_in = sum(_payload_size(r) for r in result) if isinstance(result, list) else _payload_size(result)
+            telegram_metrics.record_rpc(name, dc, time.monotonic() - start, bytes_in=bytes_in, bytes_out=bytes_out)
+            return result
@@ -10,19 +10,32 @@ import tempfile
 import hashlib
 from pathlib import Path
 from typing import Optional, Dict, Any, BinaryIO, List
-from telethon import TelegramClient
+from telethon import TelegramClient, utils
 from telethon.errors import (
     FloodWaitError, FileReferenceExpiredError, 
     ChannelPrivateError, MessageNotModifiedError
 )
 from telethon.tl.types import (
     MessageMediaDocument, InputDocumentFileLocation,
-    DocumentAttributeFilename
+    DocumentAttributeFilename, PeerChannel, PeerChat, PeerUser,
+    InputMessagesFilterDocument
 )
 from telethon.tl.functions.channels import CreateChannelRequest
 from telethon.tl.functions.account import UpdateUsernameRequest
 import config
+from telegram_metrics import InstrumentedTelegramClient
 from db import db, File
+from rate_limiter import telegram_rate_limiter
+from circuit_breaker import telegram_breaker
+from transfer_scheduler import transfer_scheduler
+from session_manager import session_manager
+from media_filters import ALL_FILE_FILTERS, iter_media_messages
+
+# Chunk size for hedged streaming downloads (Telegram maximum per upload.getFile)
+HEDGE_REQUEST_SIZE = 512 * 1024
+
+# Hedged download outcomes, shared by all storage manager instances
+hedge_stats = {'hedged': 0, 'primary_wins': 0, 'replica_wins': 0}
 
 class TelegramStorageManager:
     """Manages file storage on Telegram channels"""
@@ -30,93 +43,43 @@ class TelegramStorageManager:
     def __init__(self):
         self.client = None
         self.user_channels = {}  # Cache user channels
-        self._temp_session_path = None
-        
-    def _copy_session_to_temp(self):
-        """Copy session file to temp to avoid database lock"""
-        import sqlite3
-        import time
-        from pathlib import Path
-        
-        # Get project root
-        project_root = Path(__file__).parent.parent
-        
-        # Check for session files in order of priority
-        session_import = project_root / "data" / "session_import.session"
-        session_main = project_root / "data" / "session.session"
-        
-        source_session = None
-        if session_import.exists():
-            source_session = session_import
-            print(f"[STORAGE] Found session_import: {source_session}")
-        elif session_main.exists():
-            source_session = session_main
-            print(f"[STORAGE] Found main session: {source_session}")
-        else:
-            print(f"[STORAGE] No session file found in data/")
-            return None
-        
-        # Create temp directory for storage sessions
-        storage_temp_dir = project_root / "data" / "storage_temp"
-        storage_temp_dir.mkdir(exist_ok=True)
-        
-        # Create temp session path
-        temp_session = storage_temp_dir / f"upload_{int(time.time())}.session"
-        
-        # Copy using sqlite3 backup API to avoid lock
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                src_conn = sqlite3.connect(f"file:{source_session}?mode=ro", uri=True)
-                dst_conn = sqlite3.connect(str(temp_session))
-                with dst_conn:
-                    src_conn.backup(dst_conn)
-                dst_conn.close()
-                src_conn.close()
-                
-                print(f"[STORAGE] Copied session to: {temp_session}")
-                return str(temp_session).replace('.session', '')
-            except Exception as e:
-                print(f"[STORAGE] Copy attempt {attempt + 1}/{max_retries} failed: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)
-        
-        # Fallback: use original session directly (risk: database lock)
-        print(f"[STORAGE] Using original session directly (may cause lock)")
-        return str(source_session).replace('.session', '')
         
     async def initialize(self):
-        """Initialize Telegram client"""
+        """Initialize Telegram client (fails fast while the circuit breaker is open)"""
+        if not telegram_breaker.allow_request():
+            print(f"[STORAGE] Telegram circuit open, skipping connection")
+            return False
         try:
-            # Copy session to temp to avoid lock
-            session_path = self._copy_session_to_temp()
-            if not session_path:
+            # Shared in-memory session: no .session file copy per operation
+            session = session_manager.get_session()
+            if session is None:
                 print(f"[STORAGE] ERROR: No valid session file found")
+                telegram_breaker.record_failure()
                 return False
             
-            self._temp_session_path = session_path
-            print(f"[STORAGE] Using session: {session_path}")
-            
-            self.client = TelegramClient(
-                session_path,
+            self.client = InstrumentedTelegramClient(
+                session,
                 int(config.API_ID),
                 config.API_HASH,
                 connection_retries=3,
                 retry_delay=5,
                 timeout=60
             )
-            await self.client.connect()
+            # Bound the connect so a dead DC costs one timeout, not retries x timeout
+            await asyncio.wait_for(self.client.connect(), timeout=config.CIRCUIT_CONNECT_TIMEOUT)
             
             if not await self.client.is_user_authorized():
-                print(f"[STORAGE] Session not authorized: {session_path}")
+                print(f"[STORAGE] Session not authorized")
                 raise Exception("Telegram client not authorized. Please run authentication first.")
             
             # Get user info
             me = await self.client.get_me()
             print(f"[STORAGE] Connected as: {me.first_name} (ID: {me.id})")
             
+            telegram_breaker.record_success()
             return True
         except Exception as e:
+            telegram_breaker.record_failure()
             print(f"[STORAGE] Failed to initialize Telegram client: {e}")
             import traceback
             traceback.print_exc()
@@ -126,6 +89,7 @@ class TelegramStorageManager:
         """Close Telegram client"""
         if self.client:
             await self.client.disconnect()
+            session_manager.release(self.client.session)
     
     async def get_or_create_user_channel(self, user_id: int) -> Optional[str]:
         """Get or create private channel for user storage"""
@@ -177,7 +141,25 @@ class TelegramStorageManager:
         return await self.upload_to_saved_messages(file_path, filename)
     
     async def upload_to_saved_messages(self, file_path: str, filename: str, unique_id: str = None) -> Optional[Dict[str, Any]]:
-        """Upload file directly to Saved Messages"""
+        """Upload file directly to Saved Messages (in a transfer slot of the caller's priority)"""
+        async with transfer_scheduler.slot() as ticket:
+            return await self._upload_to_saved_messages(file_path, filename, unique_id, ticket)
+
+    @staticmethod
+    def _checkpoint_progress(ticket):
+        """Telethon progress_callback that makes every transferred part a checkpoint
+        (bandwidth cap / preemption point) of the transfer slot"""
+        done_bytes = [0]
+
+        async def on_progress(done, total):
+            await ticket.checkpoint(done - done_bytes[0])
+            done_bytes[0] = done
+
+        return on_progress
+
+    async def _upload_to_saved_messages(self, file_path: str, filename: str, unique_id: str, ticket) -> Optional[Dict[str, Any]]:
+        on_progress = self._checkpoint_progress(ticket)
+
         try:
             # Verify and log current user before upload
             me = await self.client.get_me()
@@ -194,7 +176,8 @@ class TelegramStorageManager:
                 'me',  # Saved Messages
                 file_path,
                 caption=f"{filename}\nID: {unique_id}\nUploaded via TeleDrive\nUser: {me.first_name}",
-                attributes=[DocumentAttributeFilename(filename)]
+                attributes=[DocumentAttributeFilename(filename)],
+                progress_callback=on_progress
             )
             
             # Extract file information
@@ -244,7 +227,11 @@ class TelegramStorageManager:
         except FloodWaitError as e:
             print(f"Rate limited, wait {e.seconds} seconds")
             await asyncio.sleep(e.seconds)
-            return await self.upload_to_saved_messages(file_path, filename)
+            return await self._upload_to_saved_messages(file_path, filename, unique_id, ticket)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            print(f"Failed to upload file to Saved Messages (connection): {e}")
+            telegram_breaker.record_failure()
+            return None
         except Exception as e:
             print(f"Failed to upload file to Saved Messages: {e}")
             import traceback
@@ -252,7 +239,11 @@ class TelegramStorageManager:
             return None
     
     async def download_file(self, file_record: File, output_path: Optional[str] = None) -> Optional[str]:
-        """Download file from Telegram"""
+        """Download file from Telegram (in a transfer slot of the caller's priority)"""
+        async with transfer_scheduler.slot() as ticket:
+            return await self._download_file(file_record, output_path, ticket)
+
+    async def _download_file(self, file_record: File, output_path: Optional[str] = None, ticket=None) -> Optional[str]:
         try:
             if not file_record.is_stored_on_telegram():
                 raise Exception("File is not stored on Telegram")
@@ -264,6 +255,13 @@ class TelegramStorageManager:
                 temp_dir = tempfile.gettempdir()
                 output_path = os.path.join(temp_dir, f"teledrive_{file_record.id}_{file_record.filename}")
             
+            # Replicated files: race the replica if the primary is slow
+            if config.REPLICATION_ENABLED and file_record.has_replica():
+                try:
+                    return await self.download_hedged(file_record, output_path)
+                except Exception as e:
+                    print(f"[STORAGE] Hedged download failed, falling back to primary: {e}")
+            
             # Download from Telegram
             channel = telegram_info['channel']
             message_id = telegram_info['message_id']
@@ -276,7 +274,8 @@ class TelegramStorageManager:
             # Download the file
             downloaded_path = await self.client.download_media(
                 message.media,
-                file=output_path
+                file=output_path,
+                progress_callback=self._checkpoint_progress(ticket) if ticket else None
             )
             
             return downloaded_path
@@ -284,12 +283,12 @@ class TelegramStorageManager:
         except FileReferenceExpiredError:
             # File reference expired, need to refresh
             print("File reference expired, refreshing...")
-            return await self._refresh_and_download(file_record, output_path)
+            return await self._refresh_and_download(file_record, output_path, ticket)
         except Exception as e:
             print(f"Failed to download file: {e}")
             return None
     
-    async def _refresh_and_download(self, file_record: File, output_path: Optional[str] = None) -> Optional[str]:
+    async def _refresh_and_download(self, file_record: File, output_path: Optional[str] = None, ticket=None) -> Optional[str]:
         """Refresh file reference and download"""
         try:
             telegram_info = file_record.get_telegram_info()
@@ -310,7 +309,8 @@ class TelegramStorageManager:
             # Try download again
             downloaded_path = await self.client.download_media(
                 message.media,
-                file=output_path
+                file=output_path,
+                progress_callback=self._checkpoint_progress(ticket) if ticket else None
             )
             
             return downloaded_path
@@ -343,6 +343,13 @@ class TelegramStorageManager:
             await self.client.delete_messages('me', message_id)
             print(f"[STORAGE] ✅ Successfully deleted message {message_id}")
 
+            if file_record.replica_message_id:
+                try:
+                    replica_peer = await self.get_input_peer(self.parse_peer(file_record.replica_channel_id))
+                    await self.client.delete_messages(replica_peer, file_record.replica_message_id)
+                except Exception as e:
+                    print(f"[STORAGE] Failed to delete replica message {file_record.replica_message_id}: {e}")
+
             return True
 
         except Exception as e:
@@ -426,7 +433,292 @@ class TelegramStorageManager:
         except Exception as e:
             print(f"Failed to get file info: {e}")
             return None
-    
+
+    @staticmethod
+    def resolve_peer(file_record: File):
+        """Map a file record to the Telegram peer that holds its message"""
+        channel = file_record.telegram_channel
+        channel_id = file_record.telegram_channel_id
+        if not channel or channel in ('Saved Messages', 'me') or channel_id == 'me':
+            return 'me'
+        if channel_id:
+            try:
+                return int(channel_id)
+            except (TypeError, ValueError):
+                pass
+        return channel
+
+    async def get_input_peer(self, peer):
+        """Resolve 'me', usernames or bare numeric chat IDs (as stored by the scanner) to an input peer"""
+        if not isinstance(peer, int):
+            return await self.client.get_input_entity(peer)
+
+        # Marked IDs (-100...) know their type; bare IDs could be any, so try each.
+        # If none is cached yet, refresh the entity cache from dialogs once
+        if peer < 0:
+            real_id, peer_type = utils.resolve_id(peer)
+            candidates = [peer_type(real_id)]
+        else:
+            candidates = [PeerChannel(peer), PeerChat(peer), PeerUser(peer)]
+
+        for attempt in range(2):
+            for candidate in candidates:
+                try:
+                    return await self.client.get_input_entity(candidate)
+                except (ValueError, TypeError):
+                    continue
+            if attempt == 0:
+                await telegram_rate_limiter.acquire()
+                await self.client.get_dialogs()
+        raise ValueError(f"Cannot resolve Telegram peer {peer}")
+
+    async def get_message(self, file_record: File):
+        """Fetch the Telegram message (with fresh file reference) for a file record"""
+        if not file_record.is_stored_on_telegram():
+            return None
+        peer = await self.get_input_peer(self.resolve_peer(file_record))
+        await telegram_rate_limiter.acquire()
+        message = await self.client.get_messages(peer, ids=file_record.telegram_message_id)
+        if not message or not message.media:
+            return None
+        return message
+
+    async def get_saved_message(self, message_id: int):
+        """Fetch a Saved Messages media message by ID"""
+        await telegram_rate_limiter.acquire()
+        message = await self.client.get_messages('me', ids=message_id)
+        if not message or not message.media:
+            return None
+        return message
+
+    async def get_messages_by_ids(self, peer, message_ids: List[int]) -> List[Any]:
+        """Fetch up to 100 messages in one RPC; missing/deleted IDs come back as None"""
+        input_peer = await self.get_input_peer(peer)
+        while True:
+            await telegram_rate_limiter.acquire()
+            try:
+                return await self.client.get_messages(input_peer, ids=list(message_ids))
+            except FloodWaitError as e:
+                print(f"[STORAGE] get_messages rate limited, waiting {e.seconds}s...")
+                telegram_rate_limiter.pause(e.seconds)
+
+    async def delete_saved_messages(self, message_ids: List[int]):
+        """Delete Saved Messages messages by ID (up to 100 per RPC)"""
+        while True:
+            await telegram_rate_limiter.acquire()
+            try:
+                return await self.client.delete_messages('me', list(message_ids))
+            except FloodWaitError as e:
+                print(f"[STORAGE] delete_messages rate limited, waiting {e.seconds}s...")
+                telegram_rate_limiter.pause(e.seconds)
+
+    async def read_range(self, media, offset: int, length: int) -> bytes:
+        """Read only bytes [offset, offset + length) of a Telegram media via ranged iter_download"""
+        if length <= 0:
+            return b''
+
+        # upload.getFile needs offset aligned to the request size and the request
+        # size must divide 1 MB, so align down and trim the extra bytes afterwards
+        request_size = config.RANGE_REQUEST_SIZE
+        aligned_offset = offset - (offset % request_size)
+        skip = offset - aligned_offset
+        wanted = skip + length
+
+        chunks = []
+        received = 0
+        async with transfer_scheduler.slot() as ticket:
+            stream = self.client.iter_download(
+                media,
+                offset=aligned_offset,
+                request_size=request_size,
+                limit=-(-wanted // request_size)
+            )
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    received += len(chunk)
+                    if received >= wanted:
+                        break
+                    await ticket.checkpoint(len(chunk))
+            finally:
+                await stream.close()
+
+        return b''.join(chunks)[skip:skip + length]
+
+    @staticmethod
+    def extract_media_info(message) -> Dict[str, Any]:
+        """Storage fields (ids, reference, size, MIME) of a Saved Messages media message"""
+        media_obj = getattr(message.media, 'document', None) or getattr(message.media, 'photo', None)
+        file_reference = getattr(media_obj, 'file_reference', None)
+        return {
+            'message_id': message.id,
+            'channel': 'Saved Messages',
+            'channel_id': 'me',
+            'file_id': str(media_obj.id) if media_obj else None,
+            'unique_id': file_reference.hex() if file_reference else None,
+            'access_hash': str(media_obj.access_hash) if media_obj else None,
+            'file_reference': file_reference,
+            'file_size': message.file.size if message.file else 0,
+            'mime_type': message.file.mime_type if message.file else None,
+            'date': message.date
+        }
+
+    async def forward_messages(self, to_peer, from_peer, message_ids: List[int], batch_size: int = 100) -> Dict[int, Any]:
+        """Forward messages (up to 100 per RPC) without transferring file data.
+        Returns {source_message_id: new message}"""
+        results = {}
+        to_peer = await self.get_input_peer(to_peer)
+        from_peer = await self.get_input_peer(from_peer)
+        for start in range(0, len(message_ids), batch_size):
+            batch = message_ids[start:start + batch_size]
+            while True:
+                await telegram_rate_limiter.acquire()
+                try:
+                    forwarded = await self.client.forward_messages(to_peer, batch, from_peer=from_peer)
+                    break
+                except FloodWaitError as e:
+                    print(f"[STORAGE] Forward rate limited, waiting {e.seconds}s...")
+                    telegram_rate_limiter.pause(e.seconds)
+
+            for source_id, message in zip(batch, forwarded):
+                if message is not None and message.media:
+                    results[source_id] = message
+            print(f"[STORAGE] Forwarded {min(start + batch_size, len(message_ids))}/{len(message_ids)} messages")
+        return results
+
+    async def forward_to_saved_messages(self, from_peer, message_ids: List[int], batch_size: int = 100) -> Dict[int, Dict[str, Any]]:
+        """Forward messages into Saved Messages.
+        Returns {source_message_id: media info of the new message}"""
+        forwarded = await self.forward_messages('me', from_peer, message_ids, batch_size)
+        return {source_id: self.extract_media_info(message) for source_id, message in forwarded.items()}
+
+    async def replicate_files(self, file_records: List[File], replica_peer) -> int:
+        """Forward primary copies into the replica chat and record replica locations"""
+        by_peer = {}
+        for file_record in file_records:
+            by_peer.setdefault(self.resolve_peer(file_record), []).append(file_record)
+
+        replicated = 0
+        for peer, records in by_peer.items():
+            forwarded = await self.forward_messages(replica_peer, peer, [f.telegram_message_id for f in records])
+            for file_record in records:
+                message = forwarded.get(file_record.telegram_message_id)
+                if message is not None:
+                    file_record.replica_channel_id = str(replica_peer)
+                    file_record.replica_message_id = message.id
+                    replicated += 1
+        return replicated
+
+    async def _download_leg(self, peer, message_id: int, output_path: str, first_chunk: asyncio.Event):
+        """Stream one copy of a file to output_path, setting first_chunk when bytes start arriving"""
+        input_peer = await self.get_input_peer(peer)
+        await telegram_rate_limiter.acquire()
+        message = await self.client.get_messages(input_peer, ids=message_id)
+        if not message or not message.media:
+            raise Exception(f"Message {message_id} not found")
+
+        with open(output_path, 'wb') as f:
+            async for chunk in self.client.iter_download(message.media, request_size=HEDGE_REQUEST_SIZE):
+                f.write(chunk)
+                first_chunk.set()
+        first_chunk.set()
+        return message
+
+    async def download_hedged(self, file_record: File, output_path: str) -> Optional[str]:
+        """Download from the primary; if no bytes arrive within HEDGE_DELAY also start the replica,
+        keep whichever stream produces data first and cancel the other"""
+        legs = {
+            'primary': (self.resolve_peer(file_record), file_record.telegram_message_id),
+            'replica': (self.parse_peer(file_record.replica_channel_id), file_record.replica_message_id),
+        }
+        events = {name: asyncio.Event() for name in legs}
+        tasks = {}
+
+        def start(name):
+            peer, message_id = legs[name]
+            tasks[name] = asyncio.create_task(
+                self._download_leg(peer, message_id, f"{output_path}.{name}", events[name]))
+
+        async def first_data(names):
+            """Name of the first leg to deliver data (legs failing before any data drop out)"""
+            pending = list(names)
+            while pending:
+                waiters = [asyncio.create_task(events[n].wait()) for n in pending]
+                await asyncio.wait(waiters + [tasks[n] for n in pending], return_when=asyncio.FIRST_COMPLETED)
+                for waiter in waiters:
+                    waiter.cancel()
+                for name in list(pending):
+                    if events[name].is_set():
+                        return name
+                    if tasks[name].done():
+                        pending.remove(name)
+            return names[0]
+
+        start('primary')
+        try:
+            await asyncio.wait_for(asyncio.shield(events['primary'].wait()), timeout=config.HEDGE_DELAY)
+            winner = 'primary'
+        except asyncio.TimeoutError:
+            print(f"[STORAGE] Primary slower than {config.HEDGE_DELAY}s, hedging with replica")
+            start('replica')
+            winner = await first_data(['primary', 'replica'])
+            hedge_stats['hedged'] += 1
+
+        for name, task in tasks.items():
+            if name != winner:
+                task.cancel()
+
+        try:
+            await tasks[winner]
+        except Exception as e:
+            # Winner failed mid-stream; fall back to the other copy
+            other = 'replica' if winner == 'primary' else 'primary'
+            print(f"[STORAGE] {winner} download failed ({e}), trying {other}")
+            if other in tasks:
+                tasks[other].cancel()
+                await asyncio.gather(tasks[other], return_exceptions=True)
+            events[other] = asyncio.Event()
+            start(other)
+            winner = other
+            await tasks[winner]
+        finally:
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            for name in tasks:
+                if name != winner:
+                    try:
+                        os.remove(f"{output_path}.{name}")
+                    except OSError:
+                        pass
+
+        hedge_stats[f'{winner}_wins'] += 1
+        os.replace(f"{output_path}.{winner}", output_path)
+        return output_path
+
+    @staticmethod
+    def parse_peer(value):
+        """Stored chat ID/username back to a peer ('me', int ID or username)"""
+        if not value or value == 'me':
+            return 'me'
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    async def search_saved_messages(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Server-side messages.search on Saved Messages (filename + caption, documents only)"""
+        results = []
+        await telegram_rate_limiter.acquire()
+        async for message in self.client.iter_messages('me', search=query, filter=InputMessagesFilterDocument, limit=limit):
+            if not message.media or not message.file:
+                continue
+            info = self.extract_media_info(message)
+            info.update(
+                filename=message.file.name or f"file_{message.id}",
+                caption=message.message or ''
+            )
+            results.append(info)
+        return results
+
     async def scan_saved_messages(self, limit: int = 500) -> List[Dict[str, Any]]:
         """Scan all files in Saved Messages and return list of files"""
         files = []
@@ -440,7 +732,9 @@ class TelegramStorageManager:
                 message_count = 0
                 file_count = 0
                 
-                async for message in self.client.iter_messages('me', limit=limit):
+                # Only file-like messages are fetched (one search stream per media filter)
+                filters = ALL_FILE_FILTERS if config.SCAN_SERVER_FILTERS else None
+                async for message in iter_media_messages(self.client, 'me', filters, limit=limit):
                     message_count += 1
                     
                     # Check if message has media (file)
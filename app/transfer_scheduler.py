@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Transfer Scheduler
+Shares the account's Telegram transfer slots between priority classes:
+interactive (user clicks), bulk (user-started rescans/imports) and background
+(workers). Slots are handed out by weighted fair queuing, background transfers
+yield their slot while interactive requests wait, and per-class byte rate caps keep
+background work from saturating the uplink
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+import config
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, BULK, BACKGROUND)
+
+# Priority of the current task; request threads default to interactive,
+# workers set background at the top of their coroutine
+_transfer_priority = ContextVar('transfer_priority', default=INTERACTIVE)
+
+
+def set_transfer_priority(priority: str):
+    """Set the priority for transfers started from the current context"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown transfer priority: {priority}")
+    return _transfer_priority.set(priority)
+
+
+def current_priority() -> str:
+    return _transfer_priority.get()
+
+
+class TransferTicket:
+    """A granted slot; long transfers call checkpoint() between chunks"""
+
+    def __init__(self, scheduler: 'TransferScheduler', priority: str):
+        self.scheduler = scheduler
+        self.priority = priority
+        # False while a preempted ticket waits to get its slot back
+        self.holding = True
+
+    async def checkpoint(self, nbytes: int = 0):
+        """Account bytes (applies the class bandwidth cap) and yield the slot to waiting interactive work"""
+        await self.scheduler._throttle(self.priority, nbytes)
+        if self.priority == BACKGROUND and self.scheduler._interactive_waiting():
+            self.scheduler.stats['preemptions'] += 1
+            self.holding = False
+            self.scheduler.release(self.priority)
+            await self.scheduler.acquire(self.priority)
+            self.holding = True
+
+
+class TransferScheduler:
+    """Weighted fair slot scheduler usable from any thread's event loop"""
+
+    def __init__(self, max_concurrent: int, weights: Dict[str, float], bandwidth_caps: Dict[str, int], enabled: bool = True):
+        self.enabled = enabled
+        self.max_concurrent = max(int(max_concurrent), 1)
+        self.weights = {p: max(float(weights.get(p, 1)), 0.01) for p in PRIORITIES}
+        self.bandwidth_caps = {p: int(bandwidth_caps.get(p, 0) or 0) for p in PRIORITIES}
+        self._active = {p: 0 for p in PRIORITIES}
+        self._waiters = {p: deque() for p in PRIORITIES}
+        self._pass = {p: 0.0 for p in PRIORITIES}
+        self._vtime = 0.0
+        self._byte_budget = {p: 0.0 for p in PRIORITIES}
+        self._byte_updated = {p: time.monotonic() for p in PRIORITIES}
+        self._lock = threading.Lock()
+        self.stats = {'granted': {p: 0 for p in PRIORITIES}, 'bytes': {p: 0 for p in PRIORITIES},
+                      'throttled_seconds': 0.0, 'preemptions': 0}
+
+    def _interactive_waiting(self) -> bool:
+        return bool(self._waiters[INTERACTIVE])
+
+    def _grant_locked(self, priority: str):
+        self._active[priority] += 1
+        self._pass[priority] += 1.0 / self.weights[priority]
+        self._vtime = self._pass[priority]
+        self.stats['granted'][priority] += 1
+
+    def _dispatch_locked(self):
+        """Hand free slots to waiters, lowest virtual pass (= most underserved by weight) first"""
+        while sum(self._active.values()) < self.max_concurrent:
+            backlogged = [p for p in PRIORITIES if self._waiters[p]]
+            if not backlogged:
+                return
+            priority = min(backlogged, key=lambda p: (self._pass[p], PRIORITIES.index(p)))
+            loop, future = self._waiters[priority].popleft()
+            self._grant_locked(priority)
+            loop.call_soon_threadsafe(self._wake_waiter, future)
+
+    @staticmethod
+    def _wake_waiter(future):
+        if not future.done():
+            future.set_result(True)
+
+    async def acquire(self, priority: str):
+        """Wait for a transfer slot"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if sum(self._active.values()) < self.max_concurrent and not any(self._waiters.values()):
+                self._grant_locked(priority)
+                return
+            if not self._waiters[priority]:
+                # Newly backlogged class starts at current virtual time: no credit for idle periods
+                self._pass[priority] = max(self._pass[priority], self._vtime)
+            future = loop.create_future()
+            self._waiters[priority].append((loop, future))
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._waiters[priority]:
+                    self._waiters[priority].remove((loop, future))
+                    raise
+            # Slot was granted while we were being cancelled
+            self.release(priority)
+            raise
+
+    def release(self, priority: str):
+        with self._lock:
+            self._active[priority] -= 1
+            self._dispatch_locked()
+
+    async def _throttle(self, priority: str, nbytes: int):
+        """Token bucket on bytes/s for capped classes"""
+        if not nbytes:
+            return
+        self.stats['bytes'][priority] += nbytes
+        cap = self.bandwidth_caps[priority]
+        if not cap:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Allow one second of burst
+            self._byte_budget[priority] = min(cap, self._byte_budget[priority] + (now - self._byte_updated[priority]) * cap)
+            self._byte_updated[priority] = now
+            self._byte_budget[priority] -= nbytes
+            wait = max(0.0, -self._byte_budget[priority] / cap)
+            self.stats['throttled_seconds'] += wait
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None):
+        """async with scheduler.slot() as ticket: ... one Telegram transfer"""
+        priority = priority or current_priority()
+        if not self.enabled:
+            yield TransferTicket(self, priority)
+            return
+        await self.acquire(priority)
+        ticket = TransferTicket(self, priority)
+        try:
+            yield ticket
+        finally:
+            # A ticket cancelled while re-acquiring after preemption holds no slot
+            if ticket.holding:
+                self.release(ticket.priority)
+
+    def status(self) -> Dict[str, Any]:
+        """Slots and queues per class for the API"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'max_concurrent': self.max_concurrent,
+                'classes': {
+                    p: {
+                        'active': self._active[p],
+                        'waiting': len(self._waiters[p]),
+                        'weight': self.weights[p],
+                        'bandwidth_cap': self.bandwidth_caps[p],
+                        'granted': self.stats['granted'][p],
+                        'bytes': self.stats['bytes'][p]
+                    } for p in PRIORITIES
+                },
+                'throttled_seconds': round(self.stats['throttled_seconds'], 1),
+                'preemptions': self.stats['preemptions']
+            }
+
+
+# Global instance
+transfer_scheduler = TransferScheduler(
+    config.TRANSFER_MAX_CONCURRENT,
+    config.TRANSFER_WEIGHTS,
+    config.TRANSFER_BANDWIDTH_CAPS,
+    enabled=config.TRANSFER_SCHEDULER_ENABLED
+)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+
+@pytest.fixture
+def db_app():
+    """Flask app on an in-memory SQLite DB with user 1 created"""
+    from db import db, User
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='u', email='u@x'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def scanned_file(message_id, **overrides):
+    """Scanner output row for a 100-byte video, as written by the scan sinks"""
+    row = {'message_id': message_id, 'date': '2024-01-01T00:00:00+00:00', 'file_type': 'video',
+           'file_name': f'v{message_id}.mp4', 'file_size': 100, 'mime_type': 'video/mp4', 'duration': 3,
+           'width': 640, 'height': 360, 'download_link': f'https://t.me/c/9/{message_id}', 'message_text': '',
+           'sender_id': None}
+    row.update(overrides)
+    return row
+
+
+@pytest.fixture
+def make_scanned_file():
+    return scanned_file
+
+
+@pytest.fixture
+def app_client(monkeypatch):
+    """Test client of the TeleDrive app with its DB swapped for an in-memory SQLite"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+
+    from app import app as teledrive
+    from db import db, User
+
+    # `app` is either app/app.py or the app/ package, depending on what was imported first
+    flask_app = getattr(teledrive, 'app', teledrive)
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    monkeypatch.setitem(db._app_engines[flask_app], None, engine)
+    with flask_app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='default', email='default@teledrive.local'))
+        db.session.commit()
+        yield flask_app.test_client()
+        db.session.remove()
+    engine.dispose()
@@ -0,0 +1,35 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from admission import TrafficClass
+
+
+def test_sheds_when_queue_full():
+    cls = TrafficClass('download', concurrency=1, queue_size=1)
+    assert cls.acquire(timeout=1)
+
+    queued = {}
+    waiter = threading.Thread(target=lambda: queued.setdefault('ok', cls.acquire(timeout=2)))
+    waiter.start()
+    while cls.status()['waiting'] == 0:
+        pass
+
+    # One active, one waiting: the next request is rejected immediately
+    assert not cls.acquire(timeout=5)
+    assert cls.status()['rejected'] == 1
+
+    cls.release()
+    waiter.join()
+    assert queued['ok']
+    assert cls.status()['active'] == 1
+
+
+def test_queue_wait_times_out():
+    cls = TrafficClass('scan', concurrency=1, queue_size=4)
+    assert cls.acquire(timeout=1)
+    assert not cls.acquire(timeout=0.05)
+    assert cls.status()['timed_out'] == 1
+    assert cls.status()['waiting'] == 0
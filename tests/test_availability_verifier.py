@@ -0,0 +1,99 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import telegram_storage
+from availability_verifier import AvailabilityVerifier
+from db import db, File
+from telegram_storage import TelegramStorageManager
+
+
+def _record(missing=False, reference=b'old'):
+    return SimpleNamespace(telegram_missing=missing, telegram_file_reference=reference, verified_at=None)
+
+
+def _message(reference):
+    return SimpleNamespace(media=SimpleNamespace(document=SimpleNamespace(file_reference=reference)))
+
+
+def test_apply_result_outcomes():
+    now = datetime.now(timezone.utc)
+    apply = AvailabilityVerifier.apply_result
+
+    gone = _record()
+    assert apply(gone, None, now) == 'missing'
+    assert gone.telegram_missing and gone.verified_at == now
+    assert apply(gone, None, now) == 'ok'  # already known missing
+
+    assert apply(gone, _message(b'old'), now) == 'restored'
+    assert not gone.telegram_missing
+
+    stale = _record()
+    assert apply(stale, _message(b'new'), now) == 'refreshed'
+    assert stale.telegram_file_reference == b'new'
+    assert apply(stale, _message(b'new'), now) == 'ok'
+
+
+class FakeStorage:
+    """Chat -1001 is unreachable, every message in the others still exists"""
+    resolve_peer = staticmethod(TelegramStorageManager.resolve_peer)
+
+    def __init__(self):
+        self.fetched = []
+
+    async def initialize(self):
+        return True
+
+    async def close(self):
+        pass
+
+    async def get_input_peer(self, peer):
+        if peer == -1001:
+            raise ValueError(f"Cannot resolve Telegram peer {peer}")
+        return peer
+
+    async def get_messages_by_ids(self, peer, message_ids):
+        self.fetched.append((peer, message_ids))
+        return [_message(b'ref') for _ in message_ids]
+
+
+def _stored(name, message_id, channel, channel_id):
+    f = File(filename=name, user_id=1, storage_type='telegram', telegram_message_id=message_id,
+             telegram_channel=channel, telegram_channel_id=channel_id, telegram_file_reference=b'ref')
+    db.session.add(f)
+    return f
+
+
+def test_unreachable_peer_does_not_abort_the_pass(db_app, monkeypatch):
+    _stored('a.bin', 1, 'Private', '-1001')
+    _stored('b.bin', 2, 'Saved Messages', 'me')
+    _stored('c.bin', 3, 'Chan', '-1002')
+    db.session.commit()
+    storage = FakeStorage()
+    monkeypatch.setattr(telegram_storage, 'TelegramStorageManager', lambda: storage)
+
+    report = asyncio.run(AvailabilityVerifier().verify_pass(limit=10))
+
+    assert storage.fetched == [('me', [2]), (-1002, [3])]
+    assert report['checked'] == 2 and report['failed'] == 1
+    assert report['errors'] == [{'peer': '-1001', 'files': 1, 'error': 'Cannot resolve Telegram peer -1001'}]
+    # Every row is stamped, so the next pass does not start with the unreachable chat again
+    assert File.query.filter(File.verified_at.is_(None)).count() == 0
+    assert asyncio.run(AvailabilityVerifier().verify_pass(limit=10))['checked'] == 0
+
+
+def test_missing_files_endpoint_lists_missing_files(app_client):
+    _stored('gone.bin', 1, 'Saved Messages', 'me').telegram_missing = True
+    _stored('here.bin', 2, 'Saved Messages', 'me')
+    db.session.commit()
+
+    response = app_client.get('/api/v2/storage/verify/missing')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == 1
+    assert body['files'][0]['filename'] == 'gone.bin' and body['files'][0]['telegram_missing'] is True
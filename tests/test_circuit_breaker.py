@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def test_trips_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_half_open_allows_single_probe():
+    transitions = []
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.add_listener(lambda old, new: transitions.append(new))
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    time.sleep(0.02)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert transitions == [OPEN, HALF_OPEN, OPEN, HALF_OPEN, CLOSED]
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import telegram_storage
+from circuit_breaker import telegram_breaker, CLOSED, OPEN
+from db import db, File
+from deferred_sync import DeferredSyncWorker
+
+
+class FakeStorage:
+    def __init__(self, fail=(), open_breaker_on=None):
+        self.fail = set(fail)
+        self.open_breaker_on = open_breaker_on
+        self.uploaded = []
+
+    async def initialize(self):
+        return True
+
+    async def close(self):
+        pass
+
+    async def upload_to_saved_messages(self, file_path, filename):
+        self.uploaded.append(filename)
+        if filename == self.open_breaker_on:
+            telegram_breaker.state = OPEN
+        if filename in self.fail or filename == self.open_breaker_on:
+            return None
+        return {'message_id': len(self.uploaded), 'channel': 'Saved Messages', 'channel_id': 'me'}
+
+
+def _pending(tmp_path, names):
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(b'x')
+        db.session.add(File(filename=name, user_id=1, storage_type='local', file_path=str(path), sync_pending=True))
+    db.session.commit()
+
+
+def _run(monkeypatch, storage):
+    monkeypatch.setattr(telegram_storage, 'TelegramStorageManager', lambda: storage)
+    asyncio.run(DeferredSyncWorker().process_pending())
+
+
+def test_failed_upload_backs_off_without_blocking_queue(db_app, tmp_path, monkeypatch):
+    _pending(tmp_path, ['a.bin', 'b.bin', 'c.bin'])
+    storage = FakeStorage(fail={'a.bin'})
+    _run(monkeypatch, storage)
+
+    assert storage.uploaded == ['a.bin', 'b.bin', 'c.bin']
+    failed = File.query.filter_by(filename='a.bin').one()
+    assert failed.sync_pending and failed.sync_attempts == 1 and failed.sync_retry_at is not None
+    assert File.query.filter_by(sync_pending=True).count() == 1
+
+    # Still backing off: the next pass does not touch it
+    storage = FakeStorage()
+    _run(monkeypatch, storage)
+    assert storage.uploaded == []
+
+
+def test_pass_stops_when_breaker_opens(db_app, tmp_path, monkeypatch):
+    _pending(tmp_path, ['a.bin', 'b.bin', 'c.bin'])
+    storage = FakeStorage(open_breaker_on='b.bin')
+    try:
+        _run(monkeypatch, storage)
+    finally:
+        telegram_breaker.state = CLOSED
+    assert storage.uploaded == ['a.bin', 'b.bin']
+    assert File.query.filter_by(sync_pending=True).count() == 2
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import telegram_storage
+from db import db, File, Folder
+from file_copy import copy_name, copy_folder_tree, copy_file_records
+from rate_limiter import telegram_rate_limiter
+
+
+def test_copy_name_skips_taken_names():
+    assert copy_name('a.txt', {'b.txt'}) == 'a.txt'
+    assert copy_name('a.txt', {'a.txt'}) == 'a (copy).txt'
+    assert copy_name('a.txt', {'a.txt', 'a (copy).txt', 'a (copy 2).txt'}) == 'a (copy 3).txt'
+    assert copy_name('Photos', {'Photos', 'Photos (copy)'}) == 'Photos (copy 2)'
+    assert copy_name('archive.tar.gz', {'archive.tar.gz'}) == 'archive.tar (copy).gz'
+
+
+def _info(message_id):
+    return {'message_id': message_id, 'channel': 'Saved Messages', 'channel_id': 'me', 'file_id': str(message_id),
+            'unique_id': None, 'access_hash': '1', 'file_reference': None, 'file_size': 0}
+
+
+def test_folder_tree_copy_forwards_telegram_files_and_copies_local_ones(db_app, tmp_path):
+    root = Folder(name='Docs', user_id=1)
+    db.session.add(root)
+    db.session.flush()
+    child = Folder(name='Sub', user_id=1, parent_id=root.id)
+    db.session.add(child)
+    db.session.flush()
+    db.session.add(Folder(name='Gone', user_id=1, parent_id=root.id, is_deleted=True))
+    local = tmp_path / 'note.txt'
+    local.write_text('hi')
+    db.session.add_all([
+        File(filename='a.pdf', user_id=1, folder_id=root.id, storage_type='telegram', telegram_message_id=10,
+             telegram_channel='Saved Messages', telegram_channel_id='me', file_size=5),
+        File(filename='note.txt', user_id=1, folder_id=child.id, storage_type='local', file_path=str(local)),
+        File(filename='lost.bin', user_id=1, folder_id=child.id, storage_type='local', file_path='/nope'),
+        File(filename='old.bin', user_id=1, folder_id=child.id, storage_type='local', is_deleted=True),
+    ])
+    db.session.commit()
+
+    new_folders, plan = copy_folder_tree(root, None, 'Docs (copy)', 1)
+    assert [f.name for f in new_folders] == ['Docs (copy)', 'Sub']
+    assert new_folders[1].parent_id == new_folders[0].id
+    assert sorted(name for _, _, name in plan) == ['a.pdf', 'lost.bin', 'note.txt']
+
+    telegram_id = File.query.filter_by(filename='a.pdf').one().id
+    copies, failed = copy_file_records(1, plan, {telegram_id: _info(99)}, tmp_path)
+    db.session.commit()
+
+    by_name = {f.filename: f for f in copies}
+    assert by_name['a.pdf'].telegram_message_id == 99 and by_name['a.pdf'].folder_id == new_folders[0].id
+    assert by_name['note.txt'].folder_id == new_folders[1].id
+    assert open(by_name['note.txt'].file_path).read() == 'hi'
+    assert [f['filename'] for f in failed] == ['lost.bin']
+
+
+class _ForwardClient:
+    def __init__(self):
+        self.calls = []
+
+    async def get_input_entity(self, peer):
+        return peer
+
+    async def forward_messages(self, to_peer, message_ids, from_peer=None):
+        self.calls.append(list(message_ids))
+        return [None if i % 50 == 0 else _Forwarded(i + 1000) for i in message_ids]
+
+
+class _Forwarded:
+    def __init__(self, message_id):
+        self.id = message_id
+        self.media = object()
+        self.file = None
+        self.date = None
+
+
+def test_forward_batches_of_100(monkeypatch):
+    async def acquire():
+        pass
+
+    monkeypatch.setattr(telegram_rate_limiter, 'acquire', acquire)
+    storage = telegram_storage.TelegramStorageManager()
+    storage.client = _ForwardClient()
+
+    results = asyncio.run(storage.forward_to_saved_messages('me', list(range(1, 251))))
+
+    assert [len(batch) for batch in storage.client.calls] == [100, 100, 50]
+    assert storage.client.calls[1][0] == 101
+    assert len(results) == 245  # messages the server did not forward are left out
+    assert results[7]['message_id'] == 1007 and results[7]['channel_id'] == 'me'
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import config
+from telegram_storage import TelegramStorageManager
+
+
+class FakeStorage(TelegramStorageManager):
+    """Legs write their name after a per-peer delay instead of talking to Telegram"""
+
+    def __init__(self, delays):
+        super().__init__()
+        self.delays = delays
+
+    async def _download_leg(self, peer, message_id, output_path, first_chunk):
+        delay = self.delays[peer]
+        if delay is None:
+            raise Exception('unavailable')
+        await asyncio.sleep(delay)
+        with open(output_path, 'w') as f:
+            f.write(str(peer))
+        first_chunk.set()
+
+
+def _record():
+    return SimpleNamespace(telegram_channel='Saved Messages', telegram_channel_id='me', telegram_message_id=1,
+                           replica_channel_id='-1001', replica_message_id=2)
+
+
+def _download(tmp_path, delays):
+    out = str(tmp_path / 'file.bin')
+    asyncio.run(FakeStorage(delays).download_hedged(_record(), out))
+    with open(out) as f:
+        return f.read(), sorted(os.listdir(tmp_path))
+
+
+def test_fast_primary_is_not_hedged(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'HEDGE_DELAY', 0.05)
+    assert _download(tmp_path, {'me': 0.0, -1001: 0.0}) == ('me', ['file.bin'])
+
+
+def test_slow_primary_loses_to_replica(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'HEDGE_DELAY', 0.05)
+    assert _download(tmp_path, {'me': 0.5, -1001: 0.0}) == ('-1001', ['file.bin'])
+
+
+def test_failed_primary_falls_back_to_replica(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'HEDGE_DELAY', 0.05)
+    assert _download(tmp_path, {'me': None, -1001: 0.1}) == ('-1001', ['file.bin'])
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from telethon.helpers import TotalList
+from telethon.tl.types import (
+    InputMessagesFilterDocument, InputMessagesFilterPhotos, InputMessagesFilterVideo,
+    InputMessagesFilterRoundVideo
+)
+
+import config
+from media_filters import iter_media_messages, count_media_messages, server_filters
+
+
+class _SearchClient:
+    """History where each message matches a set of filters; records every call"""
+
+    def __init__(self, history):
+        self.history = history  # [(id, {filters})], newest first
+        self.calls = []
+
+    def iter_messages(self, entity, limit=None, filter=None, **kwargs):
+        self.calls.append(filter)
+
+        async def gen():
+            matching = [m for m, f in self.history if filter is None or filter in f]
+            for message_id in matching[:limit]:
+                yield SimpleNamespace(id=message_id)
+        return gen()
+
+    async def get_messages(self, entity, limit=None, filter=None):
+        result = TotalList()
+        result.total = sum(1 for _, f in self.history if filter in f)
+        return result
+
+
+def _collect(client, filters, **kwargs):
+    async def run():
+        return [m.id async for m in iter_media_messages(client, 'chan', filters, **kwargs)]
+    return asyncio.run(run())
+
+
+DOC, PHOTO, VIDEO = InputMessagesFilterDocument, InputMessagesFilterPhotos, InputMessagesFilterVideo
+HISTORY = [(9, {PHOTO}), (8, set()), (7, {DOC, VIDEO}), (6, set()), (5, {DOC}), (3, {PHOTO}), (1, {VIDEO})]
+
+
+def test_filtered_streams_merge_newest_first_without_duplicates():
+    client = _SearchClient(HISTORY)
+    assert _collect(client, [DOC, PHOTO, VIDEO]) == [9, 7, 5, 3, 1]
+    assert client.calls == [DOC, PHOTO, VIDEO]
+
+    assert _collect(_SearchClient(HISTORY), [DOC, PHOTO, VIDEO], limit=3) == [9, 7, 5]
+    assert _collect(_SearchClient(HISTORY), [PHOTO]) == [9, 3]
+    assert _collect(_SearchClient(HISTORY), []) == []
+    assert _collect(_SearchClient(HISTORY), None) == [9, 8, 7, 6, 5, 3, 1]
+
+
+def test_count_sums_per_filter_totals():
+    assert asyncio.run(count_media_messages(_SearchClient(HISTORY), 'chan', [DOC, PHOTO])) == 4
+
+
+def test_filters_follow_type_toggles(monkeypatch):
+    for name in ('SCAN_DOCUMENTS', 'SCAN_AUDIO', 'SCAN_VOICE', 'SCAN_ANIMATIONS', 'SCAN_STICKERS'):
+        monkeypatch.setattr(config, name, False)
+    monkeypatch.setattr(config, 'SCAN_SERVER_FILTERS', True)
+    monkeypatch.setattr(config, 'SCAN_PHOTOS', True)
+    monkeypatch.setattr(config, 'SCAN_VIDEOS', True)
+    monkeypatch.setattr(config, 'SCAN_VIDEO_NOTES', True)
+    assert server_filters() == [PHOTO, VIDEO, InputMessagesFilterRoundVideo]
+
+    monkeypatch.setattr(config, 'SCAN_VIDEO_NOTES', False)
+    assert server_filters() == [PHOTO, VIDEO]
+
+    # Stickers are only found by walking the whole history
+    monkeypatch.setattr(config, 'SCAN_STICKERS', True)
+    assert server_filters() is None
+
+    monkeypatch.setattr(config, 'SCAN_SERVER_FILTERS', False)
+    assert server_filters() is None
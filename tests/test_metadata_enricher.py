@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import config
+import metadata_enricher
+import telegram_storage
+from db import db, File
+from metadata_enricher import parse_image, parse_mp4, parse_pdf, MetadataEnrichmentWorker, ENRICHED_KEY
+
+
+def test_jpeg_dimensions_and_exif_date():
+    date = b'2021:05:06 07:08:09\x00'
+    tiff = (b'II*\x00' + struct.pack('<I', 8) + struct.pack('<H', 1)
+            + struct.pack('<HHII', 0x0132, 2, len(date), 26) + struct.pack('<I', 0) + date)
+    app1 = b'Exif\x00\x00' + tiff
+    jpeg = (b'\xff\xd8' + b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1
+            + b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 45, 123, 3) + b'\x00' * 6)
+
+    meta = parse_image(jpeg)
+    assert meta == {'exif_date': '2021-05-06T07:08:09', 'width': 123, 'height': 45}
+
+
+def test_png_dimensions():
+    png = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 640, 480)
+    assert parse_image(png) == {'width': 640, 'height': 480}
+
+
+def test_mp4_duration_from_tail():
+    mvhd = b'mvhd' + bytes(4) + bytes(8) + struct.pack('>II', 1000, 65500)
+    assert parse_mp4(b'\x00\x00\x00\x20ftypisom', mvhd) == {'duration': 65.5}
+
+
+def test_pdf_page_count_uses_root_pages():
+    head = b'%PDF-1.4\n2 0 obj << /Type /Pages /Kids [3 0 R] /Count 3 >>'
+    tail = b'1 0 obj << /Type /Pages /Kids [2 0 R 4 0 R] /Count 12 >>\ntrailer'
+    assert parse_pdf(head, tail) == {'page_count': 12}
+
+
+class _Storage:
+    async def initialize(self):
+        return True
+
+    async def close(self):
+        pass
+
+
+def _enrich_pass(monkeypatch, outcome):
+    async def enrich_file(storage, file_record):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return dict(outcome)
+
+    monkeypatch.setattr(telegram_storage, 'TelegramStorageManager', _Storage)
+    monkeypatch.setattr(metadata_enricher, 'enrich_file', enrich_file)
+    asyncio.run(MetadataEnrichmentWorker().process_pending())
+    return json.loads(File.query.one().file_metadata)
+
+
+def test_failed_enrichment_is_retried_with_backoff(db_app, monkeypatch):
+    monkeypatch.setattr(config, 'METADATA_RETRY_BASE', 0)
+    db.session.add(File(filename='v.mp4', user_id=1, storage_type='telegram', telegram_message_id=7,
+                        mime_type='video/mp4'))
+    db.session.commit()
+
+    meta = _enrich_pass(monkeypatch, TimeoutError('read timed out'))
+    assert ENRICHED_KEY not in meta and meta['enrich_attempts'] == 1 and 'enrich_retry_at' in meta
+
+    meta = _enrich_pass(monkeypatch, {'duration': 4.0})
+    assert meta[ENRICHED_KEY] and meta['duration'] == 4.0
+    assert 'enrich_attempts' not in meta and 'error' not in meta
+
+
+def test_enrichment_gives_up_after_max_attempts(db_app, monkeypatch):
+    monkeypatch.setattr(config, 'METADATA_RETRY_BASE', 0)
+    monkeypatch.setattr(config, 'METADATA_MAX_ATTEMPTS', 2)
+    db.session.add(File(filename='v.mp4', user_id=1, storage_type='telegram', telegram_message_id=7))
+    db.session.commit()
+
+    error = TimeoutError('read timed out')
+    error.seconds = 3600  # FloodWait-style wait overrides the shorter backoff
+    meta = _enrich_pass(monkeypatch, error)
+    assert ENRICHED_KEY not in meta
+    meta = _enrich_pass(monkeypatch, error)  # still waiting out the flood wait
+    assert meta['enrich_attempts'] == 1
+
+    meta['enrich_retry_at'] = '2000-01-01T00:00:00+00:00'
+    File.query.one().file_metadata = json.dumps(meta)
+    db.session.commit()
+    meta = _enrich_pass(monkeypatch, error)
+    assert meta['enrich_attempts'] == 2 and meta[ENRICHED_KEY] and meta['error'] == 'read timed out'
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import pack_storage
+from db import db, File, PackBlob
+from pack_storage import PackStorage, COALESCE_GAP, is_pack_filename
+
+
+def _entry(offset, length):
+    return SimpleNamespace(pack_offset=offset, pack_length=length)
+
+
+def test_coalesce_merges_close_entries():
+    entries = [_entry(0, 100), _entry(150, 50), _entry(200 + COALESCE_GAP + 1, 10)]
+    groups = PackStorage()._coalesce(entries)
+
+    assert [(start, length) for start, length, _ in groups] == [(0, 200), (200 + COALESCE_GAP + 1, 10)]
+    assert len(groups[0][2]) == 2
+
+
+def test_pack_filename():
+    assert is_pack_filename('teledrive_pack_12.pack')
+    assert not is_pack_filename('photo.jpg')
+    assert not is_pack_filename(None)
+
+
+class FakeSavedMessages:
+    """Saved Messages in memory: uploads become messages, reads are ranged slices"""
+
+    def __init__(self):
+        self.messages = {}
+        self.ranged_reads = 0
+
+    async def upload_to_saved_messages(self, file_path, filename):
+        message_id = len(self.messages) + 1
+        with open(file_path, 'rb') as f:
+            self.messages[message_id] = f.read()
+        return {'message_id': message_id, 'channel_id': 'me', 'file_id': str(message_id)}
+
+    async def get_saved_message(self, message_id):
+        return SimpleNamespace(media=message_id) if message_id in self.messages else None
+
+    async def read_range(self, media, offset, length):
+        self.ranged_reads += 1
+        return self.messages[media][offset:offset + length]
+
+    async def delete_saved_messages(self, message_ids):
+        for message_id in message_ids:
+            del self.messages[message_id]
+
+
+def _packed(packs, name, data):
+    pack, offset, length = packs.append_bytes(1, data)
+    file_record = File(filename=name, user_id=1, storage_type='pack', pack_id=pack.id, pack_offset=offset,
+                       pack_length=length)
+    db.session.add(file_record)
+    db.session.commit()
+    return file_record
+
+
+def test_append_read_seal_compact_roundtrip(db_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(pack_storage, 'PACK_DIR', tmp_path)
+    packs, storage = PackStorage(), FakeSavedMessages()
+    files = [_packed(packs, f'f{i}.txt', f'content {i}'.encode() * (i + 1)) for i in range(3)]
+    pack = db.session.get(PackBlob, files[0].pack_id)
+    assert {f.pack_id for f in files} == {pack.id} and pack.entry_count == 3
+
+    # Open pack: served from the local file
+    assert asyncio.run(packs.read_entry(storage, files[1])) == b'content 1' * 2
+    assert storage.ranged_reads == 0
+
+    assert asyncio.run(packs.seal(storage, pack))
+    assert pack.status == 'sealed' and pack.local_path is None and not list(tmp_path.iterdir())
+    for i, file_record in enumerate(files):
+        assert asyncio.run(packs.read_entry(storage, file_record)) == f'content {i}'.encode() * (i + 1)
+
+    # Two of three entries deleted: compaction moves the survivor and retires the message
+    files[0].is_deleted = files[2].is_deleted = True
+    db.session.commit()
+    assert packs.packs_to_compact() == [pack]
+    assert asyncio.run(packs.compact(storage, pack)) == {'pack_id': pack.id, 'moved': 1}
+
+    assert pack.status == 'retired' and pack.telegram_message_id not in storage.messages
+    assert files[1].pack_id != pack.id and files[0].pack_id is None
+    assert asyncio.run(packs.read_entry(storage, files[1])) == b'content 1' * 2
+
+
+def test_copied_packed_file_survives_compaction(db_app, tmp_path, monkeypatch):
+    from file_copy import copy_file_records
+
+    monkeypatch.setattr(pack_storage, 'PACK_DIR', tmp_path)
+    packs, storage = PackStorage(), FakeSavedMessages()
+    source = _packed(packs, 'small.txt', b'tiny file')
+    filler = _packed(packs, 'filler.txt', b'x' * 1000)
+    pack = db.session.get(PackBlob, source.pack_id)
+
+    copies, failed = copy_file_records(1, [(source, None, 'small (copy).txt')], {}, tmp_path)
+    db.session.commit()
+    copy = copies[0]
+    assert failed == [] and copy.is_packed()
+    assert (copy.pack_id, copy.pack_offset, copy.pack_length) == (source.pack_id, source.pack_offset,
+                                                                  source.pack_length)
+
+    # Deleting the source leaves the copy readable, also after its pack is compacted away
+    assert asyncio.run(packs.seal(storage, pack))
+    source.is_deleted = filler.is_deleted = True
+    db.session.commit()
+    assert asyncio.run(packs.compact(storage, pack))['moved'] == 1
+    assert copy.pack_id != pack.id and source.pack_id is None
+    assert asyncio.run(packs.read_entry(storage, copy)) == b'tiny file'
@@ -0,0 +1,32 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from rate_limiter import TelegramRateLimiter
+
+
+def test_burst_then_throttle():
+    limiter = TelegramRateLimiter(rate=20, burst=5)
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(10):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    # 5 from the burst, the other 5 at 20/s
+    assert 0.2 <= elapsed < 1.0
+
+
+def test_pause_blocks_callers():
+    limiter = TelegramRateLimiter(rate=100, burst=10)
+    limiter.pause(0.3)
+
+    start = time.monotonic()
+    asyncio.run(limiter.acquire())
+    assert time.monotonic() - start >= 0.25
+    assert limiter.status()['flood_waits'] == 1
@@ -0,0 +1,58 @@
+import asyncio
+import io
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from remote_archive import RemoteZipReader
+
+
+def _make_zip(comment=b''):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        zf.writestr('docs/readme.txt', 'hello ' * 1000, compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr('raw.bin', bytes(range(256)) * 40, compress_type=zipfile.ZIP_STORED)
+        zf.writestr('empty/', '')
+        zf.comment = comment
+    return buf.getvalue()
+
+
+def _reader(data):
+    reads = []
+
+    async def read_range(offset, length):
+        reads.append((offset, length))
+        return data[offset:offset + length]
+
+    return RemoteZipReader(read_range, len(data)), reads
+
+
+def test_index_lists_members():
+    data = _make_zip(comment=b'x' * 300)
+    reader, reads = _reader(data)
+    index = asyncio.run(reader.load_index())
+
+    names = [e['name'] for e in index['entries']]
+    assert names == ['docs/readme.txt', 'raw.bin', 'empty/']
+    assert index['entries'][2]['is_dir']
+    assert len(reads) == 1  # small archive: central directory comes with the tail
+
+
+def test_extract_single_member_reads_only_its_range():
+    data = _make_zip()
+    reader, reads = _reader(data)
+
+    async def read_member(name):
+        chunks = []
+        async for chunk in reader.iter_member(name):
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    assert asyncio.run(read_member('docs/readme.txt')) == b'hello ' * 1000
+    reads.clear()
+    assert asyncio.run(read_member('raw.bin')) == bytes(range(256)) * 40
+
+    entry = reader.get_entry('raw.bin')
+    assert sum(length for _, length in reads) <= 30 + entry['compressed_size']
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from db import db, File
+from remote_search import unknown_hits, _upsert_hits
+
+
+def _hit(message_id, name=None):
+    return {'message_id': message_id, 'filename': name or f'f{message_id}.pdf', 'file_size': 10,
+            'mime_type': 'application/pdf', 'file_id': str(message_id), 'unique_id': None, 'access_hash': '1',
+            'file_reference': None, 'date': None, 'caption': ''}
+
+
+def test_unknown_hits_skip_tracked_and_repeated_messages(db_app):
+    db.session.add(File(filename='up.pdf', user_id=1, storage_type='telegram', telegram_message_id=5,
+                        telegram_channel='Saved Messages', telegram_channel_id='12345'))
+    db.session.add(File(filename='other.pdf', user_id=1, storage_type='telegram', telegram_message_id=6,
+                        telegram_channel='Chan', telegram_channel_id='-1009', from_scan=True))
+    db.session.commit()
+
+    fresh = unknown_hits(1, [_hit(5), _hit(6), _hit(7), _hit(6, 'again.pdf')])
+    assert [h['message_id'] for h in fresh] == [6, 7]
+    assert fresh[0]['filename'] == 'f6.pdf'
+
+
+def test_concurrent_upserts_insert_each_message_once(db_app):
+    hits = [_hit(i) for i in range(1, 21)]
+    threads = [threading.Thread(target=_upsert_hits, args=(db_app, 1, hits + hits[:3])) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    rows = File.query.filter_by(telegram_channel_id='me').all()
+    assert sorted(f.telegram_message_id for f in rows) == list(range(1, 21))
+    assert {f.telegram_channel for f in rows} == {'Saved Messages'}
+
+
+def test_unknown_hits_skip_pack_containers(db_app):
+    fresh = unknown_hits(1, [_hit(1, 'teledrive_pack_3.pack'), _hit(2, 'pack_list.pdf')])
+    assert [h['filename'] for h in fresh] == ['pack_list.pdf']
+
+
+def test_search_merges_local_and_remote_hits(app_client, monkeypatch):
+    teledrive = sys.modules[app_client.application.import_name]
+    hits = [_hit(5, 'report_2019.pdf'), _hit(6, 'report_2020.pdf'), _hit(7, 'teledrive_pack_1.pack')]
+
+    class FakeRemoteSearch:
+        def __init__(self, app, query, limit):
+            self.result = {'hits': hits, 'error': None}
+
+        def wait(self, timeout):
+            return hits
+
+    upserted = []
+    monkeypatch.setattr(teledrive, 'RemoteSearch', FakeRemoteSearch)
+    monkeypatch.setattr(teledrive, 'upsert_hits_async', lambda app, user_id, new_hits: upserted.extend(new_hits))
+    db.session.add(File(filename='report_2021.pdf', user_id=1, storage_type='telegram', telegram_message_id=5,
+                        telegram_channel='Saved Messages', telegram_channel_id='me'))
+    db.session.commit()
+
+    response = app_client.get('/api/search?q=report&remote=1')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [(r['filename'], r.get('source')) for r in body['results']] == [('report_2021.pdf', None),
+                                                                           ('report_2020.pdf', 'telegram')]
+    assert body['remote'] == {'included': 1, 'matched': 3}
+    assert [h['message_id'] for h in upserted] == [6]
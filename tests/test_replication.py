@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from db import db, File
+from replication import ReplicationWorker
+
+
+def _stored(name, message_id, channel, channel_id, from_scan=False):
+    db.session.add(File(filename=name, user_id=1, storage_type='telegram', telegram_message_id=message_id,
+                        telegram_channel=channel, telegram_channel_id=channel_id, from_scan=from_scan))
+
+
+def test_only_saved_messages_files_are_replicated(db_app):
+    _stored('synced.bin', 1, 'Saved Messages', 'me')
+    _stored('upload.bin', 2, 'Saved Messages', '12345')  # uploads record the self chat ID
+    _stored('scanned.mp4', 3, 'Chan', '-1009')
+    _stored('catalog.mp4', 4, 'Chan', '-1009', from_scan=True)
+    _stored('catalog_me.mp4', 5, 'Saved Messages', 'me', from_scan=True)
+    db.session.commit()
+
+    pending = ReplicationWorker()._pending_query().order_by(File.id).all()
+    assert [f.filename for f in pending] == ['synced.bin', 'upload.bin']
@@ -0,0 +1,85 @@
+import io
+import os
+import shutil
+import sys
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import resumable_upload
+from db import db, UploadSession
+from resumable_upload import merge_range, contiguous_offset, covered_bytes, ResumableUploadManager, ResumableUploadError
+
+
+def test_parallel_chunks_merge_out_of_order():
+    ranges = []
+    ranges = merge_range(ranges, 200, 300)
+    ranges = merge_range(ranges, 0, 100)
+    assert ranges == [[0, 100], [200, 300]]
+    assert contiguous_offset(ranges) == 100
+    assert covered_bytes(ranges) == 200
+
+    ranges = merge_range(ranges, 100, 200)
+    assert ranges == [[0, 300]]
+    assert contiguous_offset(ranges) == 300
+
+
+def test_retried_and_partial_chunks():
+    ranges = merge_range([], 0, 50)
+    ranges = merge_range(ranges, 0, 50)  # retry after a lost response
+    ranges = merge_range(ranges, 40, 80)  # overlapping resend
+    assert ranges == [[0, 80]]
+    assert merge_range(ranges, 90, 90) == ranges  # empty body records nothing
+    assert contiguous_offset(merge_range([], 10, 20)) == 0
+
+
+@pytest.fixture
+def uploads(db_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(resumable_upload, 'STAGING_DIR', tmp_path / 'staging')
+    return ResumableUploadManager()
+
+
+def test_chunks_land_at_offsets_and_finalize_claims_once(uploads):
+    session = uploads.create(1, 'a.bin', 10)
+    uploads.write_chunk(session, 6, io.BytesIO(b'ghij'), 4)
+    with pytest.raises(ResumableUploadError):
+        uploads.begin_finalize(session)  # bytes 0-6 still missing
+    uploads.write_chunk(session, 0, io.BytesIO(b'abcdef'), 6)
+
+    staging_path = uploads.begin_finalize(session)
+    with open(staging_path, 'rb') as f:
+        assert f.read() == b'abcdefghij'
+    assert session.status == 'finalizing'
+    with pytest.raises(ResumableUploadError) as exc:
+        uploads.begin_finalize(session)
+    assert exc.value.status_code == 409
+
+
+def test_failed_storage_moves_file_back_or_marks_failed(uploads, tmp_path):
+    session = uploads.create(1, 'a.bin', 3)
+    uploads.write_chunk(session, 0, io.BytesIO(b'abc'), 3)
+    moved = tmp_path / 'a.bin'
+    shutil.move(uploads.begin_finalize(session), moved)
+
+    # Storage raised with the file still in the upload dir: finalize can be retried
+    uploads.fail_finalize(session, str(moved))
+    assert session.status == 'uploading' and not moved.exists()
+    shutil.move(uploads.begin_finalize(session), moved)
+
+    # Storage consumed the file (e.g. packed) before the commit failed
+    moved.unlink()
+    uploads.fail_finalize(session, str(moved))
+    assert session.status == 'failed'
+
+
+def test_stuck_finalizing_sessions_expire(uploads):
+    session = uploads.create(1, 'a.bin', 3)
+    uploads.write_chunk(session, 0, io.BytesIO(b'abc'), 3)
+    staging_path = uploads.begin_finalize(session)
+    session.expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.session.commit()
+
+    assert uploads.cleanup_expired() == 1
+    assert UploadSession.query.count() == 0 and not os.path.exists(staging_path)
@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from db import db, File
+from scan_catalog import ScanCatalogWriter
+from saved_messages_sync import reconcile_saved_messages, saved_messages_rows, scan_window_floor
+
+
+def _saved(name, message_id, channel_id='me', channel='Saved Messages', storage_type='telegram'):
+    f = File(filename=name, user_id=1, storage_type=storage_type, telegram_message_id=message_id,
+             telegram_channel=channel, telegram_channel_id=channel_id)
+    db.session.add(f)
+    return f
+
+
+def test_rescan_only_reconciles_saved_messages_rows(db_app, make_scanned_file):
+    catalog = ScanCatalogWriter(1, None, '-1009', 'Chan')
+    for i in (1, 2, 7):
+        catalog.add(make_scanned_file(i))
+    catalog.flush()
+    kept = _saved('kept.bin', 1)
+    upload = _saved('upload.bin', 2, channel_id='12345')  # uploads record the self chat ID
+    gone = _saved('gone.bin', 3, channel_id=None, channel='Other')
+    dup = _saved('dup.bin', 1)
+    packed = _saved('packed.bin', None, storage_type='pack')
+    db.session.commit()
+
+    stale = reconcile_saved_messages(File.query.order_by(File.id).all(), {1, 2})
+
+    assert [(f.filename, reason) for f, reason in stale] == [('gone.bin', 'not in Saved Messages'),
+                                                            ('dup.bin', 'duplicate')]
+    assert kept not in dict(stale) and upload not in dict(stale) and packed not in dict(stale)
+    catalog_rows = File.query.filter_by(from_scan=True).all()
+    assert len(catalog_rows) == 3 and {f.telegram_channel for f in catalog_rows} == {'Chan'}
+    assert {f.filename for f in saved_messages_rows(File.query.all())} == {'kept.bin', 'upload.bin', 'gone.bin',
+                                                                           'dup.bin'}
+
+
+def test_rescan_keeps_local_files_waiting_for_sync(db_app):
+    pending = File(filename='offline.bin', user_id=1, storage_type='local', file_path='/tmp/offline.bin',
+                   sync_pending=True)
+    orphan = File(filename='orphan.bin', user_id=1, storage_type='local', file_path='/tmp/orphan.bin')
+    db.session.add_all([pending, orphan])
+    db.session.commit()
+
+    stale = reconcile_saved_messages(File.query.all(), set())
+    assert [(f.filename, reason) for f, reason in stale] == [('orphan.bin', 'no message_id (local file)')]
+
+
+def test_rows_older_than_scanned_window_are_kept(db_app):
+    old = _saved('old_search_hit.pdf', 3)
+    gone = _saved('gone.pdf', 150)
+    db.session.commit()
+
+    telegram_files = [{'message_id': i} for i in (100, 200, 300)]
+    floor = scan_window_floor(telegram_files)
+    stale = reconcile_saved_messages(File.query.all(), {100, 200, 300}, floor)
+
+    assert floor == 100
+    assert [f for f, _ in stale] == [gone] and old not in dict(stale)
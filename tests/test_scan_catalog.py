@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from db import db, File, add_missing_indexes
+from scan_catalog import ScanCatalogWriter
+
+
+def test_batches_upsert_and_rescan_updates_in_place(db_app, make_scanned_file):
+    writer = ScanCatalogWriter(1, None, '9', 'Chan', batch_size=2)
+    for i in range(5):
+        writer.add(make_scanned_file(i))
+    assert File.query.count() == 4  # two full batches, one row still buffered
+    assert writer.flush() == 1 and writer.written == 5
+
+    File.query.filter_by(telegram_message_id=0).update({'filename': 'renamed.mp4', 'is_favorite': True})
+    db.session.commit()
+
+    rescan = ScanCatalogWriter(1, None, '9', 'Chan renamed', batch_size=100)
+    rescan.add(make_scanned_file(0, file_size=999))
+    rescan.add(make_scanned_file(5))
+    rescan.flush()
+
+    assert File.query.count() == 6
+    row = File.query.filter_by(telegram_message_id=0).one()
+    assert (row.file_size, row.telegram_channel) == (999, 'Chan renamed')
+    assert (row.filename, row.is_favorite) == ('renamed.mp4', True)
+    assert json.loads(row.file_metadata)['duration'] == 3 and row.telegram_date.year == 2024
+
+
+def test_uploads_to_same_message_are_not_upsert_targets(db_app, make_scanned_file):
+    add_missing_indexes()  # idempotent on an up-to-date schema
+    db.session.add(File(filename='up.bin', user_id=1, telegram_channel_id='9', telegram_message_id=1))
+    db.session.add(File(filename='up2.bin', user_id=1, telegram_channel_id='9', telegram_message_id=1))
+    db.session.commit()
+
+    writer = ScanCatalogWriter(1, None, '9', 'Chan')
+    writer.add(make_scanned_file(1))
+    writer.flush()
+    assert File.query.filter_by(telegram_message_id=1).count() == 3
+
+
+def test_disabled_catalog_falls_back_to_row_inserts(db_app, make_scanned_file, monkeypatch):
+    import config
+    from scan_catalog import ScanRowWriter, scan_file_writer
+    monkeypatch.setattr(config, 'SCAN_CATALOG_ENABLED', False)
+
+    for _ in range(2):
+        writer = scan_file_writer(1, None, '9', 'Chan')
+        assert isinstance(writer, ScanRowWriter)
+        for i in range(60):
+            writer.add(make_scanned_file(i))
+        assert File.query.count() % 60 == 50  # committed every 50 rows
+        writer.flush()
+
+    rows = File.query.filter_by(telegram_message_id=0).all()
+    assert len(rows) == 2 and not any(f.from_scan for f in rows)  # no upsert: a rescan adds rows
+    assert json.loads(rows[0].file_metadata)['duration'] == 3
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from db import db, File, ScanSession
+from scan_catalog import ScanCatalogWriter
+from scan_orchestrator import save_checkpoint, mark_interrupted_scans
+
+
+def test_checkpoint_flushes_catalog_and_survives_crash(db_app, make_scanned_file):
+    session = ScanSession(channel_name='chan', channel_id='9', user_id=1, status='running')
+    db.session.add(session)
+    db.session.commit()
+
+    catalog = ScanCatalogWriter(1, None, '9', 'chan', batch_size=100)
+    for i in (50, 49, 48):
+        catalog.add(make_scanned_file(i))
+    save_checkpoint(session, '@chan', 48, 50, processed=3, files_found=3, catalog=catalog)
+    assert File.query.count() == 3  # Rows behind the checkpoint are committed
+
+    # Process dies: the next start marks the session resumable
+    assert not session.is_resumable()
+    assert mark_interrupted_scans() == 1
+    db.session.refresh(session)
+    assert session.status == 'interrupted' and session.is_resumable()
+    assert session.get_checkpoint() == {'channel_input': '@chan', 'offset_id': 48, 'max_message_id': 50,
+                                        'messages_scanned': 3, 'files_found': 3}
+    assert session.to_dict()['resumable'] is True
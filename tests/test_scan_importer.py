@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import telegram_storage
+from db import db, File, Folder, ScanSession
+from scan_importer import import_scan_session
+
+
+class FakeStorage:
+    """Forwards every message (new ID = source + 1000), optionally failing on the Nth RPC"""
+
+    def __init__(self, fail_on_call=None):
+        self.fail_on_call = fail_on_call
+        self.calls = []
+
+    async def initialize(self):
+        return True
+
+    async def close(self):
+        pass
+
+    async def forward_to_saved_messages(self, from_peer, message_ids):
+        self.calls.append((from_peer, list(message_ids)))
+        if len(self.calls) == self.fail_on_call:
+            raise ConnectionError('connection lost')
+        return {i: {'message_id': i + 1000, 'channel': 'Saved Messages', 'channel_id': 'me', 'file_id': str(i),
+                    'unique_id': None, 'access_hash': '1', 'file_reference': None, 'file_size': 0,
+                    'mime_type': 'video/mp4'} for i in message_ids}
+
+
+def _scanned_session(count):
+    folder = Folder(name='Chan', user_id=1)
+    db.session.add(folder)
+    db.session.flush()
+    for i in range(1, count + 1):
+        db.session.add(File(filename=f'v{i}.mp4', user_id=1, folder_id=folder.id, storage_type='telegram',
+                            telegram_message_id=i, telegram_channel='Chan', telegram_channel_id='-1009',
+                            file_size=100, mime_type='video/mp4', file_metadata=json.dumps({'duration': 3})))
+    scan_session = ScanSession(channel_name='Chan', channel_id='-1009', user_id=1, status='completed',
+                               folder_id=folder.id)
+    db.session.add(scan_session)
+    db.session.commit()
+    return scan_session
+
+
+def _run(monkeypatch, storage, session_id):
+    monkeypatch.setattr(telegram_storage, 'TelegramStorageManager', lambda: storage)
+    return asyncio.run(import_scan_session(session_id))
+
+
+def test_import_forwards_in_batches_and_bulk_inserts_rows(db_app, monkeypatch):
+    scan_session = _scanned_session(250)
+    inserted = []
+    bulk_insert = db.session.bulk_insert_mappings
+
+    def spy(mapper, mappings):
+        inserted.append(list(mappings))
+        return bulk_insert(mapper, mappings)
+
+    monkeypatch.setattr(db.session, 'bulk_insert_mappings', spy)
+    storage = FakeStorage()
+    result = _run(monkeypatch, storage, scan_session.id)
+
+    assert [len(ids) for _, ids in storage.calls] == [100, 100, 50]
+    assert {peer for peer, _ in storage.calls} == {-1009}
+    assert [len(rows) for rows in inserted] == [100, 100, 50]
+    assert result == {'imported': 250, 'failed': 0, 'total': 250, 'folder_id': scan_session.import_folder_id}
+    assert scan_session.import_status == 'completed'
+
+    row = File.query.filter_by(folder_id=scan_session.import_folder_id, telegram_message_id=1007).one()
+    assert row.filename == 'v7.mp4' and row.storage_type == 'telegram' and row.telegram_channel_id == 'me'
+    assert json.loads(row.file_metadata) == {'duration': 3, 'source_channel_id': '-1009', 'source_channel': 'Chan',
+                                             'source_message_id': 7, 'scan_session_id': scan_session.id}
+
+
+def test_interrupted_import_resumes_where_it_stopped(db_app, monkeypatch):
+    scan_session = _scanned_session(250)
+
+    with pytest.raises(ConnectionError):
+        _run(monkeypatch, FakeStorage(fail_on_call=2), scan_session.id)
+    assert scan_session.import_status == 'failed' and scan_session.imported_files == 100
+
+    storage = FakeStorage()
+    result = _run(monkeypatch, storage, scan_session.id)
+
+    # Only the messages not imported yet are forwarded again
+    assert [ids[0] for _, ids in storage.calls] == [101, 201]
+    assert result['imported'] == 250 and result['total'] == 250
+    imported = File.query.filter_by(folder_id=scan_session.import_folder_id).all()
+    assert sorted(f.telegram_message_id for f in imported) == list(range(1001, 1251))
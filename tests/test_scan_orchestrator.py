@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import scanner
+from db import db, ScanSession, ChannelWatermark
+from scan_orchestrator import ScanOrchestrator, ScanBatch
+
+
+class _FakeScanner:
+    instances = 0
+
+    def __init__(self):
+        _FakeScanner.instances += 1
+
+    async def initialize(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class _RecordingOrchestrator(ScanOrchestrator):
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.peak = 0
+        self.clients = set()
+
+    async def scan_channel(self, client, batch, channel):
+        self.clients.add(id(client))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+
+
+def test_batch_runs_channels_concurrently_with_one_client(monkeypatch):
+    monkeypatch.setattr(scanner, 'TelegramFileScanner', _FakeScanner)
+    orchestrator = _RecordingOrchestrator()
+    batch = ScanBatch(user_id=1, channels=[f'@c{i}' for i in range(10)], full_rescan=False, concurrency=3)
+
+    asyncio.run(orchestrator.run_batch(batch))
+
+    assert batch.status == 'completed'
+    assert orchestrator.peak == 3
+    assert len(orchestrator.clients) == 1
+    assert _FakeScanner.instances == 1
+
+
+def test_cancelled_batch_skips_queued_channels(monkeypatch):
+    monkeypatch.setattr(scanner, 'TelegramFileScanner', _FakeScanner)
+    orchestrator = _RecordingOrchestrator()
+    batch = ScanBatch(user_id=1, channels=['@a', '@b'], full_rescan=False, concurrency=1)
+    batch.cancelled = True
+
+    asyncio.run(orchestrator.run_batch(batch))
+
+    assert batch.status == 'cancelled'
+    assert orchestrator.peak == 0
+
+
+class _Message:
+    def __init__(self, message_id):
+        self.id = message_id
+
+
+class _Client:
+    def __init__(self, newest):
+        self.newest = newest
+
+    async def iter_messages(self, entity, limit=None, min_id=0, **kwargs):
+        for message_id in range(self.newest, min_id, -1)[:limit]:
+            yield _Message(message_id)
+
+
+class _ChannelScanner:
+    def __init__(self, newest):
+        self.client = _Client(newest)
+
+    async def get_channel_entity(self, channel_input):
+        return type('Channel', (), {'id': 9, 'title': 'Chan'})()
+
+    async def get_message_count(self, entity, limit, min_id, filters=None):
+        return 0
+
+    def extract_file_info(self, message):
+        return None
+
+
+def _scan(newest, limit, monkeypatch):
+    import config
+    import scan_orchestrator
+    monkeypatch.setattr(config, 'MAX_MESSAGES', limit)
+    monkeypatch.setattr(scan_orchestrator, 'server_filters', lambda: None)
+    batch = ScanBatch(user_id=1, channels=['@chan'], full_rescan=False, concurrency=1)
+    asyncio.run(ScanOrchestrator().scan_channel(_ChannelScanner(newest), batch, '@chan'))
+    return db.session.get(ScanSession, batch.session_ids['@chan'])
+
+
+def test_capped_scan_keeps_watermark(db_app, monkeypatch):
+    session = _scan(newest=10, limit=4, monkeypatch=monkeypatch)
+    assert (session.status, session.messages_scanned) == ('completed', 4)
+    assert ChannelWatermark.query.count() == 0  # messages 1-6 were never seen
+
+    session = _scan(newest=10, limit=None, monkeypatch=monkeypatch)
+    assert session.messages_scanned == 10
+    assert ChannelWatermark.query.one().max_message_id == 10
+
+    # Incremental rescan above the mark, capped again: the mark stays put
+    session = _scan(newest=20, limit=4, monkeypatch=monkeypatch)
+    assert (session.scan_mode, session.min_message_id, session.messages_scanned) == ('incremental', 10, 4)
+    assert ChannelWatermark.query.one().max_message_id == 10
@@ -0,0 +1,183 @@
+import csv
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import config
+import pytest
+
+import scan_output
+from scan_output import StreamingScanWriter, export_results, iter_jsonl
+
+
+def _file(i, file_type='document', size=100):
+    return {'message_id': i, 'date': '2024-01-01T00:00:00+00:00', 'file_type': file_type,
+            'file_name': f'f{i}.bin', 'file_size': size, 'mime_type': 'application/octet-stream',
+            'duration': None, 'width': None, 'height': None, 'download_link': f'https://t.me/c/{i}',
+            'message_text': 'hi', 'sender_id': 1}
+
+
+def test_records_are_flushed_every_n_and_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'CSV_ENABLED', True)
+    writer = StreamingScanWriter(tmp_path, timestamp='t', flush_every=2)
+    for i in range(3):
+        writer.write(_file(i, 'photo' if i else 'document', size=100 * (i + 1)))
+
+    # Two records flushed, the third still buffered: a crash now keeps the first two
+    assert len(list(iter_jsonl(writer.jsonl_path))) == 2
+    writer.close()
+    assert [r['message_id'] for r in iter_jsonl(writer.jsonl_path)] == [0, 1, 2]
+
+    with open(writer.csv_path, newline='', encoding=config.CSV_ENCODING) as f:
+        assert [row['file_name'] for row in csv.DictReader(f)] == ['f0.bin', 'f1.bin', 'f2.bin']
+
+    stats = writer.stats.to_dict()
+    assert stats['total_files'] == 3 and stats['total_size'] == 600
+    assert stats['by_type'] == {'photo': 2, 'document': 1}
+
+
+def _closed_writer(tmp_path, count):
+    writer = StreamingScanWriter(tmp_path, timestamp='t')
+    for i in range(count):
+        writer.write(_file(i))
+    writer.close()
+    return writer
+
+
+@pytest.mark.parametrize('compact', [True, False])
+def test_json_documents_streamed_from_jsonl(tmp_path, monkeypatch, compact):
+    monkeypatch.setattr(config, 'JSON_COMPACT', compact)
+    writer = _closed_writer(tmp_path, 5)
+    paths = export_results(writer, ['json', 'simple_json'])
+
+    with open(paths['json'], encoding='utf-8') as f:
+        text = f.read()
+    detailed = json.loads(text)
+    assert detailed['scan_info']['total_files'] == 5
+    assert [f['message_info']['message_id'] for f in detailed['files']] == [0, 1, 2, 3, 4]
+    assert (': ' in text) is not compact
+    with open(paths['simple_json'], encoding='utf-8') as f:
+        assert json.load(f)[0] == {'file_name': 'f0.bin', 'download_link': 'https://t.me/c/0',
+                                   'file_size': '100.0 B', 'file_type': 'document'}
+
+
+def test_export_writes_selected_formats(tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip('openpyxl')
+    monkeypatch.setattr(scan_output, 'PYARROW_AVAILABLE', False)
+    writer = _closed_writer(tmp_path, 3)
+    writer_rows = [_file(0), _file(1), _file(2)]
+
+    paths = export_results(writer, ['excel', 'json', 'parquet', 'unknown'])
+    # Parquet needs pyarrow, unknown formats are ignored
+    assert list(paths) == ['excel', 'json']
+
+    sheet = openpyxl.load_workbook(paths['excel'], read_only=True).active
+    rows = list(sheet.values)
+    assert sheet.title == config.EXCEL_SHEET_NAME
+    assert list(rows[0]) == scan_output.SCAN_FIELDS
+    assert [r[3] for r in rows[1:]] == [r['file_name'] for r in writer_rows]
+
+
+def test_export_failure_is_isolated(tmp_path, monkeypatch):
+    def broken(writer):
+        raise OSError('disk full')
+
+    monkeypatch.setitem(scan_output.EXPORTERS, 'excel', broken)
+    writer = _closed_writer(tmp_path, 2)
+    assert list(export_results(writer, ['excel', 'simple_json'])) == ['simple_json']
+
+
+def test_export_reads_jsonl_once_and_isolates_mid_stream_failures(tmp_path, monkeypatch):
+    class Broken(scan_output.SimpleJsonExporter):
+        def write(self, file_data):
+            if file_data['message_id'] == 1:
+                raise OSError('disk full')
+            super().write(file_data)
+
+    passes = []
+
+    def counting_iter(path):
+        passes.append(path)
+        return iter_jsonl(path)
+
+    monkeypatch.setattr(scan_output, 'iter_jsonl', counting_iter)
+    monkeypatch.setitem(scan_output.EXPORTERS, 'simple_json', Broken)
+    writer = _closed_writer(tmp_path, 3)
+
+    paths = export_results(writer, ['simple_json', 'json'])
+    assert list(paths) == ['json'] and len(passes) == 1
+    with open(paths['json'], encoding='utf-8') as f:
+        assert len(json.load(f)['files']) == 3
+
+
+def test_parquet_and_arrow_roundtrip(tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    writer = _closed_writer(tmp_path, 4)
+
+    paths = export_results(writer, ['parquet', 'arrow'])
+    assert pq.read_table(paths['parquet']).column('message_id').to_pylist() == [0, 1, 2, 3]
+    assert feather.read_table(paths['arrow']).num_rows == 4
+
+
+def test_scanned_file_is_compact_and_reads_like_a_dict(tmp_path):
+    from datetime import datetime, timezone
+    from scan_output import ScannedFile
+
+    a, b = ScannedFile(1, datetime(2024, 1, 1, tzinfo=timezone.utc)), ScannedFile(2)
+    for record, mime in ((a, 'video/' + 'mp4'), (b, ''.join(['video/', 'mp4']))):
+        record.file_type, record.file_name, record.mime_type = 'video', f'v{record.message_id}.mp4', mime
+        record.set_link_prefix('https://t.me/c/' + '42/')
+    assert a.mime_type is b.mime_type and a.link_prefix is b.link_prefix
+    assert not hasattr(a, '__dict__')
+
+    assert a['download_link'] == 'https://t.me/c/42/1' and a['date'] == '2024-01-01T00:00:00+00:00'
+    assert a.get('duration', 0) is None and a.get('unknown', 'x') == 'x'
+    assert a.to_dict() == dict(_file(1), file_type='video', file_name='v1.mp4', file_size=None,
+                               mime_type='video/mp4', download_link='https://t.me/c/42/1',
+                               message_text='', sender_id=None)
+
+    writer = StreamingScanWriter(tmp_path, timestamp='t')
+    writer.write(a)
+    writer.close()
+    assert next(iter_jsonl(writer.jsonl_path))['download_link'] == 'https://t.me/c/42/1'
+
+
+def test_resume_cuts_outputs_back_to_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'CSV_ENABLED', True)
+    writer = StreamingScanWriter(tmp_path, timestamp='t')
+    for i in range(3):
+        writer.write(_file(i))
+    checkpoint = writer.positions()
+    writer.write(_file(3))  # Written after the checkpoint, then the process dies
+    writer.close()
+
+    resumed = StreamingScanWriter(tmp_path, timestamp='t')
+    resumed.resume(checkpoint)
+    assert resumed.stats.total_files == 3
+    resumed.write(_file(3))
+    resumed.write(_file(4))
+    resumed.close()
+
+    assert [r['message_id'] for r in iter_jsonl(resumed.jsonl_path)] == [0, 1, 2, 3, 4]
+    with open(resumed.csv_path, newline='', encoding=config.CSV_ENCODING) as f:
+        assert [row['message_id'] for row in csv.DictReader(f)] == ['0', '1', '2', '3', '4']
+
+
+def test_resume_rebuilds_lost_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'CSV_ENABLED', True)
+    writer = StreamingScanWriter(tmp_path, timestamp='t')
+    writer.write(_file(0))
+    checkpoint = writer.positions()
+    writer.close()
+    os.remove(writer.csv_path)
+
+    resumed = StreamingScanWriter(tmp_path, timestamp='t')
+    resumed.resume(checkpoint)
+    resumed.write(_file(1))
+    resumed.close()
+    with open(resumed.csv_path, newline='', encoding=config.CSV_ENCODING) as f:
+        assert [row['file_name'] for row in csv.DictReader(f)] == ['f0.bin', 'f1.bin']
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from telethon.helpers import TotalList
+
+from scanner import TelegramFileScanner
+
+
+class _CountingClient:
+    def __init__(self, total):
+        self.total = total
+        self.calls = []
+
+    async def get_messages(self, entity, limit=None, **kwargs):
+        self.calls.append(limit)
+        result = TotalList([SimpleNamespace(id=self.total)] if limit else [])
+        result.total = self.total
+        return result
+
+
+def test_count_comes_from_single_limit_zero_call():
+    scanner = TelegramFileScanner.__new__(TelegramFileScanner)
+    scanner.client = _CountingClient(200_000)
+
+    assert asyncio.run(scanner.get_message_count(SimpleNamespace(title='c'))) == 200_000
+    assert asyncio.run(scanner.get_message_count(SimpleNamespace(title='c'), limit=5000)) == 5000
+    assert scanner.client.calls == [0, 0]
+
+
+def test_incremental_count_is_bounded_by_watermark():
+    scanner = TelegramFileScanner.__new__(TelegramFileScanner)
+    scanner.client = _CountingClient(200_000)
+
+    assert asyncio.run(scanner.get_message_count(SimpleNamespace(title='c'), min_id=199_950)) == 50
+    assert asyncio.run(scanner.get_message_count(SimpleNamespace(title='c'), limit=10, min_id=199_950)) == 10
+    assert scanner.client.calls == [1, 1]
+
+
+def test_extract_file_info_builds_compact_record():
+    from datetime import datetime, timezone
+    from telethon.tl.types import Document, DocumentAttributeFilename, MessageMediaDocument
+
+    scanner = TelegramFileScanner.__new__(TelegramFileScanner)
+    document = Document(id=1, access_hash=0, file_reference=b'', date=None, mime_type='application/pdf',
+                        size=2048, dc_id=2, attributes=[DocumentAttributeFilename('a.pdf')])
+    message = SimpleNamespace(id=7, date=datetime(2024, 5, 1, tzinfo=timezone.utc), text='', sender=None,
+                              media=MessageMediaDocument(document=document),
+                              chat=SimpleNamespace(id=-1001234, username=None))
+
+    file_info = scanner.extract_file_info(message)
+    assert (file_info.file_type, file_info.file_name, file_info['file_size']) == ('document', 'a.pdf', 2048)
+    assert file_info.download_link == 'https://t.me/c/1234/7'
+    assert file_info.to_dict()['date'] == '2024-05-01T00:00:00+00:00'
+
+
+def test_filtered_count_uses_search_totals():
+    from telethon.tl.types import InputMessagesFilterPhotos
+
+    scanner = TelegramFileScanner.__new__(TelegramFileScanner)
+    scanner.client = _CountingClient(300)
+
+    assert asyncio.run(scanner.get_message_count(SimpleNamespace(title='c'), filters=[InputMessagesFilterPhotos])) == 300
+    assert asyncio.run(scanner.get_message_count(SimpleNamespace(title='c'), min_id=250,
+                                                 filters=[InputMessagesFilterPhotos])) == 50
+    assert asyncio.run(scanner.get_message_count(SimpleNamespace(title='c'), filters=[])) == 0
+
+
+class _Takeout:
+    def __init__(self, delay=False):
+        self.delay = delay
+        self.exits = []
+
+    async def __aenter__(self):
+        if self.delay:
+            from telethon.errors import TakeoutInitDelayError
+            raise TakeoutInitDelayError(request=None, capture=3600)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.exits.append(exc_type is None)
+
+
+def _takeout_scanner(takeout):
+    scanner = TelegramFileScanner.__new__(TelegramFileScanner)
+    scanner.client = SimpleNamespace(takeout=lambda **kwargs: takeout)
+    return scanner
+
+
+def test_takeout_is_finished_with_scan_outcome():
+    import pytest
+
+    async def run(scanner, fail):
+        async with scanner.history_client(True) as history:
+            if fail:
+                raise RuntimeError('boom')
+            return history
+
+    takeout = _Takeout()
+    assert asyncio.run(run(_takeout_scanner(takeout), False)) is takeout
+    with pytest.raises(RuntimeError):
+        asyncio.run(run(_takeout_scanner(takeout), True))
+    assert takeout.exits == [True, False]
+
+    # Takeout not yet approved in the app: scan falls back to the normal client
+    scanner = _takeout_scanner(_Takeout(delay=True))
+    assert asyncio.run(run(scanner, False)) is scanner.client
@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from telethon.sessions import SQLiteSession
+from telethon.crypto import AuthKey
+from telethon.tl.types import User
+
+import session_manager as sm
+
+
+def _make_session_file(tmp_path):
+    base = str(tmp_path / 'session')
+    session = SQLiteSession(base)
+    session.set_dc(2, '149.154.167.51', 443)
+    session.auth_key = AuthKey(data=bytes(range(256)))
+    session.save()
+    session.close()
+    return tmp_path / 'session.session'
+
+
+def test_clone_and_write_back(tmp_path, monkeypatch):
+    path = _make_session_file(tmp_path)
+    monkeypatch.setattr(sm, 'SESSION_FILES', [path])
+    manager = sm.SessionManager(writeback_interval=3600)
+
+    session = manager.get_session()
+    assert session.dc_id == 2
+    assert session.auth_key.key == bytes(range(256))
+
+    # A client learns an entity; it is merged and persisted, not lost with the clone
+    session.process_entities([User(id=777, access_hash=42, username='alice')])
+    manager.release(session)
+    assert manager.write_back()
+
+    rows = sqlite3.connect(str(path)).execute('select id, hash, username from entities').fetchall()
+    assert rows == [(777, 42, 'alice')]
+    assert 'alice' in {e[2] for e in manager.get_session()._entities}
+
+
+def test_missing_file_returns_none(tmp_path, monkeypatch):
+    monkeypatch.setattr(sm, 'SESSION_FILES', [tmp_path / 'missing.session'])
+    assert sm.SessionManager(writeback_interval=3600).get_session() is None
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import pack_storage
+from db import db, File
+from signed_urls import MediaUrlSigner, SignedUrlError
+
+
+def test_sign_and_verify_roundtrip():
+    signer = MediaUrlSigner('secret')
+    token = signer.sign({'i': 7, 'n': 'clip.mp4', 's': 'telegram', 'c': 'me', 'mi': 42}, ttl=60)
+
+    claims = signer.verify(token)
+    assert claims['i'] == 7 and claims['mi'] == 42
+    assert time.time() < claims['e'] <= time.time() + 60
+
+    record = signer.record_from_claims(claims)
+    assert record.is_stored_on_telegram()
+    assert record.get_telegram_info()['message_id'] == 42
+
+
+def test_rejects_tampered_expired_and_foreign_tokens():
+    signer = MediaUrlSigner('secret')
+    token = signer.sign({'i': 1, 'n': 'a.txt', 's': 'local'}, ttl=60)
+    payload, _, signature = token.partition('.')
+
+    forged = signer.sign({'i': 2, 'n': 'a.txt', 's': 'local'}, ttl=60).split('.')[0]
+    with pytest.raises(SignedUrlError):
+        signer.verify(f"{forged}.{signature}")
+    with pytest.raises(SignedUrlError):
+        MediaUrlSigner('other').verify(token)
+    with pytest.raises(SignedUrlError):
+        signer.verify(token, now=time.time() + 61)
+    with pytest.raises(SignedUrlError):
+        signer.verify(payload)
+
+
+class FakeSavedMessages:
+    def __init__(self):
+        self.messages = {}
+
+    async def upload_to_saved_messages(self, file_path, filename):
+        with open(file_path, 'rb') as f:
+            self.messages[len(self.messages) + 1] = f.read()
+        return {'message_id': len(self.messages), 'channel_id': 'me'}
+
+    async def get_saved_message(self, message_id):
+        return SimpleNamespace(media=message_id)
+
+    async def read_range(self, media, offset, length):
+        return self.messages[media][offset:offset + length]
+
+
+def test_packed_claims_are_served_without_db_queries(db_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(pack_storage, 'PACK_DIR', tmp_path)
+    packs, saved = pack_storage.pack_storage, FakeSavedMessages()
+    pack, offset, length = packs.append_bytes(1, b'hello packed')
+    file_record = File(filename='p.txt', user_id=1, storage_type='pack', pack_id=pack.id, pack_offset=offset,
+                       pack_length=length)
+    db.session.add(file_record)
+    db.session.commit()
+    assert asyncio.run(packs.seal(saved, pack))
+
+    signer = MediaUrlSigner('secret')
+    claims = signer.verify(signer.sign(signer.claims_for(file_record), ttl=60))
+    assert claims['pm'] == pack.telegram_message_id
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        data = asyncio.run(packs.read_range(saved, claims['pk'], claims['pm'], claims['po'], claims['pl']))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert data == b'hello packed' and statements == []
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from telethon.tl.functions.upload import GetFileRequest, SaveFilePartRequest
+from telethon.tl.functions.users import GetUsersRequest
+from telethon.tl.types import InputDocumentFileLocation, InputUserSelf
+
+from telegram_metrics import TelegramMetrics, method_name
+
+
+def test_method_names():
+    location = InputDocumentFileLocation(id=1, access_hash=2, file_reference=b'', thumb_size='')
+    assert method_name(GetFileRequest(location, offset=0, limit=1024)) == 'upload.GetFile'
+    assert method_name(GetUsersRequest([InputUserSelf()])) == 'users.GetUsers'
+    assert method_name([SaveFilePartRequest(1, 0, b'x')]) == 'upload.SaveFilePart'
+
+
+def test_histogram_and_prometheus_output():
+    metrics = TelegramMetrics()
+    metrics.record_rpc('upload.GetFile', 4, 0.02, bytes_in=1024)
+    metrics.record_rpc('upload.GetFile', 4, 3.0, error='TimeoutError')
+    metrics.record_flood_wait('upload.GetFile', 4, 12)
+    metrics.record_phase('db.commit', 0.001)
+
+    rpc = metrics.to_dict()['rpc'][0]
+    assert rpc['calls'] == 2 and rpc['dc'] == '4'
+    assert rpc['latency_buckets']['0.025'] == 1 and rpc['latency_buckets']['+Inf'] == 2
+    assert rpc['flood_wait_seconds'] == 12 and rpc['errors'] == {'TimeoutError': 1}
+
+    text = metrics.to_prometheus()
+    assert 'teledrive_telegram_rpc_calls_total{method="upload.GetFile",dc="4"} 2' in text
+    assert 'teledrive_telegram_rpc_bytes_total{method="upload.GetFile",dc="4",direction="in"} 1024' in text
+    assert 'teledrive_telegram_phase_duration_seconds_count{phase="db.commit"} 1' in text
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from transfer_scheduler import TransferScheduler, INTERACTIVE, BULK, BACKGROUND
+
+
+def _scheduler(**kwargs):
+    return TransferScheduler(1, {INTERACTIVE: 8, BULK: 3, BACKGROUND: 1}, kwargs.get('caps', {}))
+
+
+def test_weighted_order_when_backlogged():
+    scheduler = _scheduler()
+    order = []
+
+    async def transfer(priority):
+        async with scheduler.slot(priority):
+            order.append(priority)
+            await asyncio.sleep(0)
+
+    async def main():
+        await scheduler.acquire(BACKGROUND)  # hold the only slot while the queue builds
+        tasks = [asyncio.create_task(transfer(p)) for p in [BACKGROUND] * 3 + [INTERACTIVE] * 8]
+        await asyncio.sleep(0.01)
+        scheduler.release(BACKGROUND)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    # Interactive gets 8 slots per background slot, background is not starved
+    assert order[0] == INTERACTIVE
+    assert order[:9].count(BACKGROUND) == 1
+    assert order.count(BACKGROUND) == 3
+
+
+def test_background_yields_to_interactive():
+    scheduler = _scheduler()
+    order = []
+
+    async def background():
+        async with scheduler.slot(BACKGROUND) as ticket:
+            await asyncio.sleep(0.02)
+            await ticket.checkpoint(1024)
+            order.append(BACKGROUND)
+
+    async def interactive():
+        await asyncio.sleep(0.01)
+        async with scheduler.slot(INTERACTIVE):
+            order.append(INTERACTIVE)
+
+    async def main():
+        await asyncio.gather(background(), interactive())
+
+    asyncio.run(main())
+    assert order == [INTERACTIVE, BACKGROUND]
+    assert scheduler.stats['preemptions'] == 1
+
+
+
+def test_cancel_while_waiting_after_preemption_releases_nothing():
+    scheduler = _scheduler()
+
+    async def background():
+        async with scheduler.slot(BACKGROUND) as ticket:
+            await asyncio.sleep(0.02)
+            await ticket.checkpoint()  # yields to the interactive request, then waits
+
+    async def interactive():
+        await asyncio.sleep(0.01)
+        async with scheduler.slot(INTERACTIVE):
+            await asyncio.sleep(0.05)
+
+    async def main():
+        bg = asyncio.create_task(background())
+        fg = asyncio.create_task(interactive())
+        await asyncio.sleep(0.04)
+        bg.cancel()
+        await asyncio.gather(bg, fg, return_exceptions=True)
+
+    asyncio.run(main())
+    assert scheduler.stats['preemptions'] == 1
+    assert scheduler._active == {INTERACTIVE: 0, BULK: 0, BACKGROUND: 0}
+
+def test_bandwidth_cap_throttles_background():
+    scheduler = _scheduler(caps={BACKGROUND: 100 * 1024})
+
+    async def main():
+        async with scheduler.slot(BACKGROUND) as ticket:
+            await ticket.checkpoint(110 * 1024)
+
+    asyncio.run(main())
+    assert scheduler.stats['throttled_seconds'] > 0
+
+
+class _FakeClient:
+    async def get_messages(self, channel, ids):
+        return type('Message', (), {'media': object()})()
+
+    async def download_media(self, media, file, progress_callback=None):
+        for done in (512, 1024, 1536):
+            await progress_callback(done, 1536)
+        return file
+
+
+class _TelegramFile:
+    id = 1
+    filename = 'a.bin'
+
+    def is_stored_on_telegram(self):
+        return True
+
+    def has_replica(self):
+        return False
+
+    def get_telegram_info(self):
+        return {'channel': 'me', 'message_id': 5}
+
+
+def test_downloads_checkpoint_their_slot(monkeypatch):
+    import telegram_storage
+    scheduler = _scheduler()
+    monkeypatch.setattr(telegram_storage, 'transfer_scheduler', scheduler)
+    storage = telegram_storage.TelegramStorageManager()
+    storage.client = _FakeClient()
+
+    assert asyncio.run(storage.download_file(_TelegramFile(), '/tmp/out.bin')) == '/tmp/out.bin'
+    assert scheduler.stats['bytes'][INTERACTIVE] == 1536  # every received part went through the ticket